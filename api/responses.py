@@ -0,0 +1,58 @@
+"""
+JSON Response Rendering
+orjson-backed response class so large payloads skip jsonable_encoder and the
+stdlib encoder
+"""
+from datetime import date, datetime
+from enum import Enum
+from typing import Any
+import json
+import os
+
+import numpy as np
+from fastapi.responses import JSONResponse
+
+try:
+    import orjson
+except ImportError:  # falls back to the stdlib encoder
+    orjson = None
+
+
+# "orjson" (default when installed) or "standard" for the stdlib encoder
+JSON_ENCODER = os.getenv("JSON_ENCODER", "orjson" if orjson is not None else "standard").lower()
+if JSON_ENCODER == "orjson" and orjson is None:
+    raise ImportError("JSON_ENCODER=orjson requires orjson (pip install orjson)")
+
+ORJSON_OPTIONS = (orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS) if orjson is not None else 0
+
+
+def _default(value: Any):
+    """The types orjson serializes natively, for the stdlib encoder"""
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, Enum):
+        return value.value
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def dumps(content: Any, encoder: str = JSON_ENCODER) -> bytes:
+    if encoder == "orjson":
+        return orjson.dumps(content, option=ORJSON_OPTIONS)
+    return json.dumps(
+        content, default=_default, ensure_ascii=False, allow_nan=False, separators=(",", ":")
+    ).encode("utf-8")
+
+
+class FastJSONResponse(JSONResponse):
+    """
+    JSON response that serializes datetimes, enums and numpy values natively.
+    Routes returning one directly also bypass FastAPI's response validation
+    and jsonable_encoder, which dominate on long lists of dicts.
+    """
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
@@ -1,32 +1,61 @@
 """
 API Routes for CarbonCALC - Carbon Footprint Monitoring System
 """
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, File, Form, HTTPException, Query, Request, UploadFile, status
+from fastapi.concurrency import run_in_threadpool
 from fastapi.responses import HTMLResponse, JSONResponse
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from sqlalchemy import desc
-from pydantic import BaseModel, EmailStr
+from sqlalchemy import desc, func, select
+from pydantic import BaseModel, EmailStr, ValidationError
 from typing import Optional, List
 from datetime import datetime, timedelta
+import base64
 import json
+import logging
 
-from database.database import get_db
-from database.models import User, CarbonEntry, Recommendation, UserType, IndustryBenchmark
+from database.database import get_db, get_async_db, pool_stats
+from database.models import (
+    User,
+    CarbonEntry,
+    Recommendation,
+    Organization,
+    OrganizationInvite,
+    UserType,
+    BREAKDOWN_COLUMNS,
+    breakdown_to_columns,
+    breakdown_from_columns
+)
 from auth.auth import (
     get_current_active_user,
-    get_password_hash,
-    verify_password,
+    hash_password_async,
+    verify_password_async,
     create_access_token,
     require_user_type
 )
+from auth.user_cache import UserPrincipal, user_cache
+from api.responses import FastJSONResponse
+from auth.password_hasher import password_hasher
 from utils.carbon_calculator import CarbonCalculator
 from utils.recommendations import RecommendationEngine
-from utils.benchmarking import BenchmarkAnalyzer
-from ml_models.predictor import CarbonFootprintPredictor
+from utils.benchmarking import BenchmarkAnalyzer, benchmark_stats_cache
+from utils.ingestion import write_entries_chunk, save_recommendations, DEFAULT_CHUNK_SIZE
+from utils.importer import import_entries, detect_format, detect_compression
+from utils.rollups import apply_entries, get_rollup, recent_entries, summary_statistics
+from utils.timeseries import BUCKETS, bucketed_emissions, timeseries_cache
+from utils.quantiles import QUANTILE_SKETCH_COMPRESSION, population_rank, record_footprints
+from utils.organizations import (
+    ORG_BUCKETS, accept_invite, assign_user, create_organization, in_subtree, invite_user, organization_totals,
+    record_organization_entries
+)
+from ml_models.model_store import model_store
+from ml_models.training_queue import training_queue, entry_watermark, load_history, SCOPE_LIMITS
+from ml_models.global_model import load_global_model
 # from iot.sensor_simulator import get_sensor_network (Removed)
 
 
 router = APIRouter()
+logger = logging.getLogger(__name__)
 
 
 # Pydantic models for request/response
@@ -37,6 +66,7 @@ class UserRegister(BaseModel):
     full_name: str
     user_type: UserType
     organization_name: Optional[str] = None
+    industry_type: Optional[str] = None
 
 
 class UserLogin(BaseModel):
@@ -65,6 +95,19 @@ class CarbonEntryInput(BaseModel):
     notes: Optional[str] = None
 
 
+class RecommendationUpdate(BaseModel):
+    is_implemented: bool
+
+
+class OrganizationCreate(BaseModel):
+    name: str
+    parent_id: Optional[int] = None
+
+
+class OrganizationMember(BaseModel):
+    username: str
+
+
 class TokenResponse(BaseModel):
     access_token: str
     token_type: str
@@ -73,33 +116,34 @@ class TokenResponse(BaseModel):
 
 # Authentication Routes
 @router.post("/auth/register", response_model=dict)
-async def register(user_data: UserRegister, db: Session = Depends(get_db)):
+async def register(user_data: UserRegister, db: AsyncSession = Depends(get_async_db)):
     """Register a new user"""
     # Check if user exists
-    if db.query(User).filter(User.email == user_data.email).first():
+    if await db.scalar(select(User).where(User.email == user_data.email)):
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Email already registered"
         )
-    if db.query(User).filter(User.username == user_data.username).first():
+    if await db.scalar(select(User).where(User.username == user_data.username)):
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Username already taken"
         )
     
     # Create new user
-    hashed_password = get_password_hash(user_data.password)
+    hashed_password = await hash_password_async(user_data.password)
     db_user = User(
         email=user_data.email,
         username=user_data.username,
         hashed_password=hashed_password,
         full_name=user_data.full_name,
         user_type=user_data.user_type,
-        organization_name=user_data.organization_name
+        organization_name=user_data.organization_name,
+        industry_type=user_data.industry_type
     )
     db.add(db_user)
-    db.commit()
-    db.refresh(db_user)
+    await db.commit()
+    await db.refresh(db_user)
     
     return {
         "message": "User registered successfully",
@@ -109,11 +153,14 @@ async def register(user_data: UserRegister, db: Session = Depends(get_db)):
 
 
 @router.post("/auth/login", response_model=TokenResponse)
-async def login(credentials: UserLogin, db: Session = Depends(get_db)):
+async def login(credentials: UserLogin, db: AsyncSession = Depends(get_async_db)):
     """Login and get access token"""
-    user = db.query(User).filter(User.username == credentials.username).first()
+    user = await db.scalar(select(User).where(User.username == credentials.username))
     
-    if not user or not verify_password(credentials.password, user.hashed_password):
+    valid, new_hash = False, None
+    if user:
+        valid, new_hash = await verify_password_async(credentials.password, user.hashed_password)
+    if not valid:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect username or password"
@@ -125,7 +172,12 @@ async def login(credentials: UserLogin, db: Session = Depends(get_db)):
             detail="User account is inactive"
         )
     
-    access_token = create_access_token(data={"sub": user.id})
+    if new_hash:
+        # Stored hash predates the current BCRYPT_ROUNDS
+        user.hashed_password = new_hash
+        await db.commit()
+    
+    access_token = create_access_token(data={"sub": str(user.id)})
     
     return TokenResponse(
         access_token=access_token,
@@ -136,13 +188,15 @@ async def login(credentials: UserLogin, db: Session = Depends(get_db)):
             "email": user.email,
             "full_name": user.full_name,
             "user_type": user.user_type.value,
-            "organization_name": user.organization_name
+            "organization_name": user.organization_name,
+            "industry_type": user.industry_type,
+            "organization_id": user.organization_id
         }
     )
 
 
 @router.get("/auth/me", response_model=dict)
-async def get_current_user_info(current_user: User = Depends(get_current_active_user)):
+async def get_current_user_info(current_user: UserPrincipal = Depends(get_current_active_user)):
     """Get current user information"""
     return {
         "id": current_user.id,
@@ -150,7 +204,9 @@ async def get_current_user_info(current_user: User = Depends(get_current_active_
         "email": current_user.email,
         "full_name": current_user.full_name,
         "user_type": current_user.user_type.value,
-        "organization_name": current_user.organization_name
+        "organization_name": current_user.organization_name,
+        "industry_type": current_user.industry_type,
+        "organization_id": current_user.organization_id
     }
 
 
@@ -158,8 +214,8 @@ async def get_current_user_info(current_user: User = Depends(get_current_active_
 @router.post("/calculate", response_model=dict)
 async def calculate_carbon_footprint(
     entry_data: CarbonEntryInput,
-    current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    current_user: UserPrincipal = Depends(get_current_active_user),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Calculate carbon footprint from input data"""
     # Prepare data for calculator
@@ -172,15 +228,17 @@ async def calculate_carbon_footprint(
     # Create database entry
     db_entry = CarbonEntry(
         user_id=current_user.id,
-        **entry_data.dict(),
-        total_carbon_footprint=footprint_breakdown["total"],
+        **entry_data.dict(exclude={"period_start", "period_end"}),
+        **breakdown_to_columns(footprint_breakdown),
         category_breakdown=json.dumps(footprint_breakdown),
         period_start=entry_data.period_start or datetime.utcnow() - timedelta(days=30),
         period_end=entry_data.period_end or datetime.utcnow()
     )
     db.add(db_entry)
-    db.commit()
-    db.refresh(db_entry)
+    # Flushed, not committed: the entry, its recommendations, rollup, sketches
+    # and organization totals are committed together below
+    await db.flush()
+    await db.refresh(db_entry)
     
     # Generate recommendations
     recommendations = RecommendationEngine.generate_recommendations(
@@ -188,22 +246,22 @@ async def calculate_carbon_footprint(
         current_user.user_type
     )
     
-    # Save recommendations to database
-    for rec in recommendations:
-        db_rec = Recommendation(
-            user_id=current_user.id,
-            carbon_entry_id=db_entry.id,
-            category=rec.get("category", "general"),
-            title=rec.get("title", ""),
-            description=rec.get("description", ""),
-            impact_rating=rec.get("impact_rating", 0),
-            difficulty=rec.get("difficulty", "easy"),
-            estimated_reduction=rec.get("estimated_reduction", 0),
-            cost_estimate=rec.get("cost_estimate", "N/A"),
-            priority=rec.get("priority", 0)
-        )
-        db.add(db_rec)
-    db.commit()
+    # Refresh the user's standing recommendations
+    await db.run_sync(save_recommendations, current_user.id, [(db_entry.id, recommendations)])
+    await db.run_sync(apply_entries, current_user.id, [{
+        "id": db_entry.id,
+        "entry_date": db_entry.entry_date,
+        "total_carbon_footprint": db_entry.total_carbon_footprint,
+        "employee_count": db_entry.employee_count
+    }])
+    await db.run_sync(record_footprints, current_user, [db_entry.per_person_footprint])
+    await db.run_sync(record_organization_entries, current_user.id, [{
+        "entry_date": db_entry.entry_date,
+        **breakdown_to_columns(footprint_breakdown)
+    }])
+    await db.commit()
+    
+    await db.run_sync(_enqueue_retrain, current_user.id)
     
     return {
         "entry_id": db_entry.id,
@@ -212,42 +270,252 @@ async def calculate_carbon_footprint(
     }
 
 
+@router.post("/calculate/bulk", response_model=dict)
+async def calculate_carbon_footprint_bulk(
+    request: Request,
+    chunk_size: int = Query(DEFAULT_CHUNK_SIZE, ge=1, le=5000),
+    current_user: UserPrincipal = Depends(get_current_active_user),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    Calculate and store many carbon entries in one request
+    Accepts a JSON array of CarbonEntryInput objects, or an NDJSON stream
+    (Content-Type: application/x-ndjson) with one object per line.
+    Each chunk is calculated in one vectorized pass and written in a single
+    transaction; per-row entry ids or errors are returned in input order.
+    """
+    results = []
+    pending = []  # (index, validated row)
+    
+    async def flush():
+        if not pending:
+            return
+        try:
+            entry_ids = await db.run_sync(write_entries_chunk, current_user, [row for _, row in pending])
+            results.extend({"index": index, "entry_id": entry_id}
+                           for (index, _), entry_id in zip(pending, entry_ids))
+        except Exception:
+            # Driver errors carry the SQL and parameters; keep them in the server log
+            logger.exception("Bulk write of %d entries failed", len(pending))
+            results.extend({"index": index, "error": "Database write failed"}
+                           for index, _ in pending)
+        pending.clear()
+    
+    async def add(index: int, item):
+        try:
+            if not isinstance(item, dict):
+                raise ValueError("Entry must be a JSON object")
+            pending.append((index, CarbonEntryInput(**item).dict()))
+        except (ValidationError, ValueError) as e:
+            results.append({"index": index, "error": str(e)})
+        if len(pending) >= chunk_size:
+            await flush()
+    
+    content_type = request.headers.get("content-type", "")
+    if "ndjson" in content_type or "jsonlines" in content_type:
+        index = 0
+        buffer = b""
+        async for chunk in request.stream():
+            buffer += chunk
+            *lines, buffer = buffer.split(b"\n")
+            for line in lines:
+                if not line.strip():
+                    continue
+                try:
+                    await add(index, json.loads(line))
+                except json.JSONDecodeError as e:
+                    results.append({"index": index, "error": f"Invalid JSON: {e}"})
+                index += 1
+        if buffer.strip():
+            try:
+                await add(index, json.loads(buffer))
+            except json.JSONDecodeError as e:
+                results.append({"index": index, "error": f"Invalid JSON: {e}"})
+    else:
+        try:
+            payload = await request.json()
+        except json.JSONDecodeError:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Request body must be a JSON array or NDJSON stream"
+            )
+        if isinstance(payload, dict) and isinstance(payload.get("entries"), list):
+            payload = payload["entries"]
+        if not isinstance(payload, list):
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Request body must be a JSON array of entries"
+            )
+        for index, item in enumerate(payload):
+            await add(index, item)
+    await flush()
+    
+    results.sort(key=lambda r: r["index"])
+    inserted = sum(1 for r in results if "entry_id" in r)
+    if inserted:
+        await db.run_sync(_enqueue_retrain, current_user.id)
+    return {
+        "processed": len(results),
+        "inserted": inserted,
+        "failed": len(results) - inserted,
+        "results": results
+    }
+
+
+@router.post("/import", response_model=dict)
+async def import_historical_entries(
+    file: UploadFile = File(...),
+    file_format: Optional[str] = Form(None),
+    column_map: Optional[str] = Form(None),
+    chunk_size: int = Query(DEFAULT_CHUNK_SIZE, ge=1, le=50000),
+    current_user: UserPrincipal = Depends(get_current_active_user),
+    db: Session = Depends(get_db)
+):
+    """
+    Import a CSV or Parquet export of historical entries
+    The upload is streamed in chunk_size batches; column_map is an optional
+    JSON object renaming file columns to CarbonEntry fields.
+    """
+    try:
+        file_format = file_format or detect_format(file.filename or "")
+        compression = detect_compression(file.filename or "")
+        mapping = json.loads(column_map) if column_map else None
+    except (ValueError, json.JSONDecodeError) as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    
+    try:
+        stats = await run_in_threadpool(
+            import_entries, db, current_user, file.file, file_format, chunk_size, mapping,
+            compression=compression
+        )
+    except (ValueError, ImportError) as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    
+    if stats["inserted"]:
+        await run_in_threadpool(_enqueue_retrain, db, current_user.id)
+    return stats
+
+
+# Output fields of /entries and the columns each one reads
+ENTRY_FIELDS = {
+    "id": [CarbonEntry.id],
+    "total_carbon_footprint": [CarbonEntry.total_carbon_footprint],
+    "category_breakdown": [getattr(CarbonEntry, column) for column in BREAKDOWN_COLUMNS.values()] + [CarbonEntry.breakdown_shape],
+    "entry_date": [CarbonEntry.entry_date],
+    "period_start": [CarbonEntry.period_start],
+    "period_end": [CarbonEntry.period_end],
+    "notes": [CarbonEntry.notes]
+}
+
+
+ENTRY_SERIALIZERS = {
+    "id": lambda row: row.id,
+    "total_carbon_footprint": lambda row: row.total_carbon_footprint,
+    "category_breakdown": breakdown_from_columns,
+    "entry_date": lambda row: row.entry_date,
+    "period_start": lambda row: row.period_start,
+    "period_end": lambda row: row.period_end,
+    "notes": lambda row: row.notes
+}
+
+
+def _encode_cursor(entry_date: datetime, entry_id: int) -> str:
+    """Opaque position of the last returned entry"""
+    raw = json.dumps([entry_date.isoformat(), entry_id]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def _decode_cursor(cursor: str):
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        entry_date, entry_id = json.loads(raw)
+        return datetime.fromisoformat(entry_date), int(entry_id)
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor")
+
+
 @router.get("/entries", response_model=List[dict])
 async def get_user_entries(
-    current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db),
-    limit: int = 10
+    current_user: UserPrincipal = Depends(get_current_active_user),
+    db: AsyncSession = Depends(get_async_db),
+    limit: int = Query(10, ge=1, le=1000),
+    cursor: Optional[str] = None,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    fields: Optional[str] = Query(None, description="Comma-separated output fields (default: all)")
 ):
-    """Get user's carbon footprint entries"""
-    entries = db.query(CarbonEntry).filter(
-        CarbonEntry.user_id == current_user.id
-    ).order_by(desc(CarbonEntry.entry_date)).limit(limit).all()
+    """
+    Get user's carbon footprint entries, newest first.
+    Pages are keyed on (entry_date, id) rather than OFFSET, so every page is an
+    index range read; pass the X-Next-Cursor header of one response as
+    `cursor` to fetch the next page.
+    """
+    if fields:
+        selected = [name.strip() for name in fields.split(",") if name.strip()]
+        unknown = [name for name in selected if name not in ENTRY_FIELDS]
+        if unknown or not selected:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Unknown fields: {', '.join(unknown)}. Allowed: {', '.join(ENTRY_FIELDS)}"
+            )
+    else:
+        selected = list(ENTRY_FIELDS)
     
-    return [
-        {
-            "id": entry.id,
-            "total_carbon_footprint": entry.total_carbon_footprint,
-            "category_breakdown": json.loads(entry.category_breakdown) if entry.category_breakdown else {},
-            "entry_date": entry.entry_date.isoformat() if entry.entry_date else None,
-            "period_start": entry.period_start.isoformat() if entry.period_start else None,
-            "period_end": entry.period_end.isoformat() if entry.period_end else None,
-            "notes": entry.notes
-        }
-        for entry in entries
-    ]
+    # id and entry_date are always read to build the next cursor
+    columns = {CarbonEntry.id.key: CarbonEntry.id, CarbonEntry.entry_date.key: CarbonEntry.entry_date}
+    for name in selected:
+        for column in ENTRY_FIELDS[name]:
+            columns[column.key] = column
+    
+    query = select(*columns.values()).where(CarbonEntry.user_id == current_user.id)
+    if start:
+        query = query.where(CarbonEntry.entry_date >= start)
+    if end:
+        query = query.where(CarbonEntry.entry_date < end)
+    if cursor:
+        last_date, last_id = _decode_cursor(cursor)
+        # Compare against the anchor row's stored entry_date rather than the
+        # decoded one: SQLite keeps server-default timestamps without
+        # fractional seconds, so a re-bound value would not compare equal.
+        # The decoded date only stands in if the anchor row is gone.
+        anchor = func.coalesce(
+            select(CarbonEntry.entry_date).where(
+                CarbonEntry.id == last_id, CarbonEntry.user_id == current_user.id
+            ).scalar_subquery(),
+            last_date
+        )
+        # A range on entry_date plus a tie-break, so the (user_id, entry_date)
+        # index bounds the scan
+        query = query.where(
+            CarbonEntry.entry_date <= anchor,
+            (CarbonEntry.entry_date < anchor) | (CarbonEntry.id < last_id)
+        )
+    query = query.order_by(desc(CarbonEntry.entry_date), desc(CarbonEntry.id)).limit(limit + 1)
+    
+    rows = (await db.execute(query)).all()
+    headers = {}
+    if len(rows) > limit:
+        rows = rows[:limit]
+        if rows[-1].entry_date is not None:
+            headers["X-Next-Cursor"] = _encode_cursor(rows[-1].entry_date, rows[-1].id)
+    
+    return FastJSONResponse([
+        {name: ENTRY_SERIALIZERS[name](row) for name in selected}
+        for row in rows
+    ], headers=headers)
 
 
 @router.get("/entries/{entry_id}", response_model=dict)
 async def get_entry(
     entry_id: int,
-    current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    current_user: UserPrincipal = Depends(get_current_active_user),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Get specific carbon footprint entry"""
-    entry = db.query(CarbonEntry).filter(
+    entry = await db.scalar(select(CarbonEntry).where(
         CarbonEntry.id == entry_id,
         CarbonEntry.user_id == current_user.id
-    ).first()
+    ))
     
     if not entry:
         raise HTTPException(
@@ -255,69 +523,109 @@ async def get_entry(
             detail="Entry not found"
         )
     
-    recommendations = db.query(Recommendation).filter(
-        Recommendation.carbon_entry_id == entry_id
-    ).all()
+    # Recommendations are kept per user, not per entry; regenerate this
+    # entry's set from its breakdown and match it to the stored state
+    breakdown = breakdown_from_columns(entry)
+    state = {
+        (rec.category, rec.title): rec
+        for rec in (await db.scalars(select(Recommendation).where(
+            Recommendation.user_id == current_user.id
+        ))).all()
+    }
+    recommendations = []
+    for rec in RecommendationEngine.generate_recommendations(breakdown, current_user.user_type):
+        stored = state.get((rec["category"], rec["title"]))
+        recommendations.append({
+            "id": stored.id if stored else None,
+            "category": rec["category"],
+            "title": rec["title"],
+            "description": rec["description"],
+            "impact_rating": rec["impact_rating"],
+            "difficulty": rec["difficulty"],
+            "estimated_reduction": rec["estimated_reduction"],
+            "cost_estimate": rec["cost_estimate"],
+            "priority": rec["priority"],
+            "is_implemented": bool(stored.is_implemented) if stored else False
+        })
     
     return {
         "id": entry.id,
         "total_carbon_footprint": entry.total_carbon_footprint,
-        "category_breakdown": json.loads(entry.category_breakdown) if entry.category_breakdown else {},
+        "category_breakdown": breakdown,
         "entry_date": entry.entry_date.isoformat() if entry.entry_date else None,
-        "recommendations": [
-            {
-                "id": rec.id,
-                "category": rec.category,
-                "title": rec.title,
-                "description": rec.description,
-                "impact_rating": rec.impact_rating,
-                "difficulty": rec.difficulty,
-                "estimated_reduction": rec.estimated_reduction,
-                "cost_estimate": rec.cost_estimate,
-                "priority": rec.priority
-            }
-            for rec in recommendations
-        ]
+        "recommendations": recommendations
+    }
+
+
+def _recommendation_dict(rec: Recommendation) -> dict:
+    return {
+        "id": rec.id,
+        "category": rec.category,
+        "title": rec.title,
+        "description": rec.description,
+        "impact_rating": rec.impact_rating,
+        "difficulty": rec.difficulty,
+        "estimated_reduction": rec.estimated_reduction,
+        "cost_estimate": rec.cost_estimate,
+        "priority": rec.priority,
+        "created_at": rec.created_at,
+        "last_recommended_at": rec.last_recommended_at,
+        "is_implemented": bool(rec.is_implemented),
+        "implemented_at": rec.implemented_at
     }
 
 
 @router.get("/recommendations", response_model=List[dict])
 async def get_recommendations(
-    current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    include_implemented: bool = False,
+    current_user: UserPrincipal = Depends(get_current_active_user),
+    db: AsyncSession = Depends(get_async_db)
 ):
-    """Get user's recommendations"""
-    recommendations = db.query(Recommendation).filter(
-        Recommendation.user_id == current_user.id,
-        Recommendation.is_implemented == 0
-    ).order_by(desc(Recommendation.priority)).all()
+    """
+    Get user's recommendations: one per (category, title) with the estimate
+    and priority from the latest entry that produced it; equal priorities
+    list the most recently recommended first
+    """
+    query = select(Recommendation).where(Recommendation.user_id == current_user.id)
+    if not include_implemented:
+        query = query.where(Recommendation.is_implemented == 0)
+    recommendations = (await db.scalars(query.order_by(
+        desc(Recommendation.priority), desc(Recommendation.last_recommended_at), desc(Recommendation.id)
+    ))).all()
     
-    return [
-        {
-            "id": rec.id,
-            "category": rec.category,
-            "title": rec.title,
-            "description": rec.description,
-            "impact_rating": rec.impact_rating,
-            "difficulty": rec.difficulty,
-            "estimated_reduction": rec.estimated_reduction,
-            "cost_estimate": rec.cost_estimate,
-            "priority": rec.priority,
-            "created_at": rec.created_at.isoformat() if rec.created_at else None
-        }
-        for rec in recommendations
-    ]
+    return FastJSONResponse([_recommendation_dict(rec) for rec in recommendations])
+
+
+@router.put("/recommendations/{recommendation_id}", response_model=dict)
+async def update_recommendation(
+    recommendation_id: int,
+    update: RecommendationUpdate,
+    current_user: UserPrincipal = Depends(get_current_active_user),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Mark a recommendation implemented (or not); later entries never reopen it"""
+    rec = await db.scalar(select(Recommendation).where(
+        Recommendation.id == recommendation_id,
+        Recommendation.user_id == current_user.id
+    ))
+    if not rec:
+        raise HTTPException(status_code=404, detail="Recommendation not found")
+    
+    if bool(rec.is_implemented) != update.is_implemented:
+        rec.is_implemented = int(update.is_implemented)
+        rec.implemented_at = datetime.utcnow() if update.is_implemented else None
+        await db.commit()
+        await db.refresh(rec)
+    return FastJSONResponse(_recommendation_dict(rec))
 
 
 @router.get("/analytics/summary", response_model=dict)
 async def get_analytics_summary(
-    current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    current_user: UserPrincipal = Depends(get_current_active_user),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Get analytics summary for user"""
-    entries = db.query(CarbonEntry).filter(
-        CarbonEntry.user_id == current_user.id
-    ).order_by(desc(CarbonEntry.entry_date)).limit(12).all()
+    entries = recent_entries(await db.run_sync(get_rollup, current_user.id))
     
     if not entries:
         return {
@@ -326,13 +634,13 @@ async def get_analytics_summary(
             "trend": "no_data"
         }
     
-    total_footprints = [e.total_carbon_footprint for e in entries]
+    total_footprints = [e["total_carbon_footprint"] for e in entries]
     avg_footprint = sum(total_footprints) / len(total_footprints)
     
     # Calculate trend
     if len(entries) >= 2:
-        recent = entries[0].total_carbon_footprint
-        previous = entries[1].total_carbon_footprint
+        recent = entries[0]["total_carbon_footprint"]
+        previous = entries[1]["total_carbon_footprint"]
         if recent < previous * 0.95:
             trend = "decreasing"
         elif recent > previous * 1.05:
@@ -345,57 +653,244 @@ async def get_analytics_summary(
     return {
         "total_entries": len(entries),
         "average_footprint": round(avg_footprint, 2),
-        "latest_footprint": round(entries[0].total_carbon_footprint, 2),
+        "latest_footprint": round(entries[0]["total_carbon_footprint"], 2),
         "trend": trend
     }
 
 
+@router.get("/analytics/categories", response_model=dict)
+async def get_category_totals(
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    current_user: UserPrincipal = Depends(get_current_active_user),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Per-category emission totals, averages and shares (aggregated in SQL)"""
+    categories = [key for key in BREAKDOWN_COLUMNS if key not in ("total", "per_person")]
+    columns = [getattr(CarbonEntry, BREAKDOWN_COLUMNS[key]) for key in categories]
+    query = select(
+        func.count(CarbonEntry.id),
+        func.sum(CarbonEntry.total_carbon_footprint),
+        func.avg(CarbonEntry.per_person_footprint),
+        *[func.sum(column) for column in columns]
+    ).where(CarbonEntry.user_id == current_user.id)
+    if start:
+        query = query.where(CarbonEntry.entry_date >= start)
+    if end:
+        query = query.where(CarbonEntry.entry_date < end)
+    
+    count, total, avg_per_person, *sums = (await db.execute(query)).one()
+    total = total or 0
+    return {
+        "total_entries": count,
+        "total_footprint": round(total, 2),
+        "average_per_person": round(avg_per_person or 0, 2),
+        "categories": {
+            key: {
+                "total": round(value or 0, 2),
+                "average": round((value or 0) / count, 2) if count else 0,
+                "share_percent": round((value or 0) / total * 100, 2) if total > 0 else 0
+            }
+            for key, value in zip(categories, sums)
+        }
+    }
+
+
+@router.get("/analytics/timeseries", response_model=dict)
+async def get_emissions_timeseries(
+    bucket: str = Query("month", pattern=f"^({'|'.join(BUCKETS)})$"),
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    current_user: UserPrincipal = Depends(get_current_active_user),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Emissions per day/week/month/quarter and category (grouped in SQL, cached until new entries land)"""
+    key = (current_user.id, bucket, start, end)
+    cached = timeseries_cache.get(key)
+    if cached is not None:
+        return FastJSONResponse(cached)
+    
+    with timeseries_cache.computing(current_user.id) as generation:
+        try:
+            result = await db.run_sync(bucketed_emissions, current_user.id, bucket, start, end)
+        except ValueError as e:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+        timeseries_cache.put(key, result, generation)
+    return FastJSONResponse(result)
+
+
+def _cached_predictor(user_id: int, watermark: tuple, scope: str):
+    """
+    Latest trained model for a user without fitting inline
+    Returns (predictor, model_status, training_job). A model trained on older
+    data is still served ("stale") while a retrain is queued; predictor is
+    None only when the user has no model yet.
+    """
+    predictor = model_store.get(user_id, watermark, scope=scope)
+    if predictor is not None:
+        return predictor, "fresh", None
+    
+    job = training_queue.submit(user_id, scope=scope)
+    if job["status"] == "completed":  # inline mode (TRAINING_WORKERS=0)
+        return model_store.get(user_id, watermark, scope=scope), "fresh", job
+    
+    latest = model_store.get_latest(user_id, scope=scope)
+    if latest is not None:
+        return latest[1], "stale", job
+    return None, "training", job
+
+
+def _global_forecast(historical_data: List[dict], forecast_periods: int, user: UserPrincipal) -> Optional[dict]:
+    """Forecast with the fleet-wide model if one is deployed, else None"""
+    global_model = load_global_model()
+    if global_model is None:
+        return None
+    predictions = global_model.predict(historical_data, forecast_periods, user.user_type)
+    if "error" in predictions:
+        return None
+    return {
+        "predictions": predictions,
+        "model_metrics": global_model.training_metrics,
+        "model_version": global_model.metadata.get("version")
+    }
+
+
+def _enqueue_retrain(db: Session, user_id: int):
+    """Queue a forecast retrain once the user has enough history"""
+    if entry_watermark(db, user_id)[1] >= 2:
+        training_queue.submit(user_id, scope="predict")
+
+
 # Research-grade API endpoints
 @router.post("/predict", response_model=dict)
 async def predict_footprint(
-    forecast_periods: int = 12,
-    current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    forecast_periods: int = Query(12, ge=1, le=120),
+    mode: str = Query("auto", pattern="^(auto|global|per_user)$"),
+    current_user: UserPrincipal = Depends(get_current_active_user),
+    db: AsyncSession = Depends(get_async_db)
 ):
-    """Predict future carbon footprint using ML models"""
-    entries = db.query(CarbonEntry).filter(
-        CarbonEntry.user_id == current_user.id
-    ).order_by(desc(CarbonEntry.entry_date)).limit(24).all()
+    """
+    Predict future carbon footprint using ML models
+    mode=auto uses the fleet-wide model when one is deployed and falls back
+    to the per-user model otherwise; mode=global returns 503 instead of
+    falling back. The per-user path serves the latest
+    trained model immediately; training runs in the background queue and
+    202 with a job handle is returned if no model exists yet.
+    """
+    historical_data = await db.run_sync(load_history, current_user.id, SCOPE_LIMITS["predict"])
     
-    if len(entries) < 2:
+    if len(historical_data) < 2:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Insufficient historical data for prediction. Need at least 2 entries."
         )
     
-    # Convert to dict format
-    historical_data = [
-        {
-            "entry_date": e.entry_date.isoformat() if e.entry_date else None,
-            "total_carbon_footprint": e.total_carbon_footprint,
-            "category_breakdown": json.loads(e.category_breakdown) if e.category_breakdown else {}
-        }
-        for e in reversed(entries)  # Reverse to chronological order
-    ]
+    if mode != "per_user":
+        global_result = _global_forecast(historical_data, forecast_periods, current_user)
+        if global_result is not None:
+            return {
+                **global_result,
+                "model_status": "global",
+                "training_job": None,
+                "methodology": "global_ensemble_with_user_conditioning"
+            }
+        if mode == "global":
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="No global forecasting model is deployed; use mode=auto or mode=per_user"
+            )
     
-    # Create and train predictor (optimized for CPU, no GPU needed)
-    # Uses lightweight ensemble model that runs efficiently on standard hardware
-    predictor = CarbonFootprintPredictor(model_type="ensemble")
-    training_metrics = predictor.train(historical_data)
+    predictor, model_status, job = _cached_predictor(
+        current_user.id,
+        await db.run_sync(entry_watermark, current_user.id),
+        scope="predict"
+    )
+    
+    if predictor is None:
+        return JSONResponse(
+            status_code=status.HTTP_202_ACCEPTED,
+            content={
+                "status": "training",
+                "training_job": job,
+                "poll_url": f"/api/predict/jobs/{job['job_id']}"
+            }
+        )
     
     # Generate predictions
     predictions = predictor.predict(historical_data, forecast_periods=forecast_periods)
     
     return {
         "predictions": predictions,
-        "model_metrics": training_metrics,
+        "model_metrics": predictor.training_metrics,
+        "model_status": model_status,
+        "training_job": job,
         "methodology": "ensemble_random_forest_gradient_boosting"
     }
 
 
+@router.get("/predict/jobs/{job_id}", response_model=dict)
+async def get_training_job(
+    job_id: str,
+    current_user: UserPrincipal = Depends(get_current_active_user)
+):
+    """Poll a background training job"""
+    job = training_queue.get_job(job_id)
+    if not job or job["user_id"] != current_user.id:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+
+@router.get("/admin/training/stats", response_model=dict)
+async def get_training_stats(
+    current_user: UserPrincipal = Depends(require_user_type([UserType.ADMIN]))
+):
+    """Training queue depth, job latency and worker utilisation"""
+    return training_queue.get_stats()
+
+
+@router.get("/admin/database/pool", response_model=dict)
+async def get_database_pool_stats(
+    current_user: UserPrincipal = Depends(require_user_type([UserType.ADMIN]))
+):
+    """Connection pool usage and the database tuning profile in effect"""
+    return await run_in_threadpool(pool_stats)
+
+
+@router.get("/admin/auth/cache", response_model=dict)
+async def get_auth_cache_stats(
+    current_user: UserPrincipal = Depends(require_user_type([UserType.ADMIN]))
+):
+    """Authenticated-user cache size and hit/miss counters"""
+    return user_cache.get_stats()
+
+
+@router.get("/admin/auth/hashing", response_model=dict)
+async def get_password_hashing_stats(
+    current_user: UserPrincipal = Depends(require_user_type([UserType.ADMIN]))
+):
+    """bcrypt cost, executor queue depth, rejections and hash latency"""
+    return password_hasher.get_stats()
+
+
+@router.get("/admin/analytics/cache", response_model=dict)
+async def get_timeseries_cache_stats(
+    current_user: UserPrincipal = Depends(require_user_type([UserType.ADMIN]))
+):
+    """Hit rate and size of the time series cache"""
+    return timeseries_cache.get_stats()
+
+
+@router.get("/admin/benchmarks/cache", response_model=dict)
+async def get_benchmark_stats_cache(
+    current_user: UserPrincipal = Depends(require_user_type([UserType.ADMIN]))
+):
+    """Benchmark cohort statistics cache state and rebuild counters"""
+    return benchmark_stats_cache.get_stats()
+
+
 @router.get("/iot/sensors", response_model=dict)
 async def get_iot_sensors(
-    current_user: User = Depends(get_current_active_user)
+    current_user: UserPrincipal = Depends(get_current_active_user)
 ):
     """Get IoT sensor network status and readings"""
     # Mock IoT sensor data since simulator was removed
@@ -412,7 +907,7 @@ async def get_iot_sensors(
 @router.get("/iot/sensors/history", response_model=dict)
 async def get_iot_history(
     hours: int = 24,
-    current_user: User = Depends(get_current_active_user)
+    current_user: UserPrincipal = Depends(get_current_active_user)
 ):
     """Get historical IoT sensor data"""
     return {
@@ -428,103 +923,286 @@ async def get_iot_history(
 async def compare_with_benchmark(
     entry_id: Optional[int] = None,
     industry_type: Optional[str] = None,
-    current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    current_user: UserPrincipal = Depends(get_current_active_user),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Compare carbon footprint against industry benchmarks"""
     if entry_id:
-        entry = db.query(CarbonEntry).filter(
+        entry = await db.scalar(select(CarbonEntry).where(
             CarbonEntry.id == entry_id,
             CarbonEntry.user_id == current_user.id
-        ).first()
+        ))
         if not entry:
             raise HTTPException(status_code=404, detail="Entry not found")
         footprint = entry.total_carbon_footprint
         employee_count = entry.employee_count or 1
     else:
         # Use latest entry
-        entry = db.query(CarbonEntry).filter(
-            CarbonEntry.user_id == current_user.id
-        ).order_by(desc(CarbonEntry.entry_date)).first()
-        if not entry:
+        rollup = await db.run_sync(get_rollup, current_user.id)
+        if not rollup.entry_count:
             raise HTTPException(status_code=404, detail="No entries found")
-        footprint = entry.total_carbon_footprint
-        employee_count = entry.employee_count or 1
+        footprint = rollup.latest_footprint
+        employee_count = rollup.latest_employee_count or 1
     
-    comparison = BenchmarkAnalyzer.compare_with_benchmark(
-        footprint,
-        current_user.user_type,
-        employee_count,
-        db,
-        industry_type
+    comparison = await db.run_sync(
+        lambda session: BenchmarkAnalyzer.compare_with_benchmark(
+            footprint,
+            current_user.user_type,
+            employee_count,
+            session,
+            industry_type
+        )
     )
     
     return comparison
 
 
+@router.get("/benchmark/population", response_model=dict)
+async def population_percentile(
+    entry_id: Optional[int] = None,
+    industry_type: Optional[str] = None,
+    all_industries: bool = False,
+    current_user: UserPrincipal = Depends(get_current_active_user),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    Percentile rank of a per-person footprint among all entries from users of
+    the same type (and industry, unless all_industries is set)
+    """
+    if entry_id:
+        entry = await db.scalar(select(CarbonEntry).where(
+            CarbonEntry.id == entry_id,
+            CarbonEntry.user_id == current_user.id
+        ))
+        if not entry:
+            raise HTTPException(status_code=404, detail="Entry not found")
+        per_person = entry.per_person_footprint
+    else:
+        rollup = await db.run_sync(get_rollup, current_user.id)
+        if not rollup.entry_count:
+            raise HTTPException(status_code=404, detail="No entries found")
+        per_person = (rollup.latest_footprint or 0) / (rollup.latest_employee_count or 1)
+
+    industry = None if all_industries else (industry_type or current_user.industry_type)
+    ranking = await db.run_sync(population_rank, current_user.user_type, industry, per_person)
+    return {
+        "user_type": current_user.user_type.value,
+        "industry_type": industry,
+        "per_person_footprint": round(per_person or 0, 2),
+        **ranking,
+        "method": "t-digest",
+        "compression": QUANTILE_SKETCH_COMPRESSION
+    }
+
+
+
+# Organization Routes
+async def _caller_organization(db: AsyncSession, current_user: UserPrincipal) -> Optional[Organization]:
+    if current_user.organization_id is None:
+        return None
+    return await db.get(Organization, current_user.organization_id)
+
+
+async def _managed_organization(db: AsyncSession, current_user: UserPrincipal, organization_id: int) -> Organization:
+    """The node, if the caller is an admin or belongs to it or one of its ancestors"""
+    node = await db.get(Organization, organization_id)
+    if node is None:
+        raise HTTPException(status_code=404, detail="Organization not found")
+    if current_user.user_type != UserType.ADMIN and not in_subtree(node, await _caller_organization(db, current_user)):
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not a member of this organization")
+    return node
+
+
+def _organization_dict(node: Organization) -> dict:
+    return {"id": node.id, "name": node.name, "parent_id": node.parent_id, "path": node.path}
+
+
+@router.post("/organizations", response_model=dict)
+async def add_organization(
+    organization: OrganizationCreate,
+    current_user: UserPrincipal = Depends(require_user_type([UserType.CORPORATION, UserType.INSTITUTION, UserType.ADMIN])),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    Create a site under parent_id, or a new root organization. A caller
+    outside any organization joins the root they create.
+    """
+    parent = await _managed_organization(db, current_user, organization.parent_id) if organization.parent_id else None
+
+    def create(session: Session) -> Organization:
+        node = create_organization(session, organization.name, parent)
+        if parent is None and current_user.organization_id is None:
+            assign_user(session, session.get(User, current_user.id), node)
+        return node
+
+    node = await db.run_sync(create)
+    await db.commit()
+    return _organization_dict(node)
+
+
+@router.post("/organizations/{organization_id}/members", response_model=dict)
+async def add_organization_member(
+    organization_id: int,
+    member: OrganizationMember,
+    current_user: UserPrincipal = Depends(get_current_active_user),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    Attach a user to a node; their existing entries move into its totals.
+    Admins attach anyone and managers move users within their own subtree
+    directly. Anyone else is invited and joins only once they accept.
+    """
+    node = await _managed_organization(db, current_user, organization_id)
+    user = await db.scalar(select(User).where(User.username == member.username))
+    if user is None:
+        raise HTTPException(status_code=404, detail="User not found")
+    direct = current_user.user_type == UserType.ADMIN or (
+        user.organization_id is not None
+        and in_subtree(await db.get(Organization, user.organization_id), await _caller_organization(db, current_user))
+    )
+
+    if not direct:
+        invite = await db.run_sync(lambda session: invite_user(session, node, user, current_user.id))
+        await db.commit()
+        return {
+            "user_id": user.id,
+            "username": user.username,
+            "organization": _organization_dict(node),
+            "status": "invited",
+            "invite_id": invite.id
+        }
+
+    await db.run_sync(lambda session: assign_user(session, user, node))
+    await db.commit()
+    return {"user_id": user.id, "username": user.username, "organization": _organization_dict(node), "status": "member"}
+
+
+async def _own_invite(db: AsyncSession, current_user: UserPrincipal, invite_id: int) -> OrganizationInvite:
+    invite = await db.scalar(select(OrganizationInvite).where(
+        OrganizationInvite.id == invite_id,
+        OrganizationInvite.user_id == current_user.id
+    ))
+    if invite is None:
+        raise HTTPException(status_code=404, detail="Invite not found")
+    return invite
+
+
+@router.get("/organizations/invites", response_model=List[dict])
+async def get_organization_invites(
+    current_user: UserPrincipal = Depends(get_current_active_user),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Pending invites to join an organization node"""
+    rows = (await db.execute(
+        select(OrganizationInvite, Organization).join(
+            Organization, Organization.id == OrganizationInvite.organization_id
+        ).where(OrganizationInvite.user_id == current_user.id).order_by(OrganizationInvite.id)
+    )).all()
+    return [
+        {"id": invite.id, "organization": _organization_dict(node), "created_at": invite.created_at}
+        for invite, node in rows
+    ]
+
+
+@router.post("/organizations/invites/{invite_id}/accept", response_model=dict)
+async def accept_organization_invite(
+    invite_id: int,
+    current_user: UserPrincipal = Depends(get_current_active_user),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Join the inviting node, leaving any current one; existing entries move with the user"""
+    invite = await _own_invite(db, current_user, invite_id)
+    user = await db.get(User, current_user.id)
+    node = await db.run_sync(lambda session: accept_invite(session, invite, user))
+    await db.commit()
+    return {"user_id": user.id, "username": user.username, "organization": _organization_dict(node), "status": "member"}
+
+
+@router.delete("/organizations/invites/{invite_id}", response_model=dict)
+async def decline_organization_invite(
+    invite_id: int,
+    current_user: UserPrincipal = Depends(get_current_active_user),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Decline a pending invite"""
+    invite = await _own_invite(db, current_user, invite_id)
+    await db.delete(invite)
+    await db.commit()
+    return {"message": "Invite declined"}
+
+
+@router.get("/organizations/{organization_id}/totals", response_model=dict)
+async def get_organization_totals(
+    organization_id: int,
+    bucket: str = Query("quarter", pattern=f"^({'|'.join(ORG_BUCKETS)})$"),
+    period: Optional[datetime] = None,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    current_user: UserPrincipal = Depends(get_current_active_user),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    Footprint totals over a node and every site below it, per month, quarter
+    or year. `period` selects the single period containing that date.
+    """
+    node = await _managed_organization(db, current_user, organization_id)
+    series = await db.run_sync(organization_totals, node.id, bucket, start, end, period)
+    return {
+        "organization": _organization_dict(node),
+        "bucket": bucket,
+        "series": series
+    }
+
+
 # IoT routes removed
 @router.get("/research/report", response_model=dict)
 async def get_research_report(
-    current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    current_user: UserPrincipal = Depends(get_current_active_user),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Generate comprehensive research report"""
-    # Get user entries
-    entries = db.query(CarbonEntry).filter(
-        CarbonEntry.user_id == current_user.id
-    ).order_by(desc(CarbonEntry.entry_date)).all()
+    rollup = await db.run_sync(get_rollup, current_user.id)
     
-    if not entries:
+    if not rollup.entry_count:
         raise HTTPException(status_code=404, detail="No data available for report")
     
-    entries_dict = [
-        {
-            "entry_date": e.entry_date.isoformat() if e.entry_date else None,
-            "total_carbon_footprint": e.total_carbon_footprint,
-            "employee_count": e.employee_count or 1
-        }
-        for e in entries
-    ]
-    
-    # Get benchmarks
-    benchmarks = db.query(IndustryBenchmark).filter(
-        IndustryBenchmark.user_type == current_user.user_type
-    ).all()
-    
-    # Generate comparative report
-    comparative_report = BenchmarkAnalyzer.generate_comparative_report(
-        entries_dict,
-        benchmarks,
+    # Generate comparative report from the maintained rollup and the
+    # cached benchmark cohort
+    comparative_report = BenchmarkAnalyzer.compare_statistics(
+        await db.run_sync(summary_statistics, rollup),
+        await db.run_sync(benchmark_stats_cache.get, current_user.user_type),
         current_user.user_type
     )
     
     # Add predictions if enough data
     predictions_data = None
-    if len(entries) >= 2:
-        historical_data = [
-            {
-                "entry_date": e.entry_date.isoformat() if e.entry_date else None,
-                "total_carbon_footprint": e.total_carbon_footprint,
-                "category_breakdown": json.loads(e.category_breakdown) if e.category_breakdown else {}
-            }
-            for e in reversed(entries)
-        ]
-        predictor = CarbonFootprintPredictor(model_type="ensemble")
-        predictor.train(historical_data)
-        predictions_data = predictor.predict(historical_data, forecast_periods=12)
+    if rollup.entry_count >= 2:
+        predictor, model_status, _ = _cached_predictor(
+            current_user.id,
+            await db.run_sync(entry_watermark, current_user.id),
+            scope="report"
+        )
+        if predictor is not None:
+            # Forecast features depend on the whole series, so only the
+            # columns the model reads are loaded
+            historical_data = await db.run_sync(load_history, current_user.id, SCOPE_LIMITS["report"])
+            predictions_data = predictor.predict(historical_data, forecast_periods=12)
+            predictions_data["model_status"] = model_status
+        else:
+            predictions_data = {"status": "training"}
     
-    return {
+    return FastJSONResponse({
         "user_info": {
             "user_type": current_user.user_type.value,
             "organization": current_user.organization_name,
-            "total_entries": len(entries)
+            "total_entries": rollup.entry_count
         },
         "comparative_analysis": comparative_report,
         "predictions": predictions_data,
         "research_metadata": {
-            "report_generated": datetime.utcnow().isoformat(),
+            "report_generated": datetime.utcnow(),
             "methodology": "ml_ensemble_prediction_with_benchmark_analysis",
-            "data_points": len(entries)
+            "data_points": rollup.entry_count
         }
-    }
+    })
 
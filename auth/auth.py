@@ -2,14 +2,15 @@
 Authentication and authorization utilities
 """
 from datetime import datetime, timedelta
-from typing import Optional
+from typing import Optional, Tuple
 from jose import JWTError, jwt
-from passlib.context import CryptContext
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
-from sqlalchemy.orm import Session
-from database.database import get_db
+from sqlalchemy.ext.asyncio import AsyncSession
+from database.database import get_async_db
 from database.models import User, UserType
+from auth.user_cache import UserPrincipal, user_cache
+from auth.password_hasher import pwd_context, password_hasher, PasswordHasherBusy
 import os
 from dotenv import load_dotenv
 
@@ -19,7 +20,6 @@ SECRET_KEY = os.getenv("SECRET_KEY", "your-secret-key-change-in-production")
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 30 * 24 * 60  # 30 days
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="api/auth/login")
 
 
@@ -33,6 +33,34 @@ def get_password_hash(password: str) -> str:
     return pwd_context.hash(password)
 
 
+def _hashing_busy() -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        detail="Too many concurrent login attempts, please retry",
+        headers={"Retry-After": "1"},
+    )
+
+
+async def hash_password_async(password: str) -> str:
+    """Hash a password on the bounded bcrypt executor"""
+    try:
+        return await password_hasher.hash(password)
+    except PasswordHasherBusy:
+        raise _hashing_busy()
+
+
+async def verify_password_async(plain_password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+    """
+    Verify a password on the bounded bcrypt executor
+    Returns (valid, new_hash); new_hash is a re-hash at the configured cost
+    when the stored hash uses a different one.
+    """
+    try:
+        return await password_hasher.verify_and_update(plain_password, hashed_password)
+    except PasswordHasherBusy:
+        raise _hashing_busy()
+
+
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     """Create a JWT access token"""
     to_encode = data.copy()
@@ -47,9 +75,13 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
 
 async def get_current_user(
     token: str = Depends(oauth2_scheme),
-    db: Session = Depends(get_db)
-) -> User:
-    """Get current authenticated user"""
+    db: AsyncSession = Depends(get_async_db)
+) -> UserPrincipal:
+    """
+    Get current authenticated user
+    Resolved principals are cached per (user id, token), so repeat requests
+    with the same token skip the users table.
+    """
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
@@ -57,21 +89,28 @@ async def get_current_user(
     )
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        user_id: int = payload.get("sub")
-        if user_id is None:
+        subject = payload.get("sub")
+        if subject is None:
             raise credentials_exception
-    except JWTError:
+        user_id = int(subject)
+    except (JWTError, ValueError):
         raise credentials_exception
     
-    user = db.query(User).filter(User.id == user_id).first()
+    principal = user_cache.get(user_id, token)
+    if principal is not None:
+        return principal
+    
+    user = await db.get(User, user_id)
     if user is None:
         raise credentials_exception
-    return user
+    principal = UserPrincipal.from_user(user)
+    user_cache.put(token, principal, token_expires_at=payload.get("exp"))
+    return principal
 
 
 async def get_current_active_user(
-    current_user: User = Depends(get_current_user)
-) -> User:
+    current_user: UserPrincipal = Depends(get_current_user)
+) -> UserPrincipal:
     """Get current active user"""
     if current_user.is_active == 0:
         raise HTTPException(status_code=400, detail="Inactive user")
@@ -80,7 +119,7 @@ async def get_current_active_user(
 
 def require_user_type(allowed_types: list[UserType]):
     """Decorator to require specific user types"""
-    async def check_user_type(current_user: User = Depends(get_current_active_user)):
+    async def check_user_type(current_user: UserPrincipal = Depends(get_current_active_user)):
         if current_user.user_type not in allowed_types:
             raise HTTPException(
                 status_code=status.HTTP_403_FORBIDDEN,
@@ -0,0 +1,115 @@
+"""
+Password Hashing Executor
+Runs bcrypt off the event loop on a bounded thread pool with backpressure
+"""
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Optional, Tuple
+import asyncio
+import os
+import threading
+import time
+
+from passlib.context import CryptContext
+
+
+# bcrypt cost factor (2^rounds iterations). Hashes at any other cost are
+# upgraded on the next successful login.
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", str(os.cpu_count() or 2)))
+# Hash/verify calls allowed to wait or run at once before new ones are rejected
+PASSWORD_HASH_MAX_PENDING = int(os.getenv("PASSWORD_HASH_MAX_PENDING", str(PASSWORD_HASH_WORKERS * 8)))
+
+pwd_context = CryptContext(
+    schemes=["bcrypt"],
+    deprecated="auto",
+    bcrypt__rounds=BCRYPT_ROUNDS,
+    bcrypt__min_rounds=BCRYPT_ROUNDS,
+    bcrypt__max_rounds=BCRYPT_ROUNDS
+)
+
+
+class PasswordHasherBusy(Exception):
+    """Raised when the hashing queue is full"""
+
+
+class PasswordHasher:
+    """
+    bcrypt releases the GIL, so a small thread pool keeps hashing off the
+    event loop while using real cores. Requests beyond max_pending are
+    rejected immediately instead of queueing behind seconds of CPU work.
+    """
+
+    def __init__(self, workers: int = PASSWORD_HASH_WORKERS, max_pending: int = PASSWORD_HASH_MAX_PENDING):
+        self.workers = max(1, workers)
+        self.max_pending = max(1, max_pending)
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._lock = threading.Lock()
+        self._pending = 0
+        self.counters = {"hashed": 0, "verified": 0, "rehashed": 0, "rejected": 0}
+        self._busy_seconds = 0.0
+        self._queue_seconds = 0.0
+        self._completed = 0
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="bcrypt")
+        return self._executor
+
+    async def _run(self, fn, *args):
+        with self._lock:
+            if self._pending >= self.max_pending:
+                self.counters["rejected"] += 1
+                raise PasswordHasherBusy("Password hashing queue is full")
+            self._pending += 1
+        submitted = time.perf_counter()
+
+        def timed():
+            started = time.perf_counter()
+            try:
+                return fn(*args)
+            finally:
+                finished = time.perf_counter()
+                with self._lock:
+                    self._queue_seconds += started - submitted
+                    self._busy_seconds += finished - started
+                    self._completed += 1
+
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._get_executor(), timed)
+        finally:
+            with self._lock:
+                self._pending -= 1
+
+    async def hash(self, password: str) -> str:
+        hashed = await self._run(pwd_context.hash, password)
+        self.counters["hashed"] += 1
+        return hashed
+
+    async def verify_and_update(self, password: str, hashed: str) -> Tuple[bool, Optional[str]]:
+        """(valid, new_hash); new_hash is set when the stored cost is outdated"""
+        valid, new_hash = await self._run(pwd_context.verify_and_update, password, hashed)
+        self.counters["verified"] += 1
+        if new_hash:
+            self.counters["rehashed"] += 1
+        return valid, new_hash
+
+    def get_stats(self) -> Dict:
+        with self._lock:
+            completed = self._completed
+            return {
+                "bcrypt_rounds": BCRYPT_ROUNDS,
+                "workers": self.workers,
+                "max_pending": self.max_pending,
+                "pending": self._pending,
+                **self.counters,
+                "avg_hash_ms": round(self._busy_seconds / completed * 1000, 1) if completed else 0.0,
+                "avg_queue_ms": round(self._queue_seconds / completed * 1000, 1) if completed else 0.0
+            }
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+password_hasher = PasswordHasher()
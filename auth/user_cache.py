@@ -0,0 +1,131 @@
+"""
+Authenticated-User Cache
+Bounded TTL cache of resolved principals so authenticated requests skip the
+users table lookup
+"""
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, Optional, Tuple
+import os
+import threading
+import time
+
+from sqlalchemy import event
+
+from database.models import User, UserType
+
+
+AUTH_CACHE_TTL = float(os.getenv("AUTH_CACHE_TTL", "60"))  # seconds, 0 disables
+AUTH_CACHE_MAX = int(os.getenv("AUTH_CACHE_MAX", "10000"))
+
+
+@dataclass(frozen=True)
+class UserPrincipal:
+    """Read-only snapshot of the User fields routes depend on"""
+    id: int
+    email: str
+    username: str
+    full_name: Optional[str]
+    user_type: UserType
+    organization_name: Optional[str]
+    is_active: int
+    industry_type: Optional[str] = None
+    organization_id: Optional[int] = None
+
+    @classmethod
+    def from_user(cls, user: User) -> "UserPrincipal":
+        return cls(
+            id=user.id,
+            email=user.email,
+            username=user.username,
+            full_name=user.full_name,
+            user_type=user.user_type,
+            organization_name=user.organization_name,
+            is_active=user.is_active,
+            industry_type=user.industry_type,
+            organization_id=user.organization_id
+        )
+
+
+class UserCache:
+    """
+    LRU of principals keyed by (user id, token). Entries live for at most
+    AUTH_CACHE_TTL seconds and never past the token's own expiry; any change
+    to a User row drops that user's entries in this process.
+    """
+
+    def __init__(self, ttl: float = AUTH_CACHE_TTL, max_entries: int = AUTH_CACHE_MAX):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Tuple[int, str], Tuple[UserPrincipal, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.counters = {"hits": 0, "misses": 0, "expired": 0, "evictions": 0, "invalidations": 0}
+
+    @property
+    def enabled(self) -> bool:
+        return self.ttl > 0 and self.max_entries > 0
+
+    def get(self, user_id: int, token: str) -> Optional[UserPrincipal]:
+        key = (user_id, token)
+        with self._lock:
+            cached = self._entries.get(key)
+            if cached is None:
+                self.counters["misses"] += 1
+                return None
+            principal, expires_at = cached
+            if expires_at <= time.time():
+                del self._entries[key]
+                self.counters["expired"] += 1
+                self.counters["misses"] += 1
+                return None
+            self._entries.move_to_end(key)
+            self.counters["hits"] += 1
+            return principal
+
+    def put(self, token: str, principal: UserPrincipal, token_expires_at: Optional[float] = None):
+        if not self.enabled:
+            return
+        expires_at = time.time() + self.ttl
+        if token_expires_at is not None:
+            expires_at = min(expires_at, token_expires_at)
+        with self._lock:
+            self._entries[(principal.id, token)] = (principal, expires_at)
+            self._entries.move_to_end((principal.id, token))
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.counters["evictions"] += 1
+
+    def invalidate(self, user_id: Optional[int] = None):
+        """Drop one user's cached principals (or everything)"""
+        with self._lock:
+            if user_id is None:
+                removed = len(self._entries)
+                self._entries.clear()
+            else:
+                keys = [key for key in self._entries if key[0] == user_id]
+                for key in keys:
+                    del self._entries[key]
+                removed = len(keys)
+            self.counters["invalidations"] += removed
+
+    def get_stats(self) -> Dict:
+        with self._lock:
+            lookups = self.counters["hits"] + self.counters["misses"]
+            return {
+                "enabled": self.enabled,
+                "ttl_seconds": self.ttl,
+                "max_entries": self.max_entries,
+                "size": len(self._entries),
+                **self.counters,
+                "hit_rate": round(self.counters["hits"] / lookups, 4) if lookups else 0.0
+            }
+
+
+user_cache = UserCache()
+
+
+@event.listens_for(User, "after_update")
+@event.listens_for(User, "after_delete")
+def _invalidate_cached_user(mapper, connection, target):
+    # Profile edits, deactivation and deletion all go through the ORM
+    user_cache.invalidate(target.id)
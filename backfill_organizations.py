@@ -0,0 +1,29 @@
+"""
+Rebuild organization roll-up totals from every stored entry
+Usage: python backfill_organizations.py [--from-names]
+"""
+import argparse
+import time
+
+from database.database import init_db, SessionLocal
+from utils.organizations import organizations_from_names, rebuild_organization_totals
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Rebuild per-organization footprint totals")
+    parser.add_argument("--from-names", action="store_true",
+                        help="First invite users outside the hierarchy to a root organization "
+                             "named after their organization_name")
+    args = parser.parse_args()
+
+    init_db()
+    db = SessionLocal()
+    try:
+        started = time.time()
+        if args.from_names:
+            invited = organizations_from_names(db)
+            print(f"Invited {invited} users to organizations by name")
+        written = rebuild_organization_totals(db)
+        print(f"Wrote {written} organization totals in {time.time() - started:.2f}s")
+    finally:
+        db.close()
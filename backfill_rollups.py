@@ -0,0 +1,34 @@
+"""
+Build analytics rollups for entries written before rollups existed
+Usage: python backfill_rollups.py [--user USERNAME ...]
+"""
+import argparse
+import time
+
+from database.database import init_db, SessionLocal
+from database.models import User
+from utils.rollups import backfill_rollups
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Rebuild per-user analytics rollups")
+    parser.add_argument("--user", action="append", metavar="USERNAME",
+                        help="Only rebuild this user (repeatable); defaults to everyone")
+    args = parser.parse_args()
+    
+    init_db()
+    db = SessionLocal()
+    try:
+        user_ids = None
+        if args.user:
+            users = db.query(User).filter(User.username.in_(args.user)).all()
+            missing = set(args.user) - {u.username for u in users}
+            if missing:
+                raise SystemExit(f"Users not found: {', '.join(sorted(missing))}")
+            user_ids = [u.id for u in users]
+        
+        started = time.time()
+        rebuilt = backfill_rollups(db, user_ids)
+        print(f"Rebuilt {rebuilt} rollups in {time.time() - started:.2f}s")
+    finally:
+        db.close()
@@ -0,0 +1,27 @@
+"""
+Rebuild the population quantile sketches from every stored entry
+Usage: python backfill_sketches.py [--batch-size N]
+"""
+import argparse
+import time
+
+from database.database import init_db, SessionLocal
+from utils.quantiles import rebuild_sketches
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Rebuild per-cohort footprint quantile sketches")
+    parser.add_argument("--batch-size", type=int, default=10000,
+                        help="Entries streamed from the database per batch")
+    args = parser.parse_args()
+
+    init_db()
+    db = SessionLocal()
+    try:
+        started = time.time()
+        counts = rebuild_sketches(db, args.batch_size)
+        for (user_type, industry_type), count in sorted(counts.items(), key=lambda item: (item[0][0].value, item[0][1])):
+            print(f"  {user_type.value:<12} {industry_type or '(all industries)':<20} {count} entries")
+        print(f"Rebuilt {len(counts)} cohort sketches in {time.time() - started:.2f}s")
+    finally:
+        db.close()
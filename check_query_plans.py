@@ -0,0 +1,201 @@
+"""
+Check that the API's hot queries are served by indexes
+Runs EXPLAIN for each query on SQLite or PostgreSQL and exits non-zero if
+any of them falls back to a full table scan. Read-only unless --migrate is
+given; a database missing tables, columns or indexes fails the check.
+Usage: python check_query_plans.py [--database-url URL] [--verbose] [--migrate]
+"""
+import argparse
+import json
+import sys
+from datetime import datetime
+
+from sqlalchemy import create_engine, select, func, desc, text
+
+from database.database import (
+    Base, DATABASE_URL, dedupe_recommendations, migrate_columns, migrate_indexes, pending_migrations
+)
+from database.models import (
+    User, CarbonEntry, Recommendation, IndustryBenchmark, UserAnalyticsRollup, UserType, BREAKDOWN_COLUMNS,
+    Organization, OrganizationInvite, OrganizationTotal
+)
+
+
+USER_ID = 1
+ENTRY_ID = 1
+ORGANIZATION_ID = 1
+# entry_date of the row an /entries cursor points at
+CURSOR_ANCHOR = func.coalesce(select(CarbonEntry.entry_date).where(
+    CarbonEntry.id == ENTRY_ID, CarbonEntry.user_id == USER_ID
+).scalar_subquery(), datetime(2024, 1, 1))
+
+# (name, statement) for each query issued on a request path
+HOT_QUERIES = [
+    ("auth: user by id", select(User).where(User.id == USER_ID)),
+    ("login: user by username", select(User).where(User.username == "someone")),
+    ("entries: latest for user", select(CarbonEntry).where(
+        CarbonEntry.user_id == USER_ID
+    ).order_by(desc(CarbonEntry.entry_date)).limit(10)),
+    ("entries: page after cursor", select(
+        CarbonEntry.id, CarbonEntry.entry_date, CarbonEntry.total_carbon_footprint
+    ).where(
+        CarbonEntry.user_id == USER_ID,
+        CarbonEntry.entry_date <= CURSOR_ANCHOR,
+        (CarbonEntry.entry_date < CURSOR_ANCHOR) | (CarbonEntry.id < ENTRY_ID)
+    ).order_by(desc(CarbonEntry.entry_date), desc(CarbonEntry.id)).limit(11)),
+    ("entries/{id}: entry", select(CarbonEntry).where(
+        CarbonEntry.id == ENTRY_ID, CarbonEntry.user_id == USER_ID
+    )),
+    ("entries/{id}: recommendation state", select(Recommendation).where(
+        Recommendation.user_id == USER_ID
+    )),
+    ("recommendations: open by priority", select(Recommendation).where(
+        Recommendation.user_id == USER_ID, Recommendation.is_implemented == 0
+    ).order_by(desc(Recommendation.priority), desc(Recommendation.last_recommended_at), desc(Recommendation.id))),
+    ("recommendations: by id for user", select(Recommendation).where(
+        Recommendation.id == ENTRY_ID, Recommendation.user_id == USER_ID
+    )),
+    ("benchmarks: by user type", select(IndustryBenchmark).where(
+        IndustryBenchmark.user_type == UserType.CORPORATION
+    )),
+    ("benchmarks: by user and industry type", select(IndustryBenchmark).where(
+        IndustryBenchmark.user_type == UserType.CORPORATION,
+        IndustryBenchmark.industry_type == "technology"
+    )),
+    ("rollup: by user", select(UserAnalyticsRollup).where(UserAnalyticsRollup.user_id == USER_ID)),
+    ("rollup: rebuild aggregates", select(
+        func.count(CarbonEntry.id),
+        func.sum(CarbonEntry.total_carbon_footprint),
+        func.min(CarbonEntry.total_carbon_footprint),
+        func.max(CarbonEntry.total_carbon_footprint)
+    ).where(CarbonEntry.user_id == USER_ID)),
+    ("rollup: rebuild recent window", select(
+        CarbonEntry.id, CarbonEntry.entry_date, CarbonEntry.total_carbon_footprint
+    ).where(
+        CarbonEntry.user_id == USER_ID
+    ).order_by(desc(CarbonEntry.entry_date), desc(CarbonEntry.id)).limit(12)),
+    ("rollup: rebuild footprint digest", select(CarbonEntry.total_carbon_footprint).where(
+        CarbonEntry.user_id == USER_ID
+    )),
+    ("training: entry watermark", select(
+        func.max(CarbonEntry.id), func.count(CarbonEntry.id)
+    ).where(CarbonEntry.user_id == USER_ID)),
+    ("training: history", select(
+        CarbonEntry.entry_date,
+        *[getattr(CarbonEntry, column) for column in BREAKDOWN_COLUMNS.values()],
+        CarbonEntry.breakdown_shape
+    ).where(
+        CarbonEntry.user_id == USER_ID
+    ).order_by(desc(CarbonEntry.entry_date)).limit(24)),
+    ("organizations: user's site path", select(Organization.path).join(
+        User, User.organization_id == Organization.id
+    ).where(User.id == USER_ID)),
+    ("organizations: total for one period", select(OrganizationTotal).where(
+        OrganizationTotal.organization_id == ORGANIZATION_ID,
+        OrganizationTotal.bucket == "quarter",
+        OrganizationTotal.period_start == "2024-01-01"
+    )),
+    ("organizations: totals over a range", select(OrganizationTotal).where(
+        OrganizationTotal.organization_id == ORGANIZATION_ID,
+        OrganizationTotal.bucket == "month",
+        OrganizationTotal.period_start >= "2024-01-01",
+        OrganizationTotal.period_start < "2025-01-01"
+    ).order_by(OrganizationTotal.period_start)),
+    ("organizations: pending invites for user", select(OrganizationInvite).where(
+        OrganizationInvite.user_id == USER_ID
+    ).order_by(OrganizationInvite.id)),
+]
+
+
+def explain_sqlite(conn, sql):
+    """Return (plan lines, full scans) from EXPLAIN QUERY PLAN"""
+    lines = [row[-1] for row in conn.execute(text(f"EXPLAIN QUERY PLAN {sql}"))]
+    # "SCAN t" (or "SCAN t USING INDEX") walks the whole table or index;
+    # "SEARCH t USING ..." is an index lookup
+    scans = [line for line in lines if line.startswith("SCAN ") and "CONSTANT ROW" not in line]
+    return lines, scans
+
+
+def explain_postgresql(conn, sql):
+    """Return (plan lines, full scans) from EXPLAIN (FORMAT JSON)"""
+    # Tiny tables are always sequentially scanned; discourage that so the
+    # plan shows whether a usable index exists at all
+    conn.execute(text("SET enable_seqscan = off"))
+    plan = conn.execute(text(f"EXPLAIN (FORMAT JSON) {sql}")).scalar()
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+
+    lines, scans = [], []
+
+    def walk(node, depth=0):
+        label = node["Node Type"]
+        if "Relation Name" in node:
+            label += f" on {node['Relation Name']}"
+        if "Index Name" in node:
+            label += f" using {node['Index Name']}"
+        lines.append("  " * depth + label)
+        if node["Node Type"] == "Seq Scan":
+            scans.append(label)
+        for child in node.get("Plans", []):
+            walk(child, depth + 1)
+
+    walk(plan[0]["Plan"])
+    return lines, scans
+
+
+EXPLAINERS = {
+    "sqlite": explain_sqlite,
+    "postgresql": explain_postgresql,
+}
+
+
+def check_plans(engine, verbose=False):
+    """EXPLAIN every hot query; returns the names of those doing full scans"""
+    explain = EXPLAINERS.get(engine.dialect.name)
+    if explain is None:
+        raise SystemExit(f"Unsupported database dialect: {engine.dialect.name}")
+
+    failures = []
+    with engine.connect() as conn:
+        for name, statement in HOT_QUERIES:
+            sql = str(statement.compile(engine, compile_kwargs={"literal_binds": True}))
+            lines, scans = explain(conn, sql)
+            status = "FULL SCAN" if scans else "ok"
+            print(f"[{status}] {name}")
+            if verbose or scans:
+                for line in lines:
+                    print(f"    {line}")
+            if scans:
+                failures.append(name)
+    return failures
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="EXPLAIN the API's hot queries and fail on full scans")
+    parser.add_argument("--database-url", default=DATABASE_URL)
+    parser.add_argument("--verbose", action="store_true", help="Print every plan, not just failures")
+    parser.add_argument("--migrate", action="store_true",
+                        help="Apply init_db's migrations first (creates tables, columns and indexes, "
+                             "and removes duplicate recommendations)")
+    args = parser.parse_args()
+
+    engine = create_engine(args.database_url)
+    if args.migrate:
+        Base.metadata.create_all(bind=engine)
+        migrate_columns(engine)
+        dedupe_recommendations(engine)
+        created = migrate_indexes(engine)
+        if created:
+            print(f"Created missing indexes: {', '.join(created)}")
+
+    pending = pending_migrations(engine)
+    if pending:
+        print(f"Schema is behind the models: {', '.join(pending)}")
+        print("Run python init_db.py, or rerun with --migrate, then check again")
+        sys.exit(2)
+
+    failures = check_plans(engine, verbose=args.verbose)
+    if failures:
+        print(f"{len(failures)} of {len(HOT_QUERIES)} queries do full scans")
+        sys.exit(1)
+    print(f"All {len(HOT_QUERIES)} queries use indexes")
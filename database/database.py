@@ -1,9 +1,12 @@
 """
 Database connection and session management
 """
-from sqlalchemy import create_engine
+from sqlalchemy import bindparam, create_engine, event, inspect, select, text
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import Session, sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+import json
 import os
 from dotenv import load_dotenv
 
@@ -11,11 +14,89 @@ load_dotenv()
 
 DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./carbon_monitor.db")
 
+# "async" serves API routes through SQLAlchemy asyncio (aiosqlite/asyncpg);
+# "sync" keeps the blocking driver for deployments without an async driver
+DATABASE_MODE = os.getenv("DATABASE_MODE", "async").lower()
+
+ASYNC_DRIVERS = {
+    "sqlite": "sqlite+aiosqlite",
+    "postgresql": "postgresql+asyncpg",
+    "postgres": "postgresql+asyncpg",
+}
+
+
+def _env_int(name: str, default: int) -> int:
+    return int(os.getenv(name, str(default)))
+
+
+def _env_bool(name: str, default: bool) -> bool:
+    return os.getenv(name, str(default)).lower() in ("1", "true", "yes")
+
+
+# "production" applies the pool and SQLite settings below; "default" leaves
+# SQLAlchemy's and SQLite's own defaults in place
+DB_PROFILE = os.getenv("DB_PROFILE", "production").lower()
+
+POOL_SETTINGS = {
+    "pool_size": _env_int("DB_POOL_SIZE", 10),
+    "max_overflow": _env_int("DB_MAX_OVERFLOW", 20),
+    "pool_timeout": _env_int("DB_POOL_TIMEOUT", 30),
+    "pool_recycle": _env_int("DB_POOL_RECYCLE", 1800),  # seconds
+    "pool_pre_ping": _env_bool("DB_POOL_PRE_PING", True),
+}
+
+# Applied to every new SQLite connection. WAL lets readers run alongside the
+# single writer, and busy_timeout makes writers wait instead of failing with
+# "database is locked"
+SQLITE_PRAGMAS = {
+    "journal_mode": os.getenv("SQLITE_JOURNAL_MODE", "WAL"),
+    "synchronous": os.getenv("SQLITE_SYNCHRONOUS", "NORMAL"),
+    "mmap_size": _env_int("SQLITE_MMAP_SIZE", 256 * 1024 * 1024),  # bytes
+    "cache_size": _env_int("SQLITE_CACHE_SIZE", -64000),  # negative = KiB
+    "busy_timeout": _env_int("SQLITE_BUSY_TIMEOUT", 5000),  # ms
+}
+
+
+def _is_sqlite(url: str) -> bool:
+    return url.startswith("sqlite")
+
+
+def _is_memory_sqlite(url: str) -> bool:
+    return _is_sqlite(url) and (":memory:" in url or url.split("://", 1)[-1] in ("", "/"))
+
+
+def engine_options(url: str, is_async: bool = False) -> dict:
+    """Pool keyword arguments for create_engine under the current profile"""
+    # In-memory SQLite uses a single-connection pool that takes no sizing
+    if DB_PROFILE != "production" or _is_memory_sqlite(url):
+        return {}
+    options = dict(POOL_SETTINGS)
+    if is_async and _is_sqlite(url):
+        # aiosqlite defaults to NullPool (a new connection per checkout)
+        options["poolclass"] = AsyncAdaptedQueuePool
+    return options
+
+
+def _apply_sqlite_pragmas(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    for name, value in SQLITE_PRAGMAS.items():
+        cursor.execute(f"PRAGMA {name}={value}")
+    cursor.close()
+
+
+def configure_engine(sync_engine):
+    """Install per-connection SQLite pragmas on an engine (sync or async.sync_engine)"""
+    if DB_PROFILE == "production" and sync_engine.dialect.name == "sqlite":
+        event.listen(sync_engine, "connect", _apply_sqlite_pragmas)
+    return sync_engine
+
+
 # Create engine
-engine = create_engine(
+engine = configure_engine(create_engine(
     DATABASE_URL,
-    connect_args={"check_same_thread": False} if "sqlite" in DATABASE_URL else {}
-)
+    connect_args={"check_same_thread": False} if _is_sqlite(DATABASE_URL) else {},
+    **engine_options(DATABASE_URL)
+))
 
 # Create session factory
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
@@ -31,9 +112,261 @@ def get_db():
     finally:
         db.close()
 
+
+def async_database_url(url: str) -> str:
+    """Swap a sync database URL's driver for its asyncio counterpart"""
+    scheme, sep, rest = url.partition("://")
+    backend = scheme.split("+", 1)[0]
+    if backend not in ASYNC_DRIVERS:
+        raise ValueError(f"No async driver configured for '{backend}' URLs")
+    return f"{ASYNC_DRIVERS[backend]}{sep}{rest}"
+
+
+_async_engine = None
+_async_session_factory = None
+
+
+def get_async_session_factory():
+    """Create the async engine on first use so sync mode never imports a driver"""
+    global _async_engine, _async_session_factory
+    if _async_session_factory is None:
+        _async_engine = create_async_engine(
+            async_database_url(DATABASE_URL), **engine_options(DATABASE_URL, is_async=True)
+        )
+        configure_engine(_async_engine.sync_engine)
+        _async_session_factory = async_sessionmaker(_async_engine, expire_on_commit=False)
+    return _async_session_factory
+
+
+async def dispose_async_engine():
+    """Close pooled async connections (application shutdown)"""
+    global _async_engine, _async_session_factory
+    if _async_engine is not None:
+        await _async_engine.dispose()
+    _async_engine = _async_session_factory = None
+
+
+class SyncSessionAdapter:
+    """
+    Exposes a sync Session through the AsyncSession methods the routes use,
+    so the same route code runs in DATABASE_MODE=sync. Calls block the event
+    loop exactly as the sync routes did before the async layer.
+    """
+
+    def __init__(self, session: Session):
+        self.session = session
+
+    def add(self, instance):
+        self.session.add(instance)
+
+    def add_all(self, instances):
+        self.session.add_all(instances)
+
+    async def execute(self, statement, *args, **kwargs):
+        return self.session.execute(statement, *args, **kwargs)
+
+    async def scalar(self, statement, *args, **kwargs):
+        return self.session.scalar(statement, *args, **kwargs)
+
+    async def scalars(self, statement, *args, **kwargs):
+        return self.session.scalars(statement, *args, **kwargs)
+
+    async def get(self, entity, ident, **kwargs):
+        return self.session.get(entity, ident, **kwargs)
+
+    async def flush(self):
+        self.session.flush()
+
+    async def commit(self):
+        self.session.commit()
+
+    async def rollback(self):
+        self.session.rollback()
+
+    async def refresh(self, instance, *args, **kwargs):
+        self.session.refresh(instance, *args, **kwargs)
+
+    async def run_sync(self, fn, *args, **kwargs):
+        return fn(self.session, *args, **kwargs)
+
+    async def close(self):
+        self.session.close()
+
+
+async def get_async_db():
+    """
+    Dependency for an AsyncSession (or its sync stand-in when
+    DATABASE_MODE=sync). Helpers written against a sync Session can be
+    called with `await db.run_sync(helper, ...)`.
+    """
+    if DATABASE_MODE == "sync":
+        db = SessionLocal(expire_on_commit=False)
+        try:
+            yield SyncSessionAdapter(db)
+        finally:
+            db.close()
+    else:
+        async with get_async_session_factory()() as db:
+            yield db
+
+def pool_stats() -> dict:
+    """Connection pool usage for the sync and (if started) async engines"""
+    engines = {"sync": engine}
+    if _async_engine is not None:
+        engines["async"] = _async_engine.sync_engine
+    pools = {}
+    for name, bound in engines.items():
+        pool = bound.pool
+        stats = {"class": type(pool).__name__, "status": pool.status()}
+        for metric in ("size", "checkedin", "checkedout", "overflow"):
+            if hasattr(pool, metric):
+                stats[metric] = getattr(pool, metric)()
+        pools[name] = stats
+    
+    result = {
+        "profile": DB_PROFILE,
+        "database_mode": DATABASE_MODE,
+        "dialect": engine.dialect.name,
+        "pool_settings": engine_options(DATABASE_URL),
+        "pools": pools,
+    }
+    if engine.dialect.name == "sqlite":
+        # Read back what the connection is actually running with
+        with engine.connect() as conn:
+            result["sqlite_pragmas"] = {
+                name: conn.execute(text(f"PRAGMA {name}")).scalar() for name in SQLITE_PRAGMAS
+            }
+    return result
+
 def init_db():
     """Initialize database tables"""
     # Import all models to register them with SQLAlchemy
-    from database.models import User, CarbonEntry, Recommendation, IndustryBenchmark
+    from database.models import (
+        User, CarbonEntry, Recommendation, IndustryBenchmark, UserAnalyticsRollup, CohortSketch,
+        Organization, OrganizationInvite, OrganizationTotal
+    )
     Base.metadata.create_all(bind=engine)
+    migrate_columns()
+    dedupe_recommendations()
+    migrate_indexes()
+    backfill_breakdown_columns()
+
+def migrate_columns(bind=None):
+    """
+    Add columns defined on models but missing from existing tables
+    (create_all() never alters a table). New columns are nullable.
+    Returns "table.column" names that were added.
+    """
+    bind = bind or engine
+    added = []
+    inspector = inspect(bind)
+    for table in Base.metadata.sorted_tables:
+        if not inspector.has_table(table.name):
+            continue
+        existing = {column["name"] for column in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name not in existing:
+                column_type = column.type.compile(dialect=bind.dialect)
+                with bind.begin() as conn:
+                    conn.execute(text(f'ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}'))
+                added.append(f"{table.name}.{column.name}")
+    return added
+
+def dedupe_recommendations(bind=None):
+    """
+    Collapse recommendations written once per entry into one row per (user,
+    category, title), so the unique index migrate_indexes() adds can be
+    built. The newest copy is kept and stays implemented if any copy was.
+    Does nothing once the index exists. Returns the number of rows removed.
+    """
+    bind = bind or engine
+    inspector = inspect(bind)
+    if not inspector.has_table("recommendations"):
+        return 0
+    if "ux_recommendations_user_category_title" in {index["name"] for index in inspector.get_indexes("recommendations")}:
+        return 0
+    newest = "SELECT MAX(id) FROM recommendations GROUP BY user_id, category, title"
+    with bind.begin() as conn:
+        # NULLs never conflict in a unique index
+        conn.execute(text("UPDATE recommendations SET category = 'general' WHERE category IS NULL"))
+        conn.execute(text(
+            f"UPDATE recommendations SET is_implemented = 1 WHERE id IN ({newest} HAVING MAX(is_implemented) = 1)"
+        ))
+        removed = conn.execute(text(f"DELETE FROM recommendations WHERE id NOT IN ({newest})")).rowcount
+        conn.execute(text("UPDATE recommendations SET last_recommended_at = created_at WHERE last_recommended_at IS NULL"))
+    return removed
+
+def backfill_breakdown_columns(bind=None, batch_size: int = 1000):
+    """
+    Copy legacy JSON category_breakdown values into the per-category
+    footprint columns and breakdown_shape for rows written before those
+    columns existed. Keys missing from the JSON stay NULL.
+    Returns the number of rows updated.
+    """
+    from database.models import CarbonEntry, BREAKDOWN_COLUMNS, breakdown_shape
+    bind = bind or engine
+    table = CarbonEntry.__table__
+    columns = {key: column for key, column in BREAKDOWN_COLUMNS.items() if key != "total"}
+    update = table.update().where(table.c.id == bindparam("entry_id")).values(
+        {column: bindparam(column) for column in [*columns.values(), "breakdown_shape"]}
+    )
+    updated = 0
+    last_id = 0
+    while True:
+        with bind.begin() as conn:
+            rows = conn.execute(
+                select(table.c.id, table.c.category_breakdown).where(
+                    table.c.id > last_id,
+                    table.c.breakdown_shape.is_(None),
+                    table.c.category_breakdown.isnot(None)
+                ).order_by(table.c.id).limit(batch_size)
+            ).all()
+            if not rows:
+                return updated
+            params = []
+            for entry_id, raw in rows:
+                breakdown = json.loads(raw) if raw else {}
+                params.append({
+                    "entry_id": entry_id,
+                    **{column: breakdown.get(key) for key, column in columns.items()},
+                    "breakdown_shape": breakdown_shape(breakdown)
+                })
+            conn.execute(update, params)
+        updated += len(rows)
+        last_id = rows[-1][0]
+
+def pending_migrations(bind=None):
+    """
+    Tables, columns and indexes defined on the models but missing from the
+    database, as "table x", "column t.c" and "index i". Read-only.
+    """
+    bind = bind or engine
+    pending = []
+    inspector = inspect(bind)
+    for table in Base.metadata.sorted_tables:
+        if not inspector.has_table(table.name):
+            pending.append(f"table {table.name}")
+            continue
+        existing = {column["name"] for column in inspector.get_columns(table.name)}
+        pending.extend(f"column {table.name}.{column.name}" for column in table.columns if column.name not in existing)
+        existing = {index["name"] for index in inspector.get_indexes(table.name)}
+        pending.extend(f"index {index.name}" for index in table.indexes if index.name not in existing)
+    return pending
+
+def migrate_indexes(bind=None):
+    """
+    Create indexes added to models after their tables were created
+    (create_all() only indexes new tables). Safe to run repeatedly.
+    Returns the names of the indexes that were created.
+    """
+    bind = bind or engine
+    created = []
+    inspector = inspect(bind)
+    for table in Base.metadata.sorted_tables:
+        existing = {index["name"] for index in inspector.get_indexes(table.name)}
+        for index in table.indexes:
+            if index.name not in existing:
+                index.create(bind=bind)
+                created.append(index.name)
+    return created
 
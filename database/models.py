@@ -1,7 +1,7 @@
 """
 Database models for Carbon Footprint Monitoring System
 """
-from sqlalchemy import Column, Integer, String, Float, DateTime, Text, ForeignKey, Enum as SQLEnum
+from sqlalchemy import Column, Integer, String, Float, DateTime, Text, ForeignKey, Index, Enum as SQLEnum
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from database.database import Base
@@ -25,6 +25,8 @@ class User(Base):
     full_name = Column(String)
     user_type = Column(SQLEnum(UserType), default=UserType.INDIVIDUAL)
     organization_name = Column(String, nullable=True)  # For institutions/corporations
+    industry_type = Column(String, nullable=True)  # Matches IndustryBenchmark.industry_type
+    organization_id = Column(Integer, ForeignKey("organizations.id"), nullable=True, index=True)  # Site or organization node
     is_active = Column(Integer, default=1)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
@@ -32,6 +34,8 @@ class User(Base):
     # Relationships
     carbon_entries = relationship("CarbonEntry", back_populates="user")
     recommendations = relationship("Recommendation", back_populates="user")
+    analytics_rollup = relationship("UserAnalyticsRollup", back_populates="user", uselist=False)
+    organization = relationship("Organization", back_populates="members")
 
 
 class CarbonEntry(Base):
@@ -67,9 +71,17 @@ class CarbonEntry(Base):
     manufacturing_output = Column(Float, default=0)  # tons
     supply_chain_distance = Column(Float, default=0)  # km
     
-    # Calculated Values
-    total_carbon_footprint = Column(Float, default=0)  # CO2 equivalent in kg
-    category_breakdown = Column(Text)  # JSON string
+    # Calculated Values (CO2 equivalent in kg)
+    total_carbon_footprint = Column(Float, default=0)
+    energy_footprint = Column(Float)
+    transportation_footprint = Column(Float)
+    waste_footprint = Column(Float)
+    food_footprint = Column(Float)
+    water_footprint = Column(Float)
+    corporate_footprint = Column(Float)
+    per_person_footprint = Column(Float)
+    category_breakdown = Column(Text)  # Legacy JSON breakdown, dual-written until the cut-over is final so a rollback keeps new entries
+    breakdown_shape = Column(Integer, nullable=True)  # Which category_breakdown keys exist and which are integers, see breakdown_shape()
     
     # Metadata
     entry_date = Column(DateTime(timezone=True), server_default=func.now())
@@ -81,13 +93,78 @@ class CarbonEntry(Base):
     user = relationship("User", back_populates="carbon_entries")
     recommendations = relationship("Recommendation", back_populates="carbon_entry")
 
+    __table_args__ = (
+        # Per-user history, newest first (entries, summaries, training)
+        Index("ix_carbon_entries_user_id_entry_date", "user_id", "entry_date"),
+        # Per-user footprints (rollup median digest rebuilds)
+        Index("ix_carbon_entries_user_id_total", "user_id", "total_carbon_footprint"),
+    )
+
+
+# category_breakdown keys and the CarbonEntry columns that store them, in
+# the key order CarbonCalculator produces
+BREAKDOWN_COLUMNS = {
+    "energy": "energy_footprint",
+    "transportation": "transportation_footprint",
+    "waste": "waste_footprint",
+    "food": "food_footprint",
+    "water": "water_footprint",
+    "corporate": "corporate_footprint",
+    "total": "total_carbon_footprint",
+    "per_person": "per_person_footprint",
+}
+
+
+def breakdown_shape(breakdown: dict) -> int:
+    """
+    Bit flags for the i-th BREAKDOWN_COLUMNS key: bit 2i is set when the key
+    is present, bit 2i + 1 when its value is an integer. The float columns
+    cannot tell 0 from 0.0, and the scalar calculator writes corporate as 0.
+    """
+    shape = 0
+    for i, key in enumerate(BREAKDOWN_COLUMNS):
+        if key in breakdown:
+            shape |= 1 << (2 * i)
+            if isinstance(breakdown[key], int) and not isinstance(breakdown[key], bool):
+                shape |= 1 << (2 * i + 1)
+    return shape
+
+
+def breakdown_to_columns(breakdown: dict) -> dict:
+    """CarbonEntry column values for a footprint breakdown; missing keys stay NULL"""
+    columns = {column: breakdown.get(key) for key, column in BREAKDOWN_COLUMNS.items()}
+    columns["breakdown_shape"] = breakdown_shape(breakdown)
+    return columns
+
+
+def breakdown_from_columns(entry) -> dict:
+    """
+    Rebuild the category_breakdown dict, with the keys and number types it
+    was written with, from an entry (or row) with the breakdown columns and
+    breakdown_shape. Entries without a breakdown give {}.
+    """
+    shape = entry.breakdown_shape
+    if shape is None:
+        return {}
+    breakdown = {}
+    for i, (key, column) in enumerate(BREAKDOWN_COLUMNS.items()):
+        if shape >> (2 * i) & 1:
+            value = getattr(entry, column)
+            breakdown[key] = int(value) if shape >> (2 * i + 1) & 1 and value is not None else value
+    return breakdown
+
 
 class Recommendation(Base):
+    """
+    A user's standing recommendation, one row per (user, category, title).
+    Each new entry that produces it again refreshes the estimate, priority
+    and source entry; is_implemented is kept.
+    """
     __tablename__ = "recommendations"
 
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
-    carbon_entry_id = Column(Integer, ForeignKey("carbon_entries.id"), nullable=True)
+    carbon_entry_id = Column(Integer, ForeignKey("carbon_entries.id"), nullable=True)  # Latest entry that produced it
     
     category = Column(String)  # energy, transportation, waste, food, water, etc.
     title = Column(String, nullable=False)
@@ -99,12 +176,22 @@ class Recommendation(Base):
     priority = Column(Integer, default=0)  # Higher = more important
     
     is_implemented = Column(Integer, default=0)  # 0 = not implemented, 1 = implemented
+    implemented_at = Column(DateTime(timezone=True), nullable=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
+    last_recommended_at = Column(DateTime(timezone=True), server_default=func.now())
 
     # Relationships
     user = relationship("User", back_populates="recommendations")
     carbon_entry = relationship("CarbonEntry", back_populates="recommendations")
 
+    __table_args__ = (
+        # Open recommendations by priority
+        Index("ix_recommendations_user_id_implemented_priority", "user_id", "is_implemented", "priority"),
+        Index("ix_recommendations_carbon_entry_id", "carbon_entry_id"),
+        # Upsert target; see database.dedupe_recommendations for older tables
+        Index("ux_recommendations_user_category_title", "user_id", "category", "title", unique=True),
+    )
+
 
 class IndustryBenchmark(Base):
     __tablename__ = "industry_benchmarks"
@@ -117,3 +204,116 @@ class IndustryBenchmark(Base):
     benchmark_year = Column(Integer)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
 
+    __table_args__ = (
+        Index("ix_industry_benchmarks_user_type_industry", "user_type", "industry_type"),
+    )
+
+
+class Organization(Base):
+    """
+    Node in an organization/site hierarchy. path lists the ids from the root
+    down to this node ("/1/7/42/"), so a node's ancestors come from its own
+    row and its subtree is a prefix match.
+    """
+    __tablename__ = "organizations"
+
+    id = Column(Integer, primary_key=True, index=True)
+    name = Column(String, nullable=False)
+    parent_id = Column(Integer, ForeignKey("organizations.id"), nullable=True)
+    path = Column(String, nullable=False, default="/")
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+    # Relationships
+    members = relationship("User", back_populates="organization")
+
+    __table_args__ = (
+        Index("ix_organizations_parent_id", "parent_id"),
+        Index("ix_organizations_path", "path"),
+    )
+
+
+class OrganizationTotal(Base):
+    """
+    Entry count and footprint sums (kg CO2) over an organization node's whole
+    subtree for one period, maintained as entries are written
+    """
+    __tablename__ = "organization_totals"
+
+    organization_id = Column(Integer, ForeignKey("organizations.id"), primary_key=True)
+    bucket = Column(String, primary_key=True)  # month, quarter or year
+    period_start = Column(String, primary_key=True)  # YYYY-MM-DD
+    entry_count = Column(Integer, default=0)
+    total_carbon_footprint = Column(Float, default=0)
+    energy_footprint = Column(Float, default=0)
+    transportation_footprint = Column(Float, default=0)
+    waste_footprint = Column(Float, default=0)
+    food_footprint = Column(Float, default=0)
+    water_footprint = Column(Float, default=0)
+    corporate_footprint = Column(Float, default=0)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+
+class OrganizationInvite(Base):
+    """
+    Pending request for a user to join an organization node. Users outside a
+    manager's subtree only move once they accept, since their entries become
+    readable through the node's totals.
+    """
+    __tablename__ = "organization_invites"
+
+    id = Column(Integer, primary_key=True, index=True)
+    organization_id = Column(Integer, ForeignKey("organizations.id"), nullable=False)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    invited_by = Column(Integer, ForeignKey("users.id"), nullable=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+    __table_args__ = (
+        # A user's pending invites; one per node
+        Index("ux_organization_invites_user_organization", "user_id", "organization_id", unique=True),
+    )
+
+
+class CohortSketch(Base):
+    """
+    Quantile sketch (t-digest) of per-person footprints over every entry in a
+    (user_type, industry_type) cohort. industry_type "" covers all industries.
+    Each cohort is split across a few shard rows to spread write contention;
+    readers merge them.
+    """
+    __tablename__ = "cohort_sketches"
+
+    user_type = Column(SQLEnum(UserType), primary_key=True)
+    industry_type = Column(String, primary_key=True, default="")
+    shard = Column(Integer, primary_key=True, default=0)
+    value_count = Column(Integer, default=0)
+    digest = Column(Text, default="{}")  # JSON, see utils.quantiles.TDigest
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+
+class UserAnalyticsRollup(Base):
+    """Running per-user footprint statistics, maintained as entries are written"""
+    __tablename__ = "user_analytics_rollups"
+
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    
+    # Moments over all entries (kg CO2)
+    entry_count = Column(Integer, default=0)
+    footprint_sum = Column(Float, default=0)
+    footprint_sum_sq = Column(Float, default=0)
+    footprint_min = Column(Float, nullable=True)
+    footprint_max = Column(Float, nullable=True)
+    footprint_digest = Column(Text, nullable=True)  # JSON t-digest of all footprints for the median, see utils.quantiles.TDigest
+    
+    # Most recent entry by entry_date
+    latest_entry_id = Column(Integer, nullable=True)
+    latest_entry_date = Column(DateTime(timezone=True), nullable=True)
+    latest_footprint = Column(Float, nullable=True)
+    latest_employee_count = Column(Integer, nullable=True)
+    
+    # JSON list of the last N entries, newest first
+    recent_entries = Column(Text, default="[]")
+    
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+    # Relationships
+    user = relationship("User", back_populates="analytics_rollup")
@@ -0,0 +1,64 @@
+"""
+Import historical carbon entries from CSV or Parquet exports
+Usage: python import_entries.py --user USERNAME data.csv [--map kwh=electricity_usage]
+"""
+import argparse
+
+from database.database import init_db, SessionLocal
+from database.models import User
+from utils.importer import import_entries, detect_format
+from utils.ingestion import DEFAULT_CHUNK_SIZE
+
+
+def parse_column_map(pairs):
+    """Turn ['src=dst', ...] into {'src': 'dst'}"""
+    column_map = {}
+    for pair in pairs or []:
+        source, _, target = pair.partition("=")
+        if not target:
+            raise SystemExit(f"Invalid --map value '{pair}', expected source=field")
+        column_map[source] = target
+    return column_map
+
+
+def print_progress(stats):
+    """Print running totals after each chunk"""
+    print(
+        f"chunk {stats['chunks']}: {stats['rows']} rows "
+        f"({stats['inserted']} inserted, {stats['failed']} failed) "
+        f"- {stats['rows_per_second']} rows/s"
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Import historical carbon entries")
+    parser.add_argument("path", help="CSV or Parquet file")
+    parser.add_argument("--user", required=True, help="Username the entries belong to")
+    parser.add_argument("--format", choices=["csv", "parquet"], help="Defaults to the file extension")
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE)
+    parser.add_argument("--map", action="append", metavar="COLUMN=FIELD",
+                        help="Rename a file column to a CarbonEntry field (repeatable)")
+    args = parser.parse_args()
+    
+    init_db()
+    db = SessionLocal()
+    try:
+        user = db.query(User).filter(User.username == args.user).first()
+        if not user:
+            raise SystemExit(f"User '{args.user}' not found")
+        
+        stats = import_entries(
+            db,
+            user,
+            args.path,
+            args.format or detect_format(args.path),
+            chunk_size=args.chunk_size,
+            column_map=parse_column_map(args.map),
+            progress=print_progress
+        )
+        print(f"Done: {stats['inserted']} of {stats['rows']} rows imported "
+              f"in {stats['elapsed_seconds']}s ({stats['rows_per_second']} rows/s)")
+        for error in stats["errors"]:
+            print(f"  row {error['row']}: {error['error']}")
+    finally:
+        db.close()
@@ -2,14 +2,29 @@
 Main FastAPI Application
 CarbonCALC: Real-Time Carbon Footprint Monitoring and Predictive Reporting Cloud Solution
 """
-from fastapi import FastAPI
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import HTMLResponse
-from database.database import init_db
+from fastapi.responses import HTMLResponse, JSONResponse
+from database.database import init_db, dispose_async_engine
 from api.routes import router
+from ml_models.training_queue import training_queue
+from auth.password_hasher import password_hasher
+from utils.static_assets import dashboard_assets
 import os
 
+# Served at / until dashboard/index.html exists
+DASHBOARD_PLACEHOLDER = """
+<!DOCTYPE html>
+<html>
+<head><title>CarbonCALC</title></head>
+<body>
+    <h1>CarbonCALC - Carbon Footprint Monitoring System</h1>
+    <p>Dashboard is being set up. Please check back soon.</p>
+</body>
+</html>
+"""
+
 # Initialize database
 init_db()
 
@@ -27,6 +42,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor"],
 )
 
 # Include API routes
@@ -39,49 +55,50 @@ if os.path.exists("static"):
 # Mount dashboard files - serve static assets
 if os.path.exists("dashboard"):
     app.mount("/dashboard", StaticFiles(directory="dashboard"), name="dashboard")
-    
-    # Serve CSS and JS files at root level for easier access
-    @app.get("/styles.css")
-    async def get_styles():
-        try:
-            with open("dashboard/styles.css", "r") as f:
-                from fastapi.responses import Response
-                return Response(content=f.read(), media_type="text/css")
-        except FileNotFoundError:
-            from fastapi.responses import JSONResponse
-            return JSONResponse({"error": "Styles not found"}, status_code=404)
-    
-    @app.get("/app.js")
-    async def get_app_js():
-        try:
-            with open("dashboard/app.js", "r") as f:
-                from fastapi.responses import Response
-                return Response(content=f.read(), media_type="application/javascript")
-        except FileNotFoundError:
-            from fastapi.responses import JSONResponse
-            return JSONResponse({"error": "App.js not found"}, status_code=404)
+
+# The dashboard entry points are read once here and served from memory
+dashboard_assets.register("index.html", "dashboard/index.html", "text/html", fallback=DASHBOARD_PLACEHOLDER)
+dashboard_assets.register("styles.css", "dashboard/styles.css", "text/css")
+dashboard_assets.register("app.js", "dashboard/app.js", "application/javascript")
+
+
+# Serve CSS and JS files at root level for easier access
+@app.get("/styles.css")
+async def get_styles(request: Request):
+    return dashboard_assets.response(request, "styles.css") or JSONResponse(
+        {"error": "Styles not found"}, status_code=404
+    )
+
+
+@app.get("/app.js")
+async def get_app_js(request: Request):
+    return dashboard_assets.response(request, "app.js") or JSONResponse(
+        {"error": "App.js not found"}, status_code=404
+    )
 
 
 @app.get("/", response_class=HTMLResponse)
-async def root():
+async def root(request: Request):
     """Serve the main dashboard"""
-    try:
-        with open("dashboard/index.html", "r") as f:
-            return HTMLResponse(content=f.read())
-    except FileNotFoundError:
-        return HTMLResponse(
-            content="""
-            <!DOCTYPE html>
-            <html>
-            <head><title>CarbonCALC</title></head>
-            <body>
-                <h1>CarbonCALC - Carbon Footprint Monitoring System</h1>
-                <p>Dashboard is being set up. Please check back soon.</p>
-            </body>
-            </html>
-            """,
-            status_code=200
-        )
+    return dashboard_assets.response(request, "index.html")
+
+
+@app.on_event("shutdown")
+async def shutdown_training_queue():
+    """Stop background training workers"""
+    training_queue.shutdown()
+
+
+@app.on_event("shutdown")
+async def shutdown_database():
+    """Close async database connections"""
+    await dispose_async_engine()
+
+
+@app.on_event("shutdown")
+async def shutdown_password_hasher():
+    """Stop bcrypt worker threads"""
+    password_hasher.shutdown()
 
 
 @app.get("/health")
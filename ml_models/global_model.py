@@ -0,0 +1,130 @@
+"""
+Global Forecast Model Registry
+Versioned storage for the fleet-wide GlobalCarbonFootprintPredictor and the
+data loader used to train it offline
+"""
+from datetime import datetime
+from itertools import groupby
+from typing import Dict, Iterator, List, Optional, Tuple
+import os
+import threading
+
+from dotenv import load_dotenv
+from sqlalchemy.orm import Session
+
+from database.models import CarbonEntry, User, breakdown_from_columns
+from ml_models.predictor import GlobalCarbonFootprintPredictor
+
+load_dotenv()
+
+GLOBAL_MODEL_DIR = os.getenv("GLOBAL_MODEL_DIR", "./trained_models/global")
+CURRENT_FILE = "CURRENT"
+
+_cache = {"key": None, "model": None}
+_cache_lock = threading.Lock()
+
+
+def iter_user_histories(
+    db: Session,
+    min_entries: int = 2,
+    recent: Optional[int] = None
+) -> Iterator[Tuple[str, List[Dict]]]:
+    """
+    Stream (user_type, historical_data) per user, ordered by entry date
+    Rows are fetched in batches so the whole table is never held at once.
+    recent keeps only each user's latest N entries.
+    """
+    rows = db.query(CarbonEntry, User.user_type).join(
+        User, CarbonEntry.user_id == User.id
+    ).order_by(CarbonEntry.user_id, CarbonEntry.entry_date).yield_per(1000)
+    
+    for _, group in groupby(rows, key=lambda row: row[0].user_id):
+        group = list(group)
+        if recent:
+            group = group[-recent:]
+        if len(group) < min_entries:
+            continue
+        user_type = group[0][1]
+        yield getattr(user_type, "value", user_type), [
+            {
+                "entry_date": e.entry_date.isoformat() if e.entry_date else None,
+                "total_carbon_footprint": e.total_carbon_footprint,
+                "category_breakdown": breakdown_from_columns(e)
+            }
+            for e, _ in group
+        ]
+
+
+def _version_path(version: int, directory: str) -> str:
+    return os.path.join(directory, f"global_v{version}.joblib")
+
+
+def list_versions(directory: str = GLOBAL_MODEL_DIR) -> List[int]:
+    """All saved global model versions, oldest first"""
+    if not os.path.isdir(directory):
+        return []
+    versions = []
+    for name in os.listdir(directory):
+        if name.startswith("global_v") and name.endswith(".joblib"):
+            try:
+                versions.append(int(name[len("global_v"):-len(".joblib")]))
+            except ValueError:
+                continue
+    return sorted(versions)
+
+
+def current_version(directory: str = GLOBAL_MODEL_DIR) -> Optional[int]:
+    """Version currently served, or None"""
+    try:
+        with open(os.path.join(directory, CURRENT_FILE)) as f:
+            return int(f.read().strip())
+    except (FileNotFoundError, ValueError):
+        return None
+
+
+def activate_version(version: int, directory: str = GLOBAL_MODEL_DIR):
+    """Point serving at a saved version"""
+    if not os.path.exists(_version_path(version, directory)):
+        raise ValueError(f"Global model version {version} not found")
+    tmp_path = os.path.join(directory, f"{CURRENT_FILE}.tmp")
+    with open(tmp_path, "w") as f:
+        f.write(str(version))
+    os.replace(tmp_path, os.path.join(directory, CURRENT_FILE))
+
+
+def save_global_model(
+    predictor: GlobalCarbonFootprintPredictor,
+    directory: str = GLOBAL_MODEL_DIR,
+    activate: bool = True
+) -> int:
+    """Save as the next version number and optionally make it current"""
+    os.makedirs(directory, exist_ok=True)
+    versions = list_versions(directory)
+    version = versions[-1] + 1 if versions else 1
+    predictor.metadata.update({
+        "version": version,
+        "trained_at": datetime.utcnow().isoformat()
+    })
+    predictor.save_model(_version_path(version, directory))
+    if activate:
+        activate_version(version, directory)
+    return version
+
+
+def load_global_model(directory: str = GLOBAL_MODEL_DIR) -> Optional[GlobalCarbonFootprintPredictor]:
+    """Currently active global model, cached in-process until CURRENT changes"""
+    version = current_version(directory)
+    if version is None:
+        return None
+    key = (directory, version)
+    with _cache_lock:
+        if _cache["key"] == key:
+            return _cache["model"]
+    try:
+        model = GlobalCarbonFootprintPredictor.load_model(_version_path(version, directory))
+    except (FileNotFoundError, EOFError):
+        return None
+    with _cache_lock:
+        _cache["key"] = key
+        _cache["model"] = model
+    return model
@@ -0,0 +1,192 @@
+"""
+Persistent Forecast Model Store
+Caches trained CarbonFootprintPredictor instances per user so requests only
+retrain when new carbon entries have arrived since the model was fitted
+"""
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+import os
+import threading
+
+from dotenv import load_dotenv
+
+from ml_models.predictor import CarbonFootprintPredictor
+
+load_dotenv()
+
+MODEL_STORE_DIR = os.getenv("MODEL_STORE_DIR", "./trained_models")
+MODEL_STORE_MAX_MEMORY = int(os.getenv("MODEL_STORE_MAX_MEMORY", "128"))  # models held in memory
+MODEL_STORE_MAX_DISK_MB = float(os.getenv("MODEL_STORE_MAX_DISK_MB", "512"))
+
+
+class ModelStore:
+    """
+    Two-level (memory + disk) LRU cache of trained predictors
+    Models are keyed by (user_id, scope, model_type) and tagged with a data
+    watermark - (latest entry id, entry count) of the training data. A cached
+    model is served only while the caller's watermark still matches; any new
+    entry changes the watermark and triggers a retrain.
+    """
+    
+    def __init__(
+        self,
+        directory: str = MODEL_STORE_DIR,
+        max_memory_models: int = MODEL_STORE_MAX_MEMORY,
+        max_disk_bytes: int = int(MODEL_STORE_MAX_DISK_MB * 1024 * 1024)
+    ):
+        self.directory = directory
+        self.max_memory_models = max_memory_models
+        self.max_disk_bytes = max_disk_bytes
+        self._memory = OrderedDict()  # key -> (watermark, predictor)
+        self._lock = threading.Lock()
+        self.stats = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "evictions": 0}
+    
+    def _path(self, key: Tuple) -> str:
+        user_id, scope, model_type = key
+        return os.path.join(self.directory, f"user{user_id}_{scope}_{model_type}.joblib")
+    
+    def get(
+        self,
+        user_id: int,
+        watermark: Tuple[int, int],
+        scope: str = "default",
+        model_type: str = "ensemble"
+    ) -> Optional[CarbonFootprintPredictor]:
+        """Return the cached predictor if it was trained on data at this watermark"""
+        key = (user_id, scope, model_type)
+        watermark = tuple(watermark)
+        with self._lock:
+            cached = self._memory.get(key)
+            if cached and cached[0] == watermark:
+                self._memory.move_to_end(key)
+                self.stats["memory_hits"] += 1
+                return cached[1]
+        
+        path = self._path(key)
+        if os.path.exists(path):
+            try:
+                predictor = CarbonFootprintPredictor.load_model(path)
+            except Exception:
+                predictor = None
+            if predictor is not None:
+                stored = tuple(predictor.metadata.get("watermark", ()))
+                os.utime(path)  # mark as recently used for disk eviction
+                with self._lock:
+                    # Keep even a stale model in memory so get_latest can serve it
+                    self._remember(key, stored, predictor)
+                    if stored == watermark:
+                        self.stats["disk_hits"] += 1
+                        return predictor
+                    self.stats["misses"] += 1
+                return None
+        
+        with self._lock:
+            self.stats["misses"] += 1
+        return None
+    
+    def get_latest(
+        self,
+        user_id: int,
+        scope: str = "default",
+        model_type: str = "ensemble"
+    ) -> Optional[Tuple[Tuple[int, int], CarbonFootprintPredictor]]:
+        """Return (watermark, predictor) for the newest cached model, even if stale"""
+        key = (user_id, scope, model_type)
+        with self._lock:
+            cached = self._memory.get(key)
+            if cached:
+                self._memory.move_to_end(key)
+                return cached
+        
+        path = self._path(key)
+        if not os.path.exists(path):
+            return None
+        try:
+            predictor = CarbonFootprintPredictor.load_model(path)
+        except Exception:
+            return None
+        watermark = tuple(predictor.metadata.get("watermark", ()))
+        with self._lock:
+            self._remember(key, watermark, predictor)
+        return watermark, predictor
+    
+    def put(
+        self,
+        user_id: int,
+        watermark: Tuple[int, int],
+        predictor: CarbonFootprintPredictor,
+        scope: str = "default"
+    ):
+        """Store a trained predictor in memory and on disk"""
+        key = (user_id, scope, predictor.model_type)
+        watermark = tuple(watermark)
+        predictor.metadata["watermark"] = list(watermark)
+        
+        os.makedirs(self.directory, exist_ok=True)
+        path = self._path(key)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        predictor.save_model(tmp_path)
+        os.replace(tmp_path, path)
+        
+        with self._lock:
+            self._remember(key, watermark, predictor)
+        self._enforce_disk_budget(keep=path)
+    
+    def invalidate(self, user_id: int):
+        """Drop every cached model for a user"""
+        with self._lock:
+            for key in [k for k in self._memory if k[0] == user_id]:
+                del self._memory[key]
+        if os.path.isdir(self.directory):
+            prefix = f"user{user_id}_"
+            for name in os.listdir(self.directory):
+                if name.startswith(prefix):
+                    try:
+                        os.remove(os.path.join(self.directory, name))
+                    except FileNotFoundError:
+                        pass
+    
+    def _remember(self, key: Tuple, watermark: Tuple, predictor: CarbonFootprintPredictor):
+        """Insert into the in-memory LRU (caller holds the lock)"""
+        self._memory[key] = (watermark, predictor)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_memory_models:
+            self._memory.popitem(last=False)
+            self.stats["evictions"] += 1
+    
+    def _enforce_disk_budget(self, keep: Optional[str] = None):
+        """Delete least recently used model files until under the disk budget"""
+        files = []
+        for name in os.listdir(self.directory):
+            if not name.endswith(".joblib"):
+                continue
+            path = os.path.join(self.directory, name)
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            files.append((stat.st_mtime, stat.st_size, path))
+        
+        total = sum(size for _, size, _ in files)
+        for _, size, path in sorted(files):
+            if total <= self.max_disk_bytes:
+                break
+            if path == keep:
+                continue
+            try:
+                os.remove(path)
+                total -= size
+                with self._lock:
+                    self.stats["evictions"] += 1
+            except FileNotFoundError:
+                pass
+    
+    def get_stats(self) -> Dict:
+        """Cache hit/miss counters and current occupancy"""
+        with self._lock:
+            stats = dict(self.stats)
+            stats["memory_models"] = len(self._memory)
+        return stats
+
+
+model_store = ModelStore()
@@ -10,12 +10,23 @@ from sklearn.preprocessing import StandardScaler
 from sklearn.model_selection import train_test_split
 from sklearn.metrics import mean_squared_error, mean_absolute_error, r2_score
 import joblib
+import json
 import os
 from typing import List, Dict, Tuple, Optional
 from datetime import datetime, timedelta
 import warnings
 warnings.filterwarnings('ignore')
 
+# Upper bound on rows in the batched forecast lookup table before falling back
+# to fixed-point iteration
+FORECAST_GRID_MAX_ROWS = 100000
+
+# Incremental updates (partial_fit)
+INCREMENTAL_ESTIMATORS = 5  # trees/boosting stages added per update
+INCREMENTAL_WINDOW = 12     # most recent rows (at least the new ones) the added trees are fitted on
+FULL_REFIT_EVERY = 12       # updates before a forced full refit
+DRIFT_TOLERANCE = 1.5       # prequential MAE / full-fit test MAE that forces a refit
+
 
 class CarbonFootprintPredictor:
     """
@@ -23,6 +34,13 @@ class CarbonFootprintPredictor:
     Uses ensemble methods for accurate forecasting
     """
     
+    # Columns of the prepare_features matrix; recorded on the model when it is
+    # fitted, never per request, since cached instances serve many requests
+    FEATURE_NAMES = [
+        'days_since_start', 'month', 'quarter', 'rolling_mean', 'rolling_std', 'trend',
+        'energy', 'transportation', 'waste', 'food', 'water', 'corporate'
+    ]
+    
     def __init__(self, model_type: str = "ensemble"):
         """
         Initialize predictor
@@ -36,6 +54,9 @@ class CarbonFootprintPredictor:
         self.scaler = StandardScaler()
         self.feature_names = None
         self.is_trained = False
+        self.training_metrics = None
+        self.metadata = {}
+        self.update_state = None
         
     def prepare_features(self, historical_data: List[Dict]) -> Tuple[np.ndarray, np.ndarray]:
         """
@@ -49,72 +70,46 @@ class CarbonFootprintPredictor:
         
         # Sort by date
         if 'entry_date' in df.columns:
-            df['entry_date'] = pd.to_datetime(df['entry_date'])
+            df['entry_date'] = pd.to_datetime(df['entry_date'], format='ISO8601')
             df = df.sort_values('entry_date')
         
-        # Extract features
-        features = []
-        targets = []
-        
         # Create time-based features
-        df['days_since_start'] = (df['entry_date'] - df['entry_date'].min()).dt.days if 'entry_date' in df.columns else range(len(df))
-        df['month'] = df['entry_date'].dt.month if 'entry_date' in df.columns else [datetime.now().month] * len(df)
-        df['quarter'] = df['entry_date'].dt.quarter if 'entry_date' in df.columns else [1] * len(df)
+        n_rows = len(df)
+        if 'entry_date' in df.columns:
+            days_since_start = (df['entry_date'] - df['entry_date'].min()).dt.days.to_numpy()
+            month = df['entry_date'].dt.month.to_numpy()
+            quarter = df['entry_date'].dt.quarter.to_numpy()
+        else:
+            days_since_start = np.arange(n_rows)
+            month = np.full(n_rows, datetime.now().month)
+            quarter = np.ones(n_rows)
         
         # Create rolling statistics
-        window_size = min(3, len(df))
-        if window_size > 0:
-            df['rolling_mean'] = df['total_carbon_footprint'].rolling(window=window_size, min_periods=1).mean()
-            df['rolling_std'] = df['total_carbon_footprint'].rolling(window=window_size, min_periods=1).std().fillna(0)
-            df['trend'] = df['total_carbon_footprint'].diff().fillna(0)
-        
-        for i in range(len(df)):
-            row_features = []
-            
-            # Temporal features
-            row_features.append(df.iloc[i]['days_since_start'])
-            row_features.append(df.iloc[i]['month'])
-            row_features.append(df.iloc[i]['quarter'])
-            
-            # Statistical features
-            if 'rolling_mean' in df.columns:
-                row_features.append(df.iloc[i]['rolling_mean'])
-            else:
-                row_features.append(df.iloc[i]['total_carbon_footprint'])
-            
-            if 'rolling_std' in df.columns:
-                row_features.append(df.iloc[i]['rolling_std'])
-            else:
-                row_features.append(0)
-            
-            if 'trend' in df.columns:
-                row_features.append(df.iloc[i]['trend'])
-            else:
-                row_features.append(0)
-            
-            # Category breakdown features (if available)
-            if 'category_breakdown' in df.columns and df.iloc[i]['category_breakdown']:
-                breakdown = df.iloc[i]['category_breakdown']
-                if isinstance(breakdown, str):
-                    import json
-                    breakdown = json.loads(breakdown)
-                
-                categories = ['energy', 'transportation', 'waste', 'food', 'water', 'corporate']
-                for cat in categories:
-                    row_features.append(breakdown.get(cat, 0))
-            else:
-                # Default zeros for categories
-                row_features.extend([0] * 6)
-            
-            features.append(row_features)
-            targets.append(df.iloc[i]['total_carbon_footprint'])
+        totals = df['total_carbon_footprint']
+        window_size = min(3, n_rows)
+        rolling_mean = totals.rolling(window=window_size, min_periods=1).mean().to_numpy()
+        rolling_std = totals.rolling(window=window_size, min_periods=1).std().fillna(0).to_numpy()
+        trend = totals.diff().fillna(0).to_numpy()
         
-        self.feature_names = [
-            'days_since_start', 'month', 'quarter', 'rolling_mean', 'rolling_std', 'trend',
-            'energy', 'transportation', 'waste', 'food', 'water', 'corporate'
-        ]
+        # Category breakdown features (JSON strings are parsed once per row)
+        categories = ['energy', 'transportation', 'waste', 'food', 'water', 'corporate']
+        if 'category_breakdown' in df.columns:
+            breakdowns = [
+                json.loads(b) if isinstance(b, str) and b else b if isinstance(b, dict) else {}
+                for b in df['category_breakdown']
+            ]
+            category_features = pd.DataFrame.from_records(
+                breakdowns, columns=categories
+            ).fillna(0).to_numpy(dtype=float)
+        else:
+            category_features = np.zeros((n_rows, len(categories)))
+        
+        features = np.column_stack([
+            days_since_start, month, quarter, rolling_mean, rolling_std, trend, category_features
+        ]).astype(float)
+        targets = totals.to_numpy()
         
-        return np.array(features), np.array(targets)
+        return features, targets
     
     def train(self, historical_data: List[Dict]) -> Dict[str, float]:
         """
@@ -129,6 +124,11 @@ class CarbonFootprintPredictor:
         if len(X) < 2:
             return {"error": "Insufficient samples for training"}
         
+        return self._fit(X, y)
+    
+    def _fit(self, X: np.ndarray, y: np.ndarray) -> Dict[str, float]:
+        """Fit scaler and model on a prepared feature matrix, returning metrics"""
+        self.feature_names = list(self.FEATURE_NAMES)
         # Split data
         if len(X) > 3:
             X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
@@ -187,12 +187,7 @@ class CarbonFootprintPredictor:
         
         # Evaluate
         if len(X_test) > 0:
-            if isinstance(self.model, tuple):
-                y_pred_rf = self.model[0].predict(X_test_scaled)
-                y_pred_gb = self.model[1].predict(X_test_scaled)
-                y_pred = (y_pred_rf + y_pred_gb) / 2
-            else:
-                y_pred = self.model.predict(X_test_scaled)
+            y_pred, _ = self._evaluate(X_test_scaled)
             
             mse = mean_squared_error(y_test, y_pred)
             mae = mean_absolute_error(y_test, y_pred)
@@ -203,7 +198,21 @@ class CarbonFootprintPredictor:
         
         self.is_trained = True
         
-        return {
+        self.update_state = {
+            "full_fit_rows": len(X),
+            "baseline_mae": float(mae),
+            "updates_since_full_fit": 0,
+            "rows_since_full_fit": 0,
+            "prequential_abs_error": 0.0,
+            "prequential_rows": 0
+        }
+        if isinstance(self.model, LinearRegression):
+            # Sufficient statistics for exact incremental least squares
+            design = np.hstack([np.ones((len(X_train_scaled), 1)), X_train_scaled])
+            self.update_state["gram"] = design.T @ design
+            self.update_state["moment"] = design.T @ y_train
+        
+        self.training_metrics = {
             "mse": float(mse),
             "mae": float(mae),
             "rmse": float(rmse),
@@ -211,6 +220,98 @@ class CarbonFootprintPredictor:
             "training_samples": len(X_train),
             "test_samples": len(X_test)
         }
+        return self.training_metrics
+    
+    def partial_fit(self, historical_data: List[Dict], new_rows: int) -> Dict[str, float]:
+        """
+        Update a trained model with only the newest observations
+        historical_data is the same history train() would see; the last
+        new_rows rows by date are treated as unseen, so callers must only
+        pass entries dated after everything already learned (see
+        training_queue.appended_rows). Tree models grow
+        INCREMENTAL_ESTIMATORS warm-started trees/stages fitted on a recent
+        window: the new rows plus the tail of the history, INCREMENTAL_WINDOW
+        rows in all, so a single new row never becomes a whole tree's
+        training set. Linear models are re-solved exactly from accumulated
+        X'X / X'y. The scaler keeps its full-fit statistics. Falls back to
+        train() if the model has never been fully fitted. Updates in place;
+        callers serving this instance should update a copy.
+        """
+        if not self.is_trained or self.update_state is None:
+            return self.train(historical_data)
+        
+        X, y = self.prepare_features(historical_data)
+        new_rows = min(new_rows, len(X))
+        if new_rows <= 0:
+            return self.training_metrics
+        X_new = self.scaler.transform(X[-new_rows:])
+        y_new = y[-new_rows:]
+        window = max(new_rows, min(INCREMENTAL_WINDOW, len(X)))
+        X_window = self.scaler.transform(X[-window:])
+        y_window = y[-window:]
+        
+        # Prequential error: score the current model on rows it has not seen yet
+        y_pred, _ = self._evaluate(X_new)
+        state = self.update_state
+        state["prequential_abs_error"] += float(np.abs(y_new - y_pred).sum())
+        state["prequential_rows"] += new_rows
+        
+        estimators = self.model if isinstance(self.model, tuple) else (self.model,)
+        for estimator in estimators:
+            if isinstance(estimator, LinearRegression):
+                design = np.hstack([np.ones((new_rows, 1)), X_new])
+                state["gram"] = state["gram"] + design.T @ design
+                state["moment"] = state["moment"] + design.T @ y_new
+                theta = np.linalg.lstsq(state["gram"], state["moment"], rcond=None)[0]
+                estimator.intercept_ = theta[0]
+                estimator.coef_ = theta[1:]
+            else:
+                estimator.set_params(
+                    warm_start=True,
+                    n_estimators=estimator.n_estimators + INCREMENTAL_ESTIMATORS
+                )
+                estimator.fit(X_window, y_window)
+        
+        state["updates_since_full_fit"] += 1
+        state["rows_since_full_fit"] += new_rows
+        self.training_metrics = {
+            **self.training_metrics,
+            "incremental_updates": state["updates_since_full_fit"],
+            "prequential_mae": self.prequential_mae(),
+            "drift_ratio": self.drift_ratio()
+        }
+        return self.training_metrics
+    
+    def prequential_mae(self) -> Optional[float]:
+        """Mean absolute error on rows scored before the model was updated with them"""
+        state = self.update_state or {}
+        if not state.get("prequential_rows"):
+            return None
+        return state["prequential_abs_error"] / state["prequential_rows"]
+    
+    def drift_ratio(self) -> Optional[float]:
+        """Prequential MAE relative to the test MAE of the last full fit"""
+        state = self.update_state or {}
+        mae = self.prequential_mae()
+        if mae is None or state.get("prequential_rows", 0) < 3 or state.get("baseline_mae", 0) < 1e-9:
+            return None
+        return mae / state["baseline_mae"]
+    
+    def needs_full_refit(self, new_rows: int) -> bool:
+        """
+        Periodic full-refit policy for incremental updates
+        Refit after FULL_REFIT_EVERY updates, once incremental rows would
+        outnumber those in the full fit, or when drift exceeds DRIFT_TOLERANCE.
+        """
+        state = self.update_state
+        if not self.is_trained or state is None:
+            return True
+        if state["updates_since_full_fit"] >= FULL_REFIT_EVERY:
+            return True
+        if state["rows_since_full_fit"] + new_rows > state["full_fit_rows"]:
+            return True
+        drift = self.drift_ratio()
+        return drift is not None and drift > DRIFT_TOLERANCE
     
     def predict(self, historical_data: List[Dict], forecast_periods: int = 12) -> Dict:
         """
@@ -230,47 +331,33 @@ class CarbonFootprintPredictor:
         
         # Prepare last known features
         X, y = self.prepare_features(historical_data)
+        return self._predict_from_features(X, y, historical_data, forecast_periods)
+    
+    def _predict_from_features(
+        self,
+        X: np.ndarray,
+        y: np.ndarray,
+        historical_data: List[Dict],
+        forecast_periods: int
+    ) -> Dict:
+        """Forecast from a prepared feature matrix and build the response"""
         if len(X) == 0:
             return {"error": "Could not prepare features"}
         
-        last_features = X[-1].reshape(1, -1)
         last_footprint = y[-1] if len(y) > 0 else 0
         
         # Generate predictions for future periods
-        predictions = []
-        confidence_intervals = []
-        
-        current_features = last_features.copy()
+        predictions, std_est = self._forecast(X[-1], forecast_periods)
+        if std_est is None:
+            std_est = np.abs(predictions - last_footprint) * 0.1  # Rough estimate
+        lower = np.maximum(0, predictions - 1.96 * std_est)
+        upper = predictions + 1.96 * std_est
         
-        for period in range(1, forecast_periods + 1):
-            # Scale features
-            current_scaled = self.scaler.transform(current_features)
-            
-            # Predict
-            if isinstance(self.model, tuple):
-                pred_rf = self.model[0].predict(current_scaled)[0]
-                pred_gb = self.model[1].predict(current_scaled)[0]
-                prediction = (pred_rf + pred_gb) / 2
-                # Estimate confidence from model variance
-                std_est = abs(pred_rf - pred_gb) / 2
-            else:
-                prediction = self.model.predict(current_scaled)[0]
-                std_est = abs(prediction - last_footprint) * 0.1  # Rough estimate
-            
-            predictions.append(float(prediction))
-            confidence_intervals.append({
-                "lower": float(max(0, prediction - 1.96 * std_est)),
-                "upper": float(prediction + 1.96 * std_est)
-            })
-            
-            # Update features for next prediction
-            # Increment temporal features
-            current_features[0][0] += 30  # Add 30 days
-            current_features[0][1] = ((current_features[0][1] + 1) % 12) + 1  # Increment month
-            current_features[0][2] = ((current_features[0][2] - 1) % 4) + 1  # Update quarter
-            
-            # Update rolling mean (simplified)
-            current_features[0][3] = (current_features[0][3] + prediction) / 2
+        predictions = predictions.tolist()
+        confidence_intervals = [
+            {"lower": low, "upper": high}
+            for low, high in zip(lower.tolist(), upper.tolist())
+        ]
         
         # Calculate trend analysis
         historical_values = [entry.get('total_carbon_footprint', 0) for entry in historical_data]
@@ -294,6 +381,130 @@ class CarbonFootprintPredictor:
             }
         }
     
+    def _evaluate(self, X_scaled: np.ndarray) -> Tuple[np.ndarray, Optional[np.ndarray]]:
+        """
+        Predict a batch of scaled rows
+        Returns (predictions, std_est); std_est is the ensemble disagreement,
+        or None for single models.
+        """
+        if isinstance(self.model, tuple):
+            pred_rf = self.model[0].predict(X_scaled)
+            pred_gb = self.model[1].predict(X_scaled)
+            # Estimate confidence from model variance
+            return (pred_rf + pred_gb) / 2, np.abs(pred_rf - pred_gb) / 2
+        return self.model.predict(X_scaled), None
+    
+    def _forecast(self, last_features: np.ndarray, forecast_periods: int) -> Tuple[np.ndarray, Optional[np.ndarray]]:
+        """
+        Multi-step forecast with a constant number of model calls
+        Temporal features advance deterministically, so every step's row is
+        built and scaled up front. Only rolling_mean (feature 3) feeds back:
+        rm[t+1] = (rm[t] + pred[t]) / 2. For tree models the prediction is
+        piecewise constant in rm between the trees' split thresholds, so one
+        batched call over (step x threshold interval) gives a lookup table and
+        the recurrence runs as cheap scalar arithmetic. Linear models are
+        affine in rm and need a single call. Anything else falls back to
+        fixed-point iteration over the whole horizon.
+        """
+        n_steps = forecast_periods
+        if n_steps <= 0:
+            return np.zeros(0), None
+        features = np.repeat(last_features.reshape(1, -1).astype(float), n_steps, axis=0)
+        
+        # Increment temporal features: +30 days and month per step; the
+        # per-step quarter update ((q - 1) % 4) + 1 leaves it unchanged
+        features[:, 0] = last_features[0] + 30 * np.arange(n_steps)
+        month = last_features[1]
+        for step in range(1, n_steps):
+            month = ((month + 1) % 12) + 1
+            features[step, 1] = month
+        
+        scaled = self.scaler.transform(features)
+        rolling_mean = float(last_features[3])
+        mean, scale = self.scaler.mean_[3], self.scaler.scale_[3]
+        
+        thresholds = self._split_thresholds(3)
+        if thresholds is not None and n_steps * (len(thresholds) + 1) <= FORECAST_GRID_MAX_ROWS:
+            # Largest float32 inside each (t[k-1], t[k]] interval, plus one above
+            # the last threshold; trees compare float32 inputs against t[k]
+            upper = thresholds.astype(np.float32)
+            upper = np.where(upper > thresholds, np.nextafter(upper, np.float32(-np.inf)), upper)
+            top = np.float32(thresholds[-1]) if len(thresholds) else np.float32(0)
+            if len(thresholds) and top <= thresholds[-1]:
+                top = np.nextafter(top, np.float32(np.inf))
+            representatives = np.append(upper, top).astype(float)
+            
+            grid = np.repeat(scaled, len(representatives), axis=0)
+            grid[:, 3] = np.tile(representatives, n_steps)
+            table, std_table = self._evaluate(grid)
+            table = table.reshape(n_steps, -1)
+            std_table = std_table.reshape(n_steps, -1) if std_table is not None else None
+            
+            predictions = np.zeros(n_steps)
+            std_est = np.zeros(n_steps) if std_table is not None else None
+            for step in range(n_steps):
+                x = float(np.float32((rolling_mean - mean) / scale))
+                interval = int(np.searchsorted(thresholds, x, side="left"))
+                predictions[step] = table[step, interval]
+                if std_est is not None:
+                    std_est[step] = std_table[step, interval]
+                # Update rolling mean (simplified)
+                rolling_mean = (rolling_mean + predictions[step]) / 2
+            return predictions, std_est
+        
+        coef = getattr(self.model, "coef_", None)
+        if coef is not None and np.ndim(coef) == 1:
+            scaled[:, 3] = 0.0
+            base, _ = self._evaluate(scaled)
+            predictions = np.zeros(n_steps)
+            for step in range(n_steps):
+                predictions[step] = base[step] + coef[3] * ((rolling_mean - mean) / scale)
+                rolling_mean = (rolling_mean + predictions[step]) / 2
+            return predictions, None
+        
+        return self._forecast_fixed_point(features, n_steps)
+    
+    def _forecast_fixed_point(self, features: np.ndarray, n_steps: int) -> Tuple[np.ndarray, Optional[np.ndarray]]:
+        """
+        Solve the rolling_mean recurrence by batched fixed-point iteration
+        Each pass fixes at least one more step; the fixed point is exactly the
+        step-by-step recurrence.
+        """
+        predictions = np.zeros(n_steps)
+        std_est = None
+        start = 0  # steps before `start` are final
+        for _ in range(n_steps):
+            pred, std = self._evaluate(self.scaler.transform(features[start:]))
+            predictions[start:] = pred
+            if std is not None:
+                if std_est is None:
+                    std_est = np.zeros(n_steps)
+                std_est[start:] = std
+            
+            rolling_mean = features[:, 3].copy()
+            for step in range(start, n_steps - 1):
+                rolling_mean[step + 1] = (rolling_mean[step] + predictions[step]) / 2
+            changed = np.flatnonzero(rolling_mean != features[:, 3])
+            features[:, 3] = rolling_mean
+            if not changed.size:
+                break
+            start = int(changed[0])
+        
+        return predictions, std_est
+    
+    def _split_thresholds(self, feature: int) -> Optional[np.ndarray]:
+        """Sorted split thresholds on one feature across all trees, or None for non-tree models"""
+        estimators = self.model if isinstance(self.model, tuple) else (self.model,)
+        thresholds = [np.empty(0)]
+        for estimator in estimators:
+            trees = getattr(estimator, "estimators_", None)
+            if trees is None:
+                return None
+            for tree in np.ravel(trees):
+                structure = tree.tree_
+                thresholds.append(structure.threshold[structure.feature == feature])
+        return np.unique(np.concatenate(thresholds))
+    
     def save_model(self, filepath: str):
         """Save trained model to disk"""
         os.makedirs(os.path.dirname(filepath) if os.path.dirname(filepath) else '.', exist_ok=True)
@@ -302,7 +513,10 @@ class CarbonFootprintPredictor:
             'model': self.model,
             'scaler': self.scaler,
             'feature_names': self.feature_names,
-            'is_trained': self.is_trained
+            'is_trained': self.is_trained,
+            'training_metrics': self.training_metrics,
+            'metadata': self.metadata,
+            'update_state': self.update_state
         }
         joblib.dump(model_data, filepath)
     
@@ -315,5 +529,79 @@ class CarbonFootprintPredictor:
         predictor.scaler = model_data['scaler']
         predictor.feature_names = model_data['feature_names']
         predictor.is_trained = model_data['is_trained']
+        predictor.training_metrics = model_data.get('training_metrics')
+        predictor.metadata = model_data.get('metadata', {})
+        predictor.update_state = model_data.get('update_state')
         return predictor
 
+
+
+class GlobalCarbonFootprintPredictor(CarbonFootprintPredictor):
+    """
+    Fleet-wide forecasting model trained offline on every user's history
+    Uses the per-user temporal features plus user conditioning (user type
+    one-hot and the row's category mix), so serving any user is a single
+    forecast with no per-request fitting.
+    """
+    
+    USER_TYPES = ['individual', 'institution', 'corporation']
+    CATEGORY_COLUMNS = slice(6, 12)  # energy..corporate in prepare_features output
+    FEATURE_NAMES = CarbonFootprintPredictor.FEATURE_NAMES + [f"user_type_{t}" for t in USER_TYPES] + [
+        f"share_{name}" for name in ['energy', 'transportation', 'waste', 'food', 'water', 'corporate']
+    ]
+    
+    def prepare_user_features(self, historical_data: List[Dict], user_type: str) -> Tuple[np.ndarray, np.ndarray]:
+        """prepare_features plus user type one-hot and category share columns"""
+        X, y = self.prepare_features(historical_data)
+        if len(X) == 0:
+            return X, y
+        
+        user_type = getattr(user_type, "value", user_type)
+        one_hot = np.array([float(user_type == t) for t in self.USER_TYPES])
+        categories = X[:, self.CATEGORY_COLUMNS]
+        category_total = categories.sum(axis=1, keepdims=True)
+        shares = np.divide(
+            categories, category_total,
+            out=np.zeros_like(categories), where=category_total > 0
+        )
+        X = np.hstack([X, np.tile(one_hot, (len(X), 1)), shares])
+        return X, y
+    
+    def train_global(self, histories) -> Dict[str, float]:
+        """
+        Fit on many users at once
+        histories yields (user_type, historical_data) pairs; users with fewer
+        than two entries are skipped.
+        """
+        blocks_X, blocks_y = [], []
+        n_users = 0
+        for user_type, historical_data in histories:
+            if len(historical_data) < 2:
+                continue
+            X, y = self.prepare_user_features(historical_data, user_type)
+            blocks_X.append(X)
+            blocks_y.append(y)
+            n_users += 1
+        
+        if not blocks_X:
+            return {"error": "Insufficient data for training"}
+        
+        metrics = self._fit(np.vstack(blocks_X), np.concatenate(blocks_y))
+        metrics["users"] = n_users
+        self.training_metrics = metrics
+        return metrics
+    
+    def predict(
+        self,
+        historical_data: List[Dict],
+        forecast_periods: int = 12,
+        user_type: str = "individual"
+    ) -> Dict:
+        """Forecast one user's footprint with the shared model (never trains)"""
+        if not self.is_trained:
+            return {"error": "Global model is not trained"}
+        if not historical_data:
+            return {"error": "No historical data provided"}
+        
+        X, y = self.prepare_user_features(historical_data, user_type)
+        return self._predict_from_features(X, y, historical_data, forecast_periods)
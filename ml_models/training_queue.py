@@ -0,0 +1,284 @@
+"""
+Background Training Queue for Forecast Models
+Runs CarbonFootprintPredictor.train in a process pool so CPU-heavy fits never
+block the API event loop; finished models are published to the model store
+"""
+from collections import OrderedDict, deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Dict, List, Optional, Tuple
+import copy
+import multiprocessing
+import os
+import threading
+import time
+import uuid
+
+from dotenv import load_dotenv
+from sqlalchemy import desc, func
+from sqlalchemy.orm import Session
+
+from database.models import CarbonEntry, BREAKDOWN_COLUMNS, breakdown_from_columns
+from ml_models.predictor import CarbonFootprintPredictor
+from ml_models.model_store import model_store
+
+load_dotenv()
+
+TRAINING_WORKERS = int(os.getenv("TRAINING_WORKERS", str(max(1, (os.cpu_count() or 2) // 2))))
+INCREMENTAL_TRAINING = os.getenv("INCREMENTAL_TRAINING", "true").lower() in ("1", "true", "yes")
+MAX_TRACKED_JOBS = 1000
+
+# How much history each cached model is trained on
+SCOPE_LIMITS = {"predict": 24, "report": None}
+
+
+def entry_watermark(db: Session, user_id: int) -> Tuple[int, int]:
+    """(latest entry id, entry count) - changes whenever a user adds entries"""
+    latest_id, count = db.query(
+        func.max(CarbonEntry.id), func.count(CarbonEntry.id)
+    ).filter(CarbonEntry.user_id == user_id).one()
+    return (latest_id or 0, count)
+
+
+def load_history(db: Session, user_id: int, limit: Optional[int] = None) -> List[Dict]:
+    """Most recent entries for a user in chronological order, as predictor input"""
+    query = db.query(
+        CarbonEntry.entry_date,
+        *[getattr(CarbonEntry, column) for column in BREAKDOWN_COLUMNS.values()],
+        CarbonEntry.breakdown_shape
+    ).filter(
+        CarbonEntry.user_id == user_id
+    ).order_by(desc(CarbonEntry.entry_date))
+    if limit:
+        query = query.limit(limit)
+    return [
+        {
+            "entry_date": row.entry_date.isoformat() if row.entry_date else None,
+            "total_carbon_footprint": row.total_carbon_footprint,
+            "category_breakdown": breakdown_from_columns(row)
+        }
+        for row in reversed(query.all())
+    ]
+
+
+def appended_rows(db: Session, user_id: int, previous_watermark: Tuple[int, int]) -> int:
+    """
+    Number of entries written since previous_watermark (by id), or 0 unless
+    every one of them is dated strictly after all earlier entries. Backdated
+    imports land inside the history, where an incremental update would
+    learn from the wrong rows, so they force a full refit.
+    """
+    if len(previous_watermark) != 2:
+        return 0
+    previous_id, previous_count = previous_watermark
+    new_count, earliest_new, undated = db.query(
+        func.count(CarbonEntry.id),
+        func.min(CarbonEntry.entry_date),
+        func.count(CarbonEntry.id) - func.count(CarbonEntry.entry_date)
+    ).filter(CarbonEntry.user_id == user_id, CarbonEntry.id > previous_id).one()
+    if not new_count or undated:
+        return 0
+    latest_old, old_count = db.query(
+        func.max(CarbonEntry.entry_date), func.count(CarbonEntry.id)
+    ).filter(CarbonEntry.user_id == user_id, CarbonEntry.id <= previous_id).one()
+    if old_count != previous_count:
+        return 0  # earlier entries changed since the model was fitted
+    if latest_old is not None and earliest_new <= latest_old:
+        return 0
+    return new_count
+
+
+def _run_training(user_id: int, scope: str, model_type: str) -> Dict:
+    """Worker entry point: load the user's history and fit a predictor"""
+    from database.database import SessionLocal
+    
+    started = time.time()
+    # Update the previous model with just the new entries when the refit
+    # policy allows; otherwise (or on first training) fit from scratch
+    previous = model_store.get_latest(user_id, scope=scope, model_type=model_type) if INCREMENTAL_TRAINING else None
+    db = SessionLocal()
+    try:
+        watermark = entry_watermark(db, user_id)
+        historical_data = load_history(db, user_id, SCOPE_LIMITS.get(scope))
+        new_rows = appended_rows(db, user_id, previous[0]) if previous is not None else 0
+    finally:
+        db.close()
+    
+    if previous is not None:
+        predictor = previous[1]
+        if 0 < new_rows < len(historical_data) and not predictor.needs_full_refit(new_rows):
+            # The store may be serving this instance (inline mode); update a
+            # copy and let publishing swap it in
+            predictor = copy.deepcopy(predictor)
+            metrics = predictor.partial_fit(historical_data, new_rows)
+            return _training_result(watermark, predictor, metrics, "incremental", started)
+    
+    predictor = CarbonFootprintPredictor(model_type=model_type)
+    metrics = predictor.train(historical_data)
+    if previous is not None and predictor.update_state is not None:
+        # Record how the incrementally updated model compared with this refit
+        predictor.update_state["last_refit_comparison"] = {
+            "incremental_updates": previous[1].update_state.get("updates_since_full_fit", 0)
+            if previous[1].update_state else 0,
+            "incremental_prequential_mae": previous[1].prequential_mae(),
+            "full_fit_test_mae": metrics.get("mae")
+        }
+    return _training_result(watermark, predictor, metrics, "full", started)
+
+
+def _training_result(watermark: Tuple[int, int], predictor: CarbonFootprintPredictor,
+                     metrics: Dict, update_mode: str, started: float) -> Dict:
+    return {
+        "watermark": watermark,
+        "predictor": predictor if predictor.is_trained else None,
+        "metrics": metrics,
+        "update_mode": update_mode,
+        "started": started,
+        "finished": time.time()
+    }
+
+
+class TrainingQueue:
+    """
+    Process-pool job queue for model training
+    Jobs are coalesced per (user, scope): while one is pending, further
+    requests return the same handle. A job reads the user's history when it
+    starts, so an entry landing mid-fit can leave the published model one
+    watermark behind; the next predict request sees that and re-enqueues.
+    Exposes queue depth, latency and worker utilisation.
+    """
+    
+    def __init__(self, workers: int = TRAINING_WORKERS):
+        self.workers = workers
+        self._executor = None
+        self._lock = threading.Lock()
+        self._jobs = OrderedDict()  # job_id -> job dict
+        self._waiting = {}  # (user_id, scope, model_type) -> job_id not yet picked up
+        self._pending = 0
+        self._latencies = deque(maxlen=500)
+        self._busy_seconds = 0.0
+        self._created = time.time()
+        self.counters = {
+            "submitted": 0, "coalesced": 0, "completed": 0, "failed": 0,
+            "full_fits": 0, "incremental_updates": 0
+        }
+    
+    def _get_executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            # spawn: forking a server process with open DB connections/threads is unsafe
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context("spawn")
+            )
+        return self._executor
+    
+    def submit(self, user_id: int, scope: str = "predict", model_type: str = "ensemble") -> Dict:
+        """Enqueue a retrain for a user and return its job handle"""
+        key = (user_id, scope, model_type)
+        with self._lock:
+            job_id = self._waiting.get(key)
+            if job_id and self._jobs.get(job_id, {}).get("status") == "pending":
+                self.counters["coalesced"] += 1
+                return dict(self._jobs[job_id])
+            
+            job = {
+                "job_id": uuid.uuid4().hex,
+                "user_id": user_id,
+                "scope": scope,
+                "model_type": model_type,
+                "status": "pending",
+                "submitted_at": time.time(),
+                "finished_at": None,
+                "update_mode": None,
+                "error": None
+            }
+            self._jobs[job["job_id"]] = job
+            self._waiting[key] = job["job_id"]
+            self._pending += 1
+            self.counters["submitted"] += 1
+            while len(self._jobs) > MAX_TRACKED_JOBS:
+                self._jobs.popitem(last=False)
+        
+        if self.workers <= 0:
+            # Inline mode (TRAINING_WORKERS=0), e.g. for scripts and tests
+            try:
+                self._finish(job, result=_run_training(user_id, scope, model_type))
+            except Exception as e:
+                self._finish(job, error=e)
+        else:
+            try:
+                future = self._get_executor().submit(_run_training, user_id, scope, model_type)
+            except BrokenProcessPool:
+                # A worker died (e.g. OOM); start a fresh pool and retry once
+                self._executor = None
+                try:
+                    future = self._get_executor().submit(_run_training, user_id, scope, model_type)
+                except Exception as e:
+                    self._finish(job, error=e)
+                    return dict(job)
+            future.add_done_callback(lambda f, job=job: self._finish(
+                job, result=None if f.exception() else f.result(), error=f.exception()
+            ))
+        return dict(job)
+    
+    def _finish(self, job: Dict, result: Optional[Dict] = None, error: Optional[BaseException] = None):
+        """Publish a finished model and record timings"""
+        if result and result["predictor"] is not None:
+            try:
+                model_store.put(job["user_id"], result["watermark"], result["predictor"], job["scope"])
+            except Exception as e:
+                error = e
+        
+        now = time.time()
+        with self._lock:
+            key = (job["user_id"], job["scope"], job["model_type"])
+            if self._waiting.get(key) == job["job_id"]:
+                del self._waiting[key]
+            self._pending -= 1
+            job["finished_at"] = now
+            self._latencies.append(now - job["submitted_at"])
+            if result:
+                self._busy_seconds += result["finished"] - result["started"]
+            if error or not result or result["predictor"] is None:
+                job["status"] = "failed"
+                job["error"] = str(error) if error else (result or {}).get("metrics", {}).get("error", "Training failed")
+                self.counters["failed"] += 1
+            else:
+                job["status"] = "completed"
+                job["update_mode"] = result["update_mode"]
+                self.counters["completed"] += 1
+                self.counters["full_fits" if result["update_mode"] == "full" else "incremental_updates"] += 1
+    
+    def get_job(self, job_id: str) -> Optional[Dict]:
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return dict(job) if job else None
+    
+    def get_stats(self) -> Dict:
+        """Queue depth, job latency and worker utilisation"""
+        with self._lock:
+            latencies = sorted(self._latencies)
+            running = min(self._pending, max(self.workers, 0))
+            uptime = time.time() - self._created
+            capacity = max(self.workers, 1) * uptime
+            return {
+                "workers": self.workers,
+                "queue_depth": self._pending - running,
+                "running": running,
+                **self.counters,
+                "latency_seconds": {
+                    "mean": round(sum(latencies) / len(latencies), 3) if latencies else 0.0,
+                    "p95": round(latencies[int(0.95 * (len(latencies) - 1))], 3) if latencies else 0.0,
+                    "max": round(latencies[-1], 3) if latencies else 0.0
+                },
+                "worker_utilisation": round(self._busy_seconds / capacity, 4) if capacity > 0 else 0.0,
+                "model_store": model_store.get_stats()
+            }
+    
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+training_queue = TrainingQueue()
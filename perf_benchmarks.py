@@ -0,0 +1,570 @@
+"""
+Performance benchmarks for CarbonCALC hot paths
+Usage: python perf_benchmarks.py features [--sizes 24 1000 100000]
+       python perf_benchmarks.py forecast [--periods 12 60 120]
+       python perf_benchmarks.py db-concurrency [--modes async sync] [--concurrency 16]
+       python perf_benchmarks.py login-burst [--rounds 10 12] [--concurrency 16]
+       python perf_benchmarks.py static-assets [--concurrency 16] [--requests 25]
+       python perf_benchmarks.py json-response [--sizes 1000 10000]
+       python perf_benchmarks.py quantile-sketch [--sizes 10000 200000]
+       python perf_benchmarks.py recommendations [--sizes 1000 10000]
+"""
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+
+from ml_models.predictor import CarbonFootprintPredictor
+
+CATEGORIES = ['energy', 'transportation', 'waste', 'food', 'water', 'corporate']
+
+
+def sample_history(n_rows: int, seed: int = 42, json_breakdown: bool = True) -> list:
+    """Synthetic history shaped like the /predict input"""
+    rng = random.Random(seed)
+    start = datetime(2000, 1, 1)
+    history = []
+    for i in range(n_rows):
+        breakdown = {cat: round(rng.uniform(0, 500), 2) for cat in CATEGORIES}
+        history.append({
+            "entry_date": (start + timedelta(hours=6 * i + rng.randint(0, 5))).isoformat(),
+            "total_carbon_footprint": sum(breakdown.values()),
+            "category_breakdown": json.dumps(breakdown) if json_breakdown else breakdown
+        })
+    return history
+
+
+def legacy_prepare_features(historical_data: list) -> tuple:
+    """Row-by-row reference implementation (pre-vectorization) for comparison"""
+    if not historical_data:
+        return np.array([]), np.array([])
+    df = pd.DataFrame(historical_data)
+    df['entry_date'] = pd.to_datetime(df['entry_date'])
+    df = df.sort_values('entry_date')
+    df['days_since_start'] = (df['entry_date'] - df['entry_date'].min()).dt.days
+    df['month'] = df['entry_date'].dt.month
+    df['quarter'] = df['entry_date'].dt.quarter
+    window_size = min(3, len(df))
+    df['rolling_mean'] = df['total_carbon_footprint'].rolling(window=window_size, min_periods=1).mean()
+    df['rolling_std'] = df['total_carbon_footprint'].rolling(window=window_size, min_periods=1).std().fillna(0)
+    df['trend'] = df['total_carbon_footprint'].diff().fillna(0)
+    
+    features = []
+    targets = []
+    for i in range(len(df)):
+        row = [df.iloc[i][name] for name in
+               ['days_since_start', 'month', 'quarter', 'rolling_mean', 'rolling_std', 'trend']]
+        breakdown = df.iloc[i]['category_breakdown']
+        if isinstance(breakdown, str):
+            breakdown = json.loads(breakdown)
+        row.extend(breakdown.get(cat, 0) for cat in CATEGORIES)
+        features.append(row)
+        targets.append(df.iloc[i]['total_carbon_footprint'])
+    return np.array(features), np.array(targets)
+
+
+def timed(func, *args, repeat: int = 1) -> tuple:
+    """Best-of-N wall time in seconds and the last result"""
+    best = float("inf")
+    result = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = func(*args)
+        best = min(best, time.perf_counter() - started)
+    return best, result
+
+
+def bench_features(args):
+    """prepare_features: columnar pipeline vs the row-by-row loop"""
+    print(f"{'rows':>8} {'legacy (s)':>12} {'columnar (s)':>13} {'speedup':>9}  identical")
+    for n_rows in args.sizes:
+        history = sample_history(n_rows)
+        repeat = 5 if n_rows <= 1000 else 1
+        new_time, (X_new, y_new) = timed(CarbonFootprintPredictor().prepare_features, history, repeat=repeat)
+        if n_rows > args.legacy_max_rows:
+            print(f"{n_rows:>8} {'skipped':>12} {new_time:>13.4f} {'-':>9}  -")
+            continue
+        old_time, (X_old, y_old) = timed(legacy_prepare_features, history, repeat=repeat)
+        identical = np.array_equal(X_old, X_new) and np.array_equal(y_old, y_new)
+        print(f"{n_rows:>8} {old_time:>12.4f} {new_time:>13.4f} {old_time / new_time:>8.1f}x  {identical}")
+
+
+def legacy_forecast(predictor: CarbonFootprintPredictor, last_features: np.ndarray, forecast_periods: int) -> list:
+    """Per-period predict loop (pre-batching) for comparison"""
+    predictions = []
+    current_features = last_features.reshape(1, -1).copy()
+    for _ in range(forecast_periods):
+        current_scaled = predictor.scaler.transform(current_features)
+        pred_rf = predictor.model[0].predict(current_scaled)[0]
+        pred_gb = predictor.model[1].predict(current_scaled)[0]
+        prediction = (pred_rf + pred_gb) / 2
+        predictions.append(float(prediction))
+        current_features[0][0] += 30
+        current_features[0][1] = ((current_features[0][1] + 1) % 12) + 1
+        current_features[0][2] = ((current_features[0][2] - 1) % 4) + 1
+        current_features[0][3] = (current_features[0][3] + prediction) / 2
+    return predictions
+
+
+def bench_forecast(args):
+    """Multi-step forecast: batched lookup vs the per-period loop"""
+    history = sample_history(24)
+    predictor = CarbonFootprintPredictor(model_type="ensemble")
+    predictor.train(history)
+    X, _ = predictor.prepare_features(history)
+    
+    print(f"{'periods':>8} {'loop (ms)':>10} {'batched (ms)':>13} {'speedup':>9}  identical")
+    for periods in args.periods:
+        old_time, old = timed(legacy_forecast, predictor, X[-1], periods, repeat=3)
+        new_time, (new, _) = timed(predictor._forecast, X[-1], periods, repeat=3)
+        identical = np.allclose(old, new, rtol=1e-12)
+        print(f"{periods:>8} {old_time * 1000:>10.1f} {new_time * 1000:>13.1f} "
+              f"{old_time / new_time:>8.1f}x  {identical}")
+
+
+def percentile(values: list, q: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))] if ordered else 0.0
+
+
+def start_api_server(mode: str, workdir: str, port: int) -> subprocess.Popen:
+    """Run the app under uvicorn against a scratch SQLite database"""
+    import requests
+    env = {
+        **os.environ,
+        "DATABASE_MODE": mode,
+        "DATABASE_URL": f"sqlite:///{workdir}/bench.db",
+        "MODEL_STORE_DIR": f"{workdir}/models",
+        "TRAINING_WORKERS": "0",
+    }
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--log-level", "warning"],
+        env=env
+    )
+    for _ in range(100):
+        try:
+            requests.get(f"http://127.0.0.1:{port}/health", timeout=1)
+            return server
+        except requests.ConnectionError:
+            time.sleep(0.1)
+    server.kill()
+    raise SystemExit("API server did not start")
+
+
+def seed_api_user(base: str, entries: int) -> dict:
+    """Register a user, store `entries` entries and return auth headers"""
+    import requests
+    account = {"username": "bench", "password": "bench-password"}
+    requests.post(f"{base}/api/auth/register", json={
+        **account, "email": "bench@example.com", "full_name": "Bench", "user_type": "corporation"
+    }).raise_for_status()
+    token = requests.post(f"{base}/api/auth/login", json=account).json()["access_token"]
+    headers = {"Authorization": f"Bearer {token}"}
+    rng = random.Random(0)
+    rows = [{"electricity_usage": rng.uniform(0, 900), "vehicle_miles": rng.uniform(0, 500),
+             "employee_count": rng.randint(1, 50)} for _ in range(entries)]
+    requests.post(f"{base}/api/calculate/bulk", json=rows, headers=headers).raise_for_status()
+    return headers
+
+
+def bench_db_concurrency(args):
+    """Concurrent API load against DATABASE_MODE=async vs sync"""
+    import requests
+    paths = ["/api/entries?limit=100", "/api/recommendations", "/api/analytics/summary",
+             "/api/benchmark/compare", "/api/auth/me"]
+    print(f"{args.concurrency} clients x {args.requests} requests over {', '.join(paths)}")
+    print(f"{'mode':>6} {'req/s':>8} {'p50 (ms)':>9} {'p95 (ms)':>9} {'p99 (ms)':>9} "
+          f"{'health p50':>11} {'health p95':>11} {'errors':>7}")
+    for mode in args.modes:
+        with tempfile.TemporaryDirectory() as workdir:
+            server = start_api_server(mode, workdir, args.port)
+            try:
+                base = f"http://127.0.0.1:{args.port}"
+                headers = seed_api_user(base, args.entries)
+                latencies, health, errors = [], [], []
+                done = threading.Event()
+                
+                def client(worker: int):
+                    session = requests.Session()
+                    for i in range(args.requests):
+                        started = time.perf_counter()
+                        response = session.get(base + paths[(worker + i) % len(paths)], headers=headers)
+                        latencies.append(time.perf_counter() - started)
+                        if response.status_code != 200:
+                            errors.append(response.status_code)
+                
+                def probe():
+                    # An endpoint with no database work shows event-loop stalls
+                    session = requests.Session()
+                    while not done.is_set():
+                        started = time.perf_counter()
+                        session.get(f"{base}/health")
+                        health.append(time.perf_counter() - started)
+                        time.sleep(0.01)
+                
+                prober = threading.Thread(target=probe)
+                prober.start()
+                started = time.perf_counter()
+                with ThreadPoolExecutor(args.concurrency) as pool:
+                    list(pool.map(client, range(args.concurrency)))
+                elapsed = time.perf_counter() - started
+                done.set()
+                prober.join()
+            finally:
+                server.terminate()
+                server.wait()
+        print(f"{mode:>6} {len(latencies) / elapsed:>8.0f} {percentile(latencies, 0.5) * 1000:>9.1f} "
+              f"{percentile(latencies, 0.95) * 1000:>9.1f} {percentile(latencies, 0.99) * 1000:>9.1f} "
+              f"{percentile(health, 0.5) * 1000:>11.1f} {percentile(health, 0.95) * 1000:>11.1f} {len(errors):>7}")
+
+
+def bench_login_burst(args):
+    """Concurrent logins per bcrypt cost, with /health latency alongside"""
+    import requests
+    print(f"{args.concurrency} clients x {args.requests} logins")
+    print(f"{'rounds':>6} {'logins/s':>9} {'p50 (ms)':>9} {'p95 (ms)':>9} {'503s':>6} "
+          f"{'health p50':>11} {'health p95':>11}")
+    for rounds in args.rounds:
+        with tempfile.TemporaryDirectory() as workdir:
+            os.environ["BCRYPT_ROUNDS"] = str(rounds)
+            server = start_api_server("async", workdir, args.port)
+            try:
+                base = f"http://127.0.0.1:{args.port}"
+                seed_api_user(base, 0)
+                account = {"username": "bench", "password": "bench-password"}
+                latencies, health, rejected = [], [], []
+                done = threading.Event()
+                
+                def client(_):
+                    session = requests.Session()
+                    for _ in range(args.requests):
+                        started = time.perf_counter()
+                        response = session.post(f"{base}/api/auth/login", json=account)
+                        if response.status_code == 503:
+                            rejected.append(1)
+                        else:
+                            latencies.append(time.perf_counter() - started)
+                
+                def probe():
+                    session = requests.Session()
+                    while not done.is_set():
+                        started = time.perf_counter()
+                        session.get(f"{base}/health")
+                        health.append(time.perf_counter() - started)
+                        time.sleep(0.01)
+                
+                prober = threading.Thread(target=probe)
+                prober.start()
+                started = time.perf_counter()
+                with ThreadPoolExecutor(args.concurrency) as pool:
+                    list(pool.map(client, range(args.concurrency)))
+                elapsed = time.perf_counter() - started
+                done.set()
+                prober.join()
+            finally:
+                os.environ.pop("BCRYPT_ROUNDS", None)
+                server.terminate()
+                server.wait()
+        print(f"{rounds:>6} {len(latencies) / elapsed:>9.1f} {percentile(latencies, 0.5) * 1000:>9.1f} "
+              f"{percentile(latencies, 0.95) * 1000:>9.1f} {len(rejected):>6} "
+              f"{percentile(health, 0.5) * 1000:>11.1f} {percentile(health, 0.95) * 1000:>11.1f}")
+
+
+DASHBOARD_ASSETS = [
+    ("/", "dashboard/index.html", "text/html"),
+    ("/styles.css", "dashboard/styles.css", "text/css"),
+    ("/app.js", "dashboard/app.js", "application/javascript"),
+]
+
+
+def legacy_dashboard_app():
+    """Dashboard routes as they were before the asset cache: a disk read per request"""
+    from fastapi import FastAPI
+    from fastapi.responses import Response
+    app = FastAPI()
+    for route, path, media_type in DASHBOARD_ASSETS:
+        def serve(path=path, media_type=media_type):
+            with open(path, "r") as f:
+                return Response(content=f.read(), media_type=media_type)
+        
+        async def handler(serve=serve):
+            return serve()
+        app.add_api_route(route, handler, methods=["GET"])
+    return app
+
+
+def cached_dashboard_app():
+    from fastapi import FastAPI, Request
+    from utils.static_assets import AssetCache
+    app = FastAPI()
+    assets = AssetCache(reload=False)
+    for route, path, media_type in DASHBOARD_ASSETS:
+        assets.register(path, path, media_type)
+        
+        async def handler(request: Request, name=path):
+            return assets.response(request, name)
+        app.add_api_route(route, handler, methods=["GET"])
+    return app
+
+
+def bench_static_assets(args):
+    """Dashboard asset requests/sec: per-request disk reads vs the in-memory cache"""
+    import asyncio
+    import httpx
+    
+    async def run(app, revalidate: bool):
+        transport = httpx.ASGITransport(app=app)
+        headers = {"Accept-Encoding": "gzip, deflate, br"}
+        latencies, sizes = [], []
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            etags = {}
+            for route, _, _ in DASHBOARD_ASSETS:
+                response = await client.get(route, headers=headers)
+                etags[route] = response.headers.get("etag")
+            
+            async def worker(index: int):
+                for i in range(args.requests):
+                    route = DASHBOARD_ASSETS[(index + i) % len(DASHBOARD_ASSETS)][0]
+                    request_headers = dict(headers)
+                    if revalidate and etags[route]:
+                        request_headers["If-None-Match"] = etags[route]
+                    started = time.perf_counter()
+                    # Raw bytes as sent, before httpx decodes Content-Encoding
+                    async with client.stream("GET", route, headers=request_headers) as response:
+                        size = sum([len(chunk) async for chunk in response.aiter_raw()])
+                    latencies.append(time.perf_counter() - started)
+                    sizes.append(size)
+            
+            started = time.perf_counter()
+            await asyncio.gather(*[worker(index) for index in range(args.concurrency)])
+            elapsed = time.perf_counter() - started
+        return len(latencies) / elapsed, latencies, sum(sizes) / len(sizes)
+    
+    print(f"{args.concurrency} clients x {args.requests} requests over "
+          f"{', '.join(route for route, _, _ in DASHBOARD_ASSETS)} (in-process ASGI)")
+    print(f"{'variant':>22} {'req/s':>8} {'p50 (ms)':>9} {'p95 (ms)':>9} {'bytes/resp':>11}")
+    for label, factory, revalidate in [
+        ("disk read (before)", legacy_dashboard_app, False),
+        ("cached", cached_dashboard_app, False),
+        ("cached + If-None-Match", cached_dashboard_app, True),
+    ]:
+        rate, latencies, size = asyncio.run(run(factory(), revalidate))
+        print(f"{label:>22} {rate:>8.0f} {percentile(latencies, 0.5) * 1000:>9.2f} "
+              f"{percentile(latencies, 0.95) * 1000:>9.2f} {size:>11.0f}")
+
+
+def sample_entries_response(n_rows: int, seed: int = 42) -> list:
+    """Rows shaped like the /api/entries payload, datetimes left as objects"""
+    rng = random.Random(seed)
+    start = datetime(2000, 1, 1)
+    rows = []
+    for i in range(n_rows):
+        breakdown = {cat: round(rng.uniform(0, 500), 2) for cat in CATEGORIES}
+        entry_date = start + timedelta(hours=6 * i, microseconds=rng.randint(0, 999999))
+        rows.append({
+            "id": i + 1,
+            "total_carbon_footprint": round(sum(breakdown.values()), 2),
+            "category_breakdown": {**breakdown, "total": round(sum(breakdown.values()), 2), "per_person": rng.uniform(0, 100)},
+            "entry_date": entry_date,
+            "period_start": entry_date - timedelta(days=30),
+            "period_end": entry_date,
+            "notes": None
+        })
+    return rows
+
+
+def bench_json_response(args):
+    """GET of an entry history: FastAPI's default response path vs FastJSONResponse"""
+    import asyncio
+    from typing import List
+    import httpx
+    from fastapi import FastAPI
+    from api.responses import FastJSONResponse, dumps, orjson
+    
+    class StdlibJSONResponse(FastJSONResponse):
+        def render(self, content) -> bytes:
+            return dumps(content, "standard")
+    
+    async def fetch(app, path: str, repeat: int):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            best, body = float("inf"), None
+            for _ in range(repeat):
+                started = time.perf_counter()
+                body = (await client.get(path)).content
+                best = min(best, time.perf_counter() - started)
+        return best, body
+    
+    print(f"{'rows':>8} {'variant':>32} {'best (ms)':>10} {'speedup':>8}  identical")
+    for n_rows in args.sizes:
+        rows = sample_entries_response(n_rows)
+        # The pre-change routes built ISO strings themselves
+        legacy_rows = [{**row, **{key: row[key].isoformat() for key in ("entry_date", "period_start", "period_end")}}
+                       for row in rows]
+        app = FastAPI()
+        # response_model routes go through validation and jsonable_encoder
+        app.add_api_route("/default", lambda: legacy_rows, response_model=List[dict])
+        app.add_api_route("/class", lambda: legacy_rows, response_model=List[dict], response_class=FastJSONResponse)
+        app.add_api_route("/stdlib", lambda: StdlibJSONResponse(rows), response_model=List[dict])
+        variants = [("response_model (before)", "/default"), ("response_class=FastJSONResponse", "/class"),
+                    ("direct, stdlib encoder", "/stdlib")]
+        if orjson is not None:
+            app.add_api_route("/orjson", lambda: FastJSONResponse(rows), response_model=List[dict])
+            variants.append(("direct, orjson", "/orjson"))
+        repeat = 5 if n_rows <= 10000 else 2
+        baseline = None
+        for label, path in variants:
+            elapsed, body = asyncio.run(fetch(app, path, repeat))
+            if baseline is None:
+                baseline = (elapsed, body)
+            print(f"{n_rows:>8} {label:>32} {elapsed * 1000:>10.1f} {baseline[0] / elapsed:>7.1f}x  {body == baseline[1]}")
+
+
+def sample_footprints(distribution: str, n_values: int, seed: int = 42) -> np.ndarray:
+    """Per-person footprints with different shapes; "rounded" has heavy ties"""
+    rng = np.random.default_rng(seed)
+    if distribution == "lognormal":
+        return rng.lognormal(6, 1, n_values)
+    if distribution == "uniform":
+        return rng.uniform(0, 5000, n_values)
+    if distribution == "bimodal":
+        return np.concatenate([rng.normal(300, 50, n_values // 2), rng.normal(5000, 800, n_values - n_values // 2)])
+    return np.round(rng.lognormal(6, 1, n_values), -1)
+
+
+def bench_quantile_sketch(args):
+    """
+    Cohort t-digest: rank error against exact ranks, and query latency
+    The accuracy bound itself is asserted in tests/test_quantiles.py.
+    """
+    from utils.quantiles import QUANTILE_SKETCH_COMPRESSION, QUANTILE_SKETCH_SHARDS, TDigest
+
+    shards = max(1, QUANTILE_SKETCH_SHARDS)
+    print(f"compression {QUANTILE_SKETCH_COMPRESSION:g}, {shards} shards")
+    print(f"{'values':>8} {'distribution':>12} {'centroids':>10} {'max err':>8} {'tail err':>9} "
+          f"{'rank (us)':>10} {'quantile (us)':>14}")
+    for n_values in args.sizes:
+        for distribution in ("lognormal", "uniform", "bimodal", "rounded"):
+            values = sample_footprints(distribution, n_values)
+            # Shards are filled by separate writers, persisted, then merged on read
+            digest = TDigest()
+            for shard in range(shards):
+                part = TDigest()
+                for start in range(shard, len(values), shards * 100):
+                    part.add(values[start:start + shards * 100:shards].tolist())
+                digest.merge(TDigest.from_json(part.to_json()))
+
+            ordered = np.sort(values)
+            probes = np.quantile(values, np.linspace(0, 1, 2001))
+            exact = np.searchsorted(ordered, probes, side="right") / len(ordered)
+            estimated = np.array([digest.rank(value) for value in probes])
+            errors = np.abs(estimated - exact)
+            tails = (exact < 0.01) | (exact > 0.99)
+
+            rank_time, _ = timed(lambda: [digest.rank(value) for value in probes[:1000]], repeat=3)
+            quantile_time, _ = timed(lambda: [digest.quantile(q) for q in np.linspace(0, 1, 1000)], repeat=3)
+            print(f"{n_values:>8} {distribution:>12} {len(digest.weights):>10} {errors.max():>8.4f} "
+                  f"{errors[tails].max():>9.4f} {rank_time * 1000:>10.1f} {quantile_time * 1000:>14.1f}")
+
+
+def legacy_generate_recommendations(footprint_breakdown: dict, user_type, top_n: int = 5) -> list:
+    """Per-call copy/scale/sort implementation (pre-index) for comparison"""
+    from database.models import UserType
+    from utils.recommendations import RecommendationEngine
+
+    library = RecommendationEngine.RECOMMENDATIONS_LIBRARY
+    recommendations = []
+    sorted_categories = sorted(CATEGORIES, key=lambda x: footprint_breakdown.get(x, 0), reverse=True)
+    for category in sorted_categories[:3]:
+        for rec in library.get(category, [])[:2]:
+            rec_copy = rec.copy()
+            rec_copy["category"] = category
+            if user_type == UserType.CORPORATION:
+                rec_copy["estimated_reduction"] *= 10
+            elif user_type == UserType.INSTITUTION:
+                rec_copy["estimated_reduction"] *= 5
+            recommendations.append(rec_copy)
+    if user_type in [UserType.CORPORATION, UserType.INSTITUTION]:
+        for rec in library["corporate"][:3]:
+            rec_copy = rec.copy()
+            rec_copy["category"] = "corporate"
+            if user_type == UserType.CORPORATION:
+                rec_copy["estimated_reduction"] *= 2
+            recommendations.append(rec_copy)
+    recommendations.sort(key=lambda x: (x["impact_rating"], x["estimated_reduction"]), reverse=True)
+    for i, rec in enumerate(recommendations[:top_n]):
+        rec["priority"] = top_n - i
+    for rec in recommendations[:top_n]:
+        total = footprint_breakdown.get("total", 1)
+        percentage = (footprint_breakdown.get(rec["category"], 0) / total * 100) if total > 0 else 0
+        rec["context"] = RecommendationEngine.FEEDBACK_TEMPLATES[rec["category"]].format(percentage=percentage)
+    return recommendations[:top_n]
+
+
+def bench_recommendations(args):
+    """Recommendation generation: per-call sort vs the ranked index, and batch mode"""
+    from database.models import UserType
+    from utils.carbon_calculator import CarbonCalculator
+    from utils.recommendations import RecommendationEngine
+
+    print(f"{'rows':>8} {'user type':>12} {'legacy (ms)':>12} {'indexed (ms)':>13} {'batch (ms)':>11} "
+          f"{'batch, no context':>18} {'speedup':>8}  identical")
+    for n_rows in args.sizes:
+        rng = np.random.default_rng(n_rows)
+        # Coarse inputs so categories tie often, which exercises ordering
+        inputs = {field: rng.integers(0, 4, n_rows) * 100.0 for field in CarbonCalculator.BATCH_FIELDS}
+        inputs["employee_count"] = rng.integers(1, 50, n_rows)
+        for user_type in (UserType.INDIVIDUAL, UserType.INSTITUTION, UserType.CORPORATION):
+            batch = CarbonCalculator.calculate_batch(inputs, user_type=user_type.value)
+            breakdowns = CarbonCalculator.batch_to_breakdowns(batch)
+            repeat = 3 if n_rows <= 10000 else 1
+            old_time, old = timed(lambda: [legacy_generate_recommendations(b, user_type) for b in breakdowns], repeat=repeat)
+            new_time, new = timed(lambda: [RecommendationEngine.generate_recommendations(b, user_type) for b in breakdowns],
+                                  repeat=repeat)
+            batch_time, batched = timed(RecommendationEngine.generate_recommendations_batch, batch, user_type, repeat=repeat)
+            bare_time, bare = timed(lambda: RecommendationEngine.generate_recommendations_batch(batch, user_type, context=False),
+                                    repeat=repeat)
+            identical = old == new == batched and bare == [
+                [{key: value for key, value in rec.items() if key != "context"} for rec in recs] for recs in old
+            ]
+            print(f"{n_rows:>8} {user_type.value:>12} {old_time * 1000:>12.1f} {new_time * 1000:>13.1f} "
+                  f"{batch_time * 1000:>11.1f} {bare_time * 1000:>18.1f} {old_time / bare_time:>7.1f}x  {identical}")
+
+
+BENCHMARKS = {
+    "features": bench_features,
+    "forecast": bench_forecast,
+    "db-concurrency": bench_db_concurrency,
+    "login-burst": bench_login_burst,
+    "static-assets": bench_static_assets,
+    "json-response": bench_json_response,
+    "quantile-sketch": bench_quantile_sketch,
+    "recommendations": bench_recommendations,
+}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="CarbonCALC performance benchmarks")
+    parser.add_argument("benchmark", choices=sorted(BENCHMARKS))
+    parser.add_argument("--sizes", type=int, nargs="+", default=[24, 1000, 100000])
+    parser.add_argument("--periods", type=int, nargs="+", default=[12, 60, 120])
+    parser.add_argument("--legacy-max-rows", type=int, default=100000,
+                        help="Skip the slow reference implementation above this many rows")
+    parser.add_argument("--modes", nargs="+", default=["async", "sync"], choices=["async", "sync"])
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--requests", type=int, default=25, help="Requests per client")
+    parser.add_argument("--entries", type=int, default=200, help="Entries seeded for the benchmark user")
+    parser.add_argument("--rounds", type=int, nargs="+", default=[10, 12], help="bcrypt costs for login-burst")
+    parser.add_argument("--port", type=int, default=8765)
+    args = parser.parse_args()
+    BENCHMARKS[args.benchmark](args)
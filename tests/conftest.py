@@ -0,0 +1,6 @@
+import os
+import sys
+
+# Tests import the app's top-level packages (ml_models, utils, ...) and the
+# reference implementations in perf_benchmarks.py
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,50 @@
+"""
+CarbonFootprintPredictor.prepare_features must build exactly the matrix the
+row-by-row implementation did (perf_benchmarks.legacy_prepare_features)
+"""
+import json
+import random
+
+import numpy as np
+import pytest
+
+from ml_models.predictor import CarbonFootprintPredictor
+from perf_benchmarks import legacy_prepare_features, sample_history
+
+
+def assert_identical(history):
+    X_new, y_new = CarbonFootprintPredictor().prepare_features(history)
+    X_old, y_old = legacy_prepare_features(history)
+    assert X_new.shape == X_old.shape
+    assert np.array_equal(X_new, X_old)
+    assert np.array_equal(y_new, y_old)
+
+
+@pytest.mark.parametrize("n_rows", [1, 2, 3, 24, 1000])
+@pytest.mark.parametrize("json_breakdown", [True, False])
+def test_matches_legacy(n_rows, json_breakdown):
+    assert_identical(sample_history(n_rows, json_breakdown=json_breakdown))
+
+
+def test_empty_history():
+    X, y = CarbonFootprintPredictor().prepare_features([])
+    assert X.size == 0 and y.size == 0
+    assert_identical([])
+
+
+@pytest.mark.parametrize("seed", [0, 1, 2])
+def test_unsorted_dates(seed):
+    history = sample_history(200, seed=seed)
+    random.Random(seed).shuffle(history)
+    assert_identical(history)
+
+
+def test_missing_categories():
+    history = sample_history(30)
+    for i, entry in enumerate(history):
+        breakdown = json.loads(entry["category_breakdown"])
+        for category in list(breakdown)[: i % 4]:
+            del breakdown[category]
+        # Mix JSON strings and dicts, as stored rows and API input do
+        entry["category_breakdown"] = breakdown if i % 2 else json.dumps(breakdown)
+    assert_identical(history)
@@ -0,0 +1,91 @@
+"""
+TDigest rank accuracy against exact ranks from np.searchsorted on the raw
+values, for single, sharded-and-merged and JSON round-tripped digests
+"""
+import math
+
+import numpy as np
+import pytest
+
+from perf_benchmarks import sample_footprints
+from utils.quantiles import TDigest
+
+
+COMPRESSION = 200
+# A k1 centroid holds at most ~pi/compression of the mass; interpolating
+# between two such neighbours bounds the error on continuous data
+BOUND = 2 * math.pi / COMPRESSION
+DISTRIBUTIONS = ["lognormal", "uniform", "bimodal"]
+
+
+def rank_errors(digest, values):
+    ordered = np.sort(values)
+    probes = np.quantile(values, np.linspace(0, 1, 2001))
+    exact = np.searchsorted(ordered, probes, side="right") / len(ordered)
+    estimated = np.array([digest.rank(value) for value in probes])
+    return np.abs(estimated - exact)
+
+
+def sharded_digest(values, shards, round_trip):
+    """Shards filled by separate writers in small batches, then merged as on read"""
+    digest = TDigest(COMPRESSION)
+    for shard in range(shards):
+        part = TDigest(COMPRESSION)
+        for start in range(shard, len(values), shards * 100):
+            part.add(values[start:start + shards * 100:shards].tolist())
+        digest.merge(TDigest.from_json(part.to_json()) if round_trip else part)
+    return digest
+
+
+@pytest.mark.parametrize("n_values", [1000, 50000])
+@pytest.mark.parametrize("distribution", DISTRIBUTIONS)
+def test_single_digest_within_bound(distribution, n_values):
+    values = sample_footprints(distribution, n_values)
+    digest = TDigest(COMPRESSION)
+    digest.add(values.tolist())
+    assert rank_errors(digest, values).max() <= BOUND
+
+
+@pytest.mark.parametrize("round_trip", [False, True])
+@pytest.mark.parametrize("distribution", DISTRIBUTIONS)
+def test_merged_shards_within_bound(distribution, round_trip):
+    values = sample_footprints(distribution, 50000)
+    digest = sharded_digest(values, shards=4, round_trip=round_trip)
+    assert digest.count == len(values)
+    assert rank_errors(digest, values).max() <= BOUND
+
+
+@pytest.mark.parametrize("distribution", DISTRIBUTIONS)
+def test_json_round_trip_preserves_ranks(distribution):
+    values = sample_footprints(distribution, 20000)
+    digest = TDigest(COMPRESSION)
+    # Leave values in the buffer as well as in centroids
+    digest.add(values[:-50].tolist())
+    digest.compress()
+    digest.add(values[-50:].tolist())
+    restored = TDigest.from_json(digest.to_json())
+    probes = np.quantile(values, np.linspace(0, 1, 501))
+    assert restored.count == digest.count == len(values)
+    assert [restored.rank(value) for value in probes] == [digest.rank(value) for value in probes]
+    assert rank_errors(restored, values).max() <= BOUND
+
+
+def test_quantile_inverts_rank():
+    values = sample_footprints("lognormal", 50000)
+    digest = sharded_digest(values, shards=4, round_trip=True)
+    ordered = np.sort(values)
+    for q in np.linspace(0.01, 0.99, 99):
+        exact = np.searchsorted(ordered, digest.quantile(q), side="right") / len(ordered)
+        assert abs(exact - q) <= BOUND
+
+
+def test_extremes_and_empty():
+    assert math.isnan(TDigest(COMPRESSION).rank(1.0))
+    assert math.isnan(TDigest.from_json(None).quantile(0.5))
+    values = sample_footprints("uniform", 1000)
+    digest = TDigest(COMPRESSION)
+    digest.add(values.tolist())
+    assert digest.rank(values.min() - 1) == 0.0
+    assert digest.rank(values.max()) == 1.0
+    assert digest.quantile(0) == values.min()
+    assert digest.quantile(1) == values.max()
@@ -0,0 +1,77 @@
+"""
+Train and version the fleet-wide forecasting model
+Usage: python train_global_model.py train [--model-type ensemble] [--recent 24]
+       python train_global_model.py list
+       python train_global_model.py activate VERSION
+"""
+import argparse
+
+from database.database import init_db, SessionLocal
+from ml_models.predictor import GlobalCarbonFootprintPredictor
+from ml_models.global_model import (
+    iter_user_histories,
+    save_global_model,
+    list_versions,
+    current_version,
+    activate_version,
+    GLOBAL_MODEL_DIR
+)
+
+
+def train(args):
+    """Fit on all users' histories and save a new version"""
+    init_db()
+    db = SessionLocal()
+    try:
+        predictor = GlobalCarbonFootprintPredictor(model_type=args.model_type)
+        metrics = predictor.train_global(iter_user_histories(db, recent=args.recent))
+    finally:
+        db.close()
+    
+    if "error" in metrics:
+        raise SystemExit(f"Training failed: {metrics['error']}")
+    
+    version = save_global_model(predictor, args.directory, activate=not args.no_activate)
+    print(f"Trained global model v{version} on {metrics['users']} users "
+          f"({metrics['training_samples']} train / {metrics['test_samples']} test rows)")
+    print(f"  mae={metrics['mae']:.2f} rmse={metrics['rmse']:.2f} r2={metrics['r2_score']:.3f}")
+    print("  activated" if not args.no_activate else "  saved (not activated)")
+
+
+def show_versions(args):
+    """List saved versions, marking the active one"""
+    active = current_version(args.directory)
+    versions = list_versions(args.directory)
+    if not versions:
+        print("No global models saved")
+    for version in versions:
+        print(f"v{version}{' (active)' if version == active else ''}")
+
+
+def activate(args):
+    """Serve a previously saved version"""
+    activate_version(args.version, args.directory)
+    print(f"Activated global model v{args.version}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fleet-wide forecasting model")
+    parser.add_argument("--directory", default=GLOBAL_MODEL_DIR)
+    commands = parser.add_subparsers(dest="command", required=True)
+    
+    train_parser = commands.add_parser("train")
+    train_parser.add_argument("--model-type", default="ensemble",
+                              choices=["ensemble", "random_forest", "gradient_boosting", "linear"])
+    train_parser.add_argument("--recent", type=int, default=None,
+                              help="Only use each user's latest N entries")
+    train_parser.add_argument("--no-activate", action="store_true")
+    train_parser.set_defaults(func=train)
+    
+    commands.add_parser("list").set_defaults(func=show_versions)
+    
+    activate_parser = commands.add_parser("activate")
+    activate_parser.add_argument("version", type=int)
+    activate_parser.set_defaults(func=activate)
+    
+    args = parser.parse_args()
+    args.func(args)
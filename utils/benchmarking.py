@@ -2,10 +2,149 @@
 Comparative Benchmarking and Industry Analysis
 Research-grade comparison against industry standards and peers
 """
-from typing import Dict, List, Optional
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
 from database.models import IndustryBenchmark, UserType
-from sqlalchemy.orm import Session
-import statistics
+from sqlalchemy import event
+from sqlalchemy.orm import Session, object_session
+import numpy as np
+import os
+import threading
+import time
+
+
+# Safety net for benchmark rows written outside this process's ORM sessions
+BENCHMARK_STATS_TTL = float(os.getenv("BENCHMARK_STATS_TTL", "600"))
+
+
+@dataclass(frozen=True, eq=False)
+class BenchmarkStatistics:
+    """Per-person footprint distribution of one benchmark cohort"""
+    values: np.ndarray  # sorted ascending
+    mean: float
+    median: float
+    std_dev: float
+    min: float
+    max: float
+    percentile_25: float
+    percentile_75: float
+
+    @classmethod
+    def from_values(cls, values: List[float]) -> Optional["BenchmarkStatistics"]:
+        values = np.sort(np.asarray([v for v in values if v is not None], dtype=float))
+        if not len(values):
+            return None
+        percentile_25, median, percentile_75 = np.percentile(values, [25, 50, 75])
+        return cls(
+            values=values,
+            mean=float(values.mean()),
+            median=float(median),
+            std_dev=float(values.std(ddof=1)) if len(values) > 1 else 0,
+            min=float(values[0]),
+            max=float(values[-1]),
+            percentile_25=float(percentile_25),
+            percentile_75=float(percentile_75)
+        )
+
+    @property
+    def sample_size(self) -> int:
+        return len(self.values)
+
+    def percentile_rank(self, value: float) -> float:
+        """Percentage of benchmarks at or below `value` (binary search)"""
+        return float(np.searchsorted(self.values, value, side="right")) / len(self.values) * 100
+
+
+class BenchmarkStatsCache:
+    """
+    Statistics for every (user_type, industry_type) cohort, plus
+    (user_type, None) across industries, built from one read of the
+    benchmark table. Committed ORM changes to IndustryBenchmark rebuild it
+    on next use.
+    """
+
+    def __init__(self, ttl: float = BENCHMARK_STATS_TTL):
+        self.ttl = ttl
+        self._cohorts: Optional[Dict[Tuple[UserType, Optional[str]], BenchmarkStatistics]] = None
+        self._built_at = 0.0
+        self._generation = 0
+        self._lock = threading.Lock()
+        self.counters = {"hits": 0, "builds": 0, "invalidations": 0}
+
+    def get(self, db: Session, user_type: UserType, industry_type: Optional[str] = None) -> Optional[BenchmarkStatistics]:
+        with self._lock:
+            cohorts = self._cohorts
+            if cohorts is not None and (self.ttl <= 0 or time.time() - self._built_at < self.ttl):
+                self.counters["hits"] += 1
+                return cohorts.get((user_type, industry_type))
+            generation = self._generation
+        
+        cohorts = self._build(db)
+        with self._lock:
+            self.counters["builds"] += 1
+            # Don't keep a snapshot read before a concurrent invalidation
+            if generation == self._generation:
+                self._cohorts = cohorts
+                self._built_at = time.time()
+        return cohorts.get((user_type, industry_type))
+
+    @staticmethod
+    def _build(db: Session) -> Dict[Tuple[UserType, Optional[str]], BenchmarkStatistics]:
+        grouped: Dict[Tuple[UserType, Optional[str]], List[float]] = {}
+        rows = db.query(
+            IndustryBenchmark.user_type,
+            IndustryBenchmark.industry_type,
+            IndustryBenchmark.average_carbon_per_person
+        ).all()
+        for user_type, industry_type, per_person in rows:
+            grouped.setdefault((user_type, industry_type), []).append(per_person)
+            grouped.setdefault((user_type, None), []).append(per_person)
+        cohorts = {key: BenchmarkStatistics.from_values(values) for key, values in grouped.items()}
+        return {key: stats for key, stats in cohorts.items() if stats is not None}
+
+    def invalidate(self):
+        with self._lock:
+            self._generation += 1
+            self._cohorts = None
+            self.counters["invalidations"] += 1
+
+    def get_stats(self) -> Dict:
+        with self._lock:
+            cohorts = self._cohorts or {}
+            return {
+                "ttl_seconds": self.ttl,
+                "built": self._cohorts is not None,
+                "age_seconds": round(time.time() - self._built_at, 1) if self._cohorts is not None else None,
+                "cohorts": len(cohorts),
+                **self.counters
+            }
+
+
+benchmark_stats_cache = BenchmarkStatsCache()
+
+_CHANGED_KEY = "industry_benchmarks_changed"
+
+
+@event.listens_for(IndustryBenchmark, "after_insert")
+@event.listens_for(IndustryBenchmark, "after_update")
+@event.listens_for(IndustryBenchmark, "after_delete")
+def _mark_benchmarks_changed(mapper, connection, target):
+    session = object_session(target)
+    if session is not None:
+        session.info[_CHANGED_KEY] = True
+    else:
+        benchmark_stats_cache.invalidate()
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_benchmark_stats(session):
+    if session.info.pop(_CHANGED_KEY, False):
+        benchmark_stats_cache.invalidate()
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_benchmark_changes(session):
+    session.info.pop(_CHANGED_KEY, None)
 
 
 class BenchmarkAnalyzer:
@@ -23,36 +162,18 @@ class BenchmarkAnalyzer:
         Compare user's footprint against industry benchmarks
         Returns comprehensive comparison metrics
         """
-        # Get relevant benchmarks
-        query = db.query(IndustryBenchmark).filter(
-            IndustryBenchmark.user_type == user_type
-        )
-        
-        if industry_type:
-            query = query.filter(IndustryBenchmark.industry_type == industry_type)
+        benchmark = benchmark_stats_cache.get(db, user_type, industry_type)
         
-        benchmarks = query.all()
-        
-        if not benchmarks:
+        if benchmark is None:
             return {"error": "No benchmarks available for comparison"}
         
         # Calculate per-person footprint
         per_person_footprint = user_footprint / employee_count if employee_count > 0 else user_footprint
         
-        # Aggregate benchmark statistics
-        benchmark_per_person = [b.average_carbon_per_person for b in benchmarks]
-        benchmark_totals = [b.average_carbon_total for b in benchmarks]
-        
-        avg_benchmark_per_person = statistics.mean(benchmark_per_person)
-        median_benchmark_per_person = statistics.median(benchmark_per_person)
-        
-        # Calculate percentiles
-        benchmark_per_person_sorted = sorted(benchmark_per_person)
-        if len(benchmark_per_person_sorted) > 0:
-            percentile_25 = benchmark_per_person_sorted[len(benchmark_per_person_sorted) // 4]
-            percentile_75 = benchmark_per_person_sorted[3 * len(benchmark_per_person_sorted) // 4]
-        else:
-            percentile_25 = percentile_75 = avg_benchmark_per_person
+        avg_benchmark_per_person = benchmark.mean
+        median_benchmark_per_person = benchmark.median
+        percentile_25 = benchmark.percentile_25
+        percentile_75 = benchmark.percentile_75
         
         # Comparison metrics
         deviation_from_mean = per_person_footprint - avg_benchmark_per_person
@@ -89,13 +210,14 @@ class BenchmarkAnalyzer:
                 "median_per_person": round(median_benchmark_per_person, 2),
                 "percentile_25": round(percentile_25, 2),
                 "percentile_75": round(percentile_75, 2),
-                "sample_size": len(benchmarks)
+                "sample_size": benchmark.sample_size
             },
             "comparison": {
                 "deviation_kg_co2": round(deviation_from_mean, 2),
                 "percentage_deviation": round(percentage_deviation, 2),
                 "performance_rating": performance_rating,
                 "performance_score": performance_score,
+                "percentile_rank": round(benchmark.percentile_rank(per_person_footprint), 2),
                 "comparison_status": "better" if deviation_from_mean < 0 else "worse" if deviation_from_mean > 0 else "equal"
             },
             "improvement_potential": {
@@ -104,46 +226,32 @@ class BenchmarkAnalyzer:
                 "reduction_percentage": round((improvement_potential / user_footprint * 100) if user_footprint > 0 else 0, 2)
             },
             "research_metrics": {
-                "benchmark_coverage": len(benchmarks),
-                "statistical_significance": "high" if len(benchmarks) >= 10 else "moderate" if len(benchmarks) >= 5 else "low",
+                "benchmark_coverage": benchmark.sample_size,
+                "statistical_significance": "high" if benchmark.sample_size >= 10 else "moderate" if benchmark.sample_size >= 5 else "low",
                 "comparison_methodology": "industry_standard_percentile_analysis"
             }
         }
     
     @staticmethod
-    def generate_comparative_report(
-        user_entries: List[Dict],
-        benchmarks: List[IndustryBenchmark],
+    def compare_statistics(
+        user_stats: Dict,
+        benchmark: Optional[BenchmarkStatistics],
         user_type: UserType
     ) -> Dict:
         """
-        Generate comprehensive comparative research report
+        Build the comparative report from precomputed user statistics
+        (mean, median, std_dev, min, max, sample_size) and a benchmark cohort
         """
-        if not user_entries:
-            return {"error": "No user data available"}
-        
-        # Calculate user statistics
-        footprints = [e.get('total_carbon_footprint', 0) for e in user_entries]
-        
-        user_stats = {
-            "mean": statistics.mean(footprints),
-            "median": statistics.median(footprints),
-            "std_dev": statistics.stdev(footprints) if len(footprints) > 1 else 0,
-            "min": min(footprints),
-            "max": max(footprints),
-            "sample_size": len(footprints)
-        }
-        
-        # Benchmark statistics
-        benchmark_footprints = [b.average_carbon_per_person for b in benchmarks]
+        if benchmark is None:
+            return {"error": "No benchmarks available for comparison"}
         
         benchmark_stats = {
-            "mean": statistics.mean(benchmark_footprints),
-            "median": statistics.median(benchmark_footprints),
-            "std_dev": statistics.stdev(benchmark_footprints) if len(benchmark_footprints) > 1 else 0,
-            "min": min(benchmark_footprints),
-            "max": max(benchmark_footprints),
-            "sample_size": len(benchmark_footprints)
+            "mean": benchmark.mean,
+            "median": benchmark.median,
+            "std_dev": benchmark.std_dev,
+            "min": benchmark.min,
+            "max": benchmark.max,
+            "sample_size": benchmark.sample_size
         }
         
         # Statistical comparison
@@ -158,9 +266,9 @@ class BenchmarkAnalyzer:
                 "user_vs_benchmark": "higher" if effect_size > 0 else "lower" if effect_size < 0 else "equivalent"
             },
             "research_quality": {
-                "user_sample_size": len(footprints),
-                "benchmark_sample_size": len(benchmarks),
-                "comparison_validity": "high" if len(footprints) >= 5 and len(benchmarks) >= 5 else "moderate"
+                "user_sample_size": user_stats["sample_size"],
+                "benchmark_sample_size": benchmark.sample_size,
+                "comparison_validity": "high" if user_stats["sample_size"] >= 5 and benchmark.sample_size >= 5 else "moderate"
             }
         }
 
@@ -2,8 +2,9 @@
 Carbon Footprint Calculation Engine
 Calculates CO2 equivalent emissions based on various inputs
 """
-from typing import Dict, Any
+from typing import Dict, Any, Mapping, Optional, Union
 import json
+import numpy as np
 
 
 class CarbonCalculator:
@@ -46,6 +47,18 @@ class CarbonCalculator:
         "employee_commute": 2.0,  # per employee per day
     }
     
+    CATEGORIES = ["energy", "transportation", "waste", "food", "water", "corporate"]
+    
+    # Input columns accepted by calculate_batch (CarbonEntryInput field names)
+    BATCH_FIELDS = [
+        "electricity_usage", "gas_usage", "heating_oil",
+        "vehicle_miles", "public_transport_km", "flights_km",
+        "waste_produced", "recycling_rate",
+        "meat_consumption", "vegetarian_meals",
+        "water_usage",
+        "employee_count", "office_space_sqm", "manufacturing_output", "supply_chain_distance",
+    ]
+    
     @staticmethod
     def calculate_energy_emissions(electricity: float, gas: float, heating_oil: float) -> float:
         """Calculate emissions from energy consumption"""
@@ -188,4 +201,158 @@ class CarbonCalculator:
         }
         
         return breakdown
+    
+    @staticmethod
+    def _factor_matrix():
+        """
+        Build the emission-factor matrix used by calculate_batch
+        Rows are the (derived) activity columns, columns are CATEGORIES.
+        Row order within a category follows the scalar helpers so the
+        accumulation order - and therefore every rounding step - is identical.
+        """
+        factors = CarbonCalculator.EMISSION_FACTORS
+        avg_meat_emission = (
+            factors["meat_beef"] * 0.3 +
+            factors["meat_pork"] * 0.3 +
+            factors["meat_chicken"] * 0.4
+        )
+        rows = [
+            ("electricity_usage", "energy", factors["electricity_grid"]),
+            ("gas_usage", "energy", factors["natural_gas"]),
+            ("heating_oil", "energy", factors["heating_oil"]),
+            ("vehicle_miles", "transportation", factors["car_gasoline"]),
+            ("public_transport_km", "transportation", factors["public_transport"]),
+            ("flights_km", "transportation", factors["flight_domestic"]),
+            ("recycled_waste", "waste", factors["waste_recycled"]),
+            ("landfill_waste", "waste", factors["waste_landfill"]),
+            ("meat_consumption", "food", avg_meat_emission),
+            ("vegetarian_meals", "food", factors["vegetarian_meal"]),
+            ("water_usage", "water", factors["water_usage"]),
+            ("office_space_sqm", "corporate", factors["office_space"]),
+            # employee_count * 2.0 * 250 == employee_count * 500 exactly (2.0 is a power of two)
+            ("employee_count", "corporate", factors["employee_commute"] * 250),
+            ("manufacturing_output", "corporate", 1000.0),
+            ("supply_chain_distance", "corporate", 0.15),
+        ]
+        columns = [name for name, _, _ in rows]
+        matrix = np.zeros((len(rows), len(CarbonCalculator.CATEGORIES)))
+        for i, (_, category, factor) in enumerate(rows):
+            matrix[i, CarbonCalculator.CATEGORIES.index(category)] = factor
+        return columns, matrix
+    
+    @staticmethod
+    def calculate_batch(
+        data: Union[Mapping[str, Any], Any],
+        user_type: Optional[Any] = None
+    ) -> Dict[str, np.ndarray]:
+        """
+        Vectorized counterpart of calculate_total_footprint
+        Accepts a pandas DataFrame or a mapping of equal-length arrays keyed by
+        CarbonEntryInput field names (missing columns default like the scalar path).
+        user_type may be a single value or a per-row array; if omitted a
+        "user_type" column is used when present, else "individual".
+        Returns a dict with the same keys as the scalar breakdown, each an array,
+        matching calculate_total_footprint exactly (rounding included).
+        """
+        present = [name for name in CarbonCalculator.BATCH_FIELDS if name in data]
+        if not present:
+            raise ValueError("calculate_batch requires at least one CarbonEntryInput column")
+        n_rows = len(np.asarray(data[present[0]]))
+        
+        def column(name: str, default: float) -> np.ndarray:
+            if name in data:
+                return np.asarray(data[name], dtype=np.float64)
+            return np.full(n_rows, default, dtype=np.float64)
+        
+        inputs = {name: column(name, 1.0 if name == "employee_count" else 0.0)
+                  for name in CarbonCalculator.BATCH_FIELDS}
+        
+        # Waste is not linear in its inputs; derive the recycled/landfill masses first
+        waste_produced = inputs["waste_produced"]
+        recycling_rate = inputs["recycling_rate"]
+        inputs["recycled_waste"] = waste_produced * (recycling_rate / 100)
+        inputs["landfill_waste"] = waste_produced * (1 - recycling_rate / 100)
+        
+        columns, matrix = _FACTOR_COLUMNS, _FACTOR_MATRIX
+        activity = np.column_stack([inputs[name] for name in columns])
+        
+        # activity @ matrix, accumulated term by term in scalar order. A BLAS
+        # matmul may reorder the sums or fuse multiply-adds, which changes the
+        # last bit and can flip a round-half-even decision.
+        emissions = np.zeros((n_rows, matrix.shape[1]))
+        for j in range(matrix.shape[1]):
+            rows = np.flatnonzero(matrix[:, j])
+            acc = activity[:, rows[0]] * matrix[rows[0], j]
+            for i in rows[1:]:
+                acc = acc + activity[:, i] * matrix[i, j]
+            emissions[:, j] = acc
+        
+        if user_type is None:
+            user_type = data["user_type"] if "user_type" in data else "individual"
+        user_types = np.atleast_1d(np.asarray(user_type, dtype=object))
+        user_types = np.array([getattr(t, "value", t) for t in user_types], dtype=object)
+        is_organization = np.isin(user_types, ["corporation", "institution"])
+        corporate_index = CarbonCalculator.CATEGORIES.index("corporate")
+        emissions[:, corporate_index] = np.where(
+            is_organization, emissions[:, corporate_index], 0.0
+        )
+        
+        total = emissions[:, 0]
+        for j in range(1, emissions.shape[1]):
+            total = total + emissions[:, j]
+        
+        employee_count = inputs["employee_count"]
+        has_employees = employee_count > 0
+        per_person = np.where(
+            has_employees,
+            total / np.where(has_employees, employee_count, 1.0),
+            total
+        )
+        
+        breakdown = {
+            category: _round2(emissions[:, j])
+            for j, category in enumerate(CarbonCalculator.CATEGORIES)
+        }
+        breakdown["total"] = _round2(total)
+        breakdown["per_person"] = _round2(per_person)
+        return breakdown
+    
+    @staticmethod
+    def batch_to_breakdowns(batch: Dict[str, np.ndarray]) -> list:
+        """Convert a calculate_batch result into per-row breakdown dicts"""
+        keys = list(batch.keys())
+        rows = np.column_stack([batch[k] for k in keys]).tolist()
+        return [dict(zip(keys, row)) for row in rows]
+
+
+def _round2(values: np.ndarray) -> np.ndarray:
+    """
+    Elementwise equivalent of Python's round(x, 2)
+    np.round scales by 100 in floating point and disagrees with the builtin on
+    values like 1.005. Here x * 100 is computed exactly as p + e (Dekker's
+    two-product) so ties and half-even are decided on the true binary value.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    magnitude = np.abs(values)
+    # Beyond this, k / 100 is no longer exact in a double; defer to the builtin
+    fallback = ~np.isfinite(values) | (magnitude >= 2.0 ** 52 / 100)
+    x = np.where(fallback, 0.0, magnitude)
+    
+    p = x * 100.0
+    split = 134217729.0 * x  # 2**27 + 1
+    hi = split - (split - x)
+    lo = x - hi
+    e = (hi * 100.0 - p) + lo * 100.0
+    
+    k = np.floor(p)
+    distance = (p - (k + 0.5)) + e
+    is_odd = np.fmod(k, 2.0) == 1.0
+    round_up = (distance > 0) | ((distance == 0) & is_odd)
+    rounded = np.copysign((k + round_up) / 100.0, values)
+    
+    if fallback.any():
+        rounded[fallback] = [round(float(v), 2) for v in values[fallback]]
+    return rounded
+
 
+_FACTOR_COLUMNS, _FACTOR_MATRIX = CarbonCalculator._factor_matrix()
@@ -0,0 +1,181 @@
+"""
+Streaming CSV/Parquet Import for Historical Carbon Entries
+Reads exports in fixed-size chunks so memory stays bounded regardless of file size
+"""
+from typing import Dict, Any, Iterator, Optional, Callable, Union, IO
+import logging
+import time
+
+import numpy as np
+import pandas as pd
+from sqlalchemy.orm import Session
+
+from database.models import User
+from utils.carbon_calculator import CarbonCalculator
+from utils.ingestion import write_entries_chunk, DEFAULT_CHUNK_SIZE
+
+
+DATE_FIELDS = ["entry_date", "period_start", "period_end"]
+MAX_REPORTED_ERRORS = 100
+
+logger = logging.getLogger(__name__)
+
+
+def detect_format(filename: str) -> str:
+    """Infer 'csv' or 'parquet' from a file name"""
+    name = filename.lower()
+    if name.endswith((".parquet", ".pq")):
+        return "parquet"
+    if name.endswith((".csv", ".csv.gz", ".txt")):
+        return "csv"
+    raise ValueError(f"Cannot infer import format from '{filename}'; use csv or parquet")
+
+
+def detect_compression(filename: str) -> Optional[str]:
+    """CSV compression for a file name; streams carry no name for pandas to infer it from"""
+    return "gzip" if filename.lower().endswith(".gz") else None
+
+
+def iter_chunks(
+    source: Union[str, IO],
+    file_format: str,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    compression: Optional[str] = "infer"
+) -> Iterator[pd.DataFrame]:
+    """
+    Yield the source file as DataFrames of at most chunk_size rows
+    compression applies to CSV; "infer" only works when source is a path.
+    """
+    if file_format == "csv":
+        with pd.read_csv(source, chunksize=chunk_size, compression=compression) as reader:
+            for chunk in reader:
+                yield chunk
+    elif file_format == "parquet":
+        try:
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise ImportError("Parquet import requires pyarrow (pip install pyarrow)")
+        parquet_file = pq.ParquetFile(source)
+        for batch in parquet_file.iter_batches(batch_size=chunk_size):
+            yield batch.to_pandas()
+    else:
+        raise ValueError(f"Unsupported import format: {file_format}")
+
+
+def normalize_chunk(
+    df: pd.DataFrame,
+    column_map: Optional[Dict[str, str]] = None
+) -> tuple:
+    """
+    Map file columns onto CarbonEntry fields and coerce types
+    Returns (rows, errors) where rows are dicts for write_entries_chunk and
+    errors are (row_offset, message) pairs for values that could not be parsed.
+    Empty cells fall back to the CarbonEntryInput defaults.
+    """
+    if column_map:
+        df = df.rename(columns=column_map)
+    
+    n_rows = len(df)
+    invalid = np.zeros(n_rows, dtype=bool)
+    reasons = [[] for _ in range(n_rows)]
+    columns = {}
+    
+    for field in CarbonCalculator.BATCH_FIELDS:
+        if field not in df.columns:
+            continue
+        raw = df[field]
+        values = pd.to_numeric(raw, errors="coerce")
+        bad = (values.isna() & raw.notna()).to_numpy()
+        for offset in np.flatnonzero(bad):
+            reasons[offset].append(f"{field}: not a number ({raw.iloc[offset]!r})")
+        invalid |= bad
+        default = 1 if field == "employee_count" else 0
+        values = values.fillna(default)
+        columns[field] = values.astype(int) if field == "employee_count" else values.astype(float)
+    
+    for field in DATE_FIELDS:
+        if field not in df.columns:
+            continue
+        raw = df[field]
+        values = pd.to_datetime(raw, errors="coerce", utc=True)
+        bad = (values.isna() & raw.notna()).to_numpy()
+        for offset in np.flatnonzero(bad):
+            reasons[offset].append(f"{field}: not a date ({raw.iloc[offset]!r})")
+        invalid |= bad
+        columns[field] = values.dt.tz_convert(None).astype(object).where(values.notna(), None)
+    
+    if "notes" in df.columns:
+        columns["notes"] = df["notes"].astype(object).where(df["notes"].notna(), None)
+    
+    if not columns:
+        return [], [(offset, "No recognised CarbonEntry columns") for offset in range(n_rows)]
+    
+    records = pd.DataFrame(columns).to_dict("records")
+    rows = []
+    errors = []
+    for offset, record in enumerate(records):
+        if invalid[offset]:
+            errors.append((offset, "; ".join(reasons[offset])))
+            continue
+        for field in DATE_FIELDS:
+            if field in record and record[field] is not None:
+                record[field] = record[field].to_pydatetime()
+        rows.append(record)
+    return rows, errors
+
+
+def import_entries(
+    db: Session,
+    user: User,
+    source: Union[str, IO],
+    file_format: str,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    column_map: Optional[Dict[str, str]] = None,
+    progress: Optional[Callable[[Dict[str, Any]], None]] = None,
+    compression: Optional[str] = "infer"
+) -> Dict[str, Any]:
+    """
+    Stream a CSV/Parquet file into CarbonEntry rows for one user
+    Each chunk is normalized, calculated in one vectorized pass and written in
+    its own transaction. progress, if given, is called after every chunk with
+    the running totals. compression is passed to the CSV reader; give it
+    explicitly for file objects (see detect_compression).
+    """
+    stats = {
+        "rows": 0,
+        "inserted": 0,
+        "failed": 0,
+        "chunks": 0,
+        "elapsed_seconds": 0.0,
+        "rows_per_second": 0.0,
+        "errors": []
+    }
+    started = time.perf_counter()
+    
+    for chunk in iter_chunks(source, file_format, chunk_size, compression):
+        base = stats["rows"]
+        rows, errors = normalize_chunk(chunk, column_map)
+        try:
+            entry_ids = write_entries_chunk(db, user, rows)
+        except Exception:
+            # Driver errors carry the SQL and parameters; keep them in the server log
+            logger.exception("Import chunk %d write failed", stats["chunks"])
+            entry_ids = []
+            errors.append((0, f"Chunk {stats['chunks']} write failed"))
+            stats["failed"] += len(rows)
+        
+        stats["rows"] += len(chunk)
+        stats["inserted"] += len(entry_ids)
+        stats["failed"] += len(chunk) - len(rows)
+        stats["chunks"] += 1
+        for offset, message in errors:
+            if len(stats["errors"]) < MAX_REPORTED_ERRORS:
+                stats["errors"].append({"row": base + offset, "error": message})
+        
+        elapsed = time.perf_counter() - started
+        stats["elapsed_seconds"] = round(elapsed, 3)
+        stats["rows_per_second"] = round(stats["rows"] / elapsed, 1) if elapsed > 0 else 0.0
+        if progress:
+            progress(stats)
+    
+    return stats
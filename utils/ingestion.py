@@ -0,0 +1,137 @@
+"""
+Bulk Carbon Entry Ingestion
+Calculates and writes many carbon entries per transaction
+"""
+from typing import Dict, Iterable, List, Any, Tuple
+from datetime import datetime, timedelta
+import json
+
+from sqlalchemy import func, insert
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session
+
+from database.models import User, CarbonEntry, Recommendation, breakdown_to_columns
+from utils.carbon_calculator import CarbonCalculator
+from utils.recommendations import RecommendationEngine
+from utils.rollups import apply_entries
+from utils.quantiles import record_footprints
+from utils.organizations import record_organization_entries
+
+
+DEFAULT_CHUNK_SIZE = 500
+
+
+def write_entries_chunk(db: Session, user: User, rows: List[Dict[str, Any]]) -> List[int]:
+    """
+    Calculate footprints for a chunk of validated entry dicts and persist them
+    Entries are written with one bulk INSERT and their recommendations are
+    upserted into the user's recommendation state, in a single transaction
+    together with the user's analytics rollup, cohort sketches and
+    organization totals. Rows may carry an entry_date for historical imports.
+    Returns the new entry ids in input order.
+    """
+    if not rows:
+        return []
+    
+    batch = CarbonCalculator.calculate_batch(
+        {field: [row.get(field, 0) for row in rows] for field in CarbonCalculator.BATCH_FIELDS},
+        user_type=user.user_type.value
+    )
+    breakdowns = CarbonCalculator.batch_to_breakdowns(batch)
+    
+    now = datetime.utcnow()
+    entry_rows = []
+    for row, breakdown in zip(rows, breakdowns):
+        entry_rows.append({
+            **{field: row.get(field, 1 if field == "employee_count" else 0)
+               for field in CarbonCalculator.BATCH_FIELDS},
+            **breakdown_to_columns(breakdown),
+            "category_breakdown": json.dumps(breakdown),
+            "user_id": user.id,
+            "period_start": row.get("period_start") or now - timedelta(days=30),
+            "period_end": row.get("period_end") or now,
+            "entry_date": row.get("entry_date") or now,
+            "notes": row.get("notes"),
+        })
+    
+    try:
+        entry_ids = list(db.scalars(
+            insert(CarbonEntry).returning(CarbonEntry.id, sort_by_parameter_order=True),
+            entry_rows
+        ))
+        
+        per_entry = RecommendationEngine.generate_recommendations_batch(batch, user.user_type, context=False)
+        save_recommendations(db, user.id, zip(entry_ids, per_entry))
+        
+        apply_entries(db, user.id, [
+            {**row, "id": entry_id} for entry_id, row in zip(entry_ids, entry_rows)
+        ])
+        record_footprints(db, user, [row["per_person_footprint"] for row in entry_rows])
+        record_organization_entries(db, user.id, entry_rows)
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    
+    return entry_ids
+
+
+def _recommendation_row(user_id: int, entry_id: int, rec: Dict[str, Any]) -> Dict[str, Any]:
+    """Map a generated recommendation onto Recommendation columns"""
+    return {
+        "user_id": user_id,
+        "carbon_entry_id": entry_id,
+        "category": rec.get("category", "general"),
+        "title": rec.get("title", ""),
+        "description": rec.get("description", ""),
+        "impact_rating": rec.get("impact_rating", 0),
+        "difficulty": rec.get("difficulty", "easy"),
+        "estimated_reduction": rec.get("estimated_reduction", 0),
+        "cost_estimate": rec.get("cost_estimate", "N/A"),
+        "priority": rec.get("priority", 0),
+    }
+
+
+# Columns refreshed when a recommendation is produced again
+REFRESHED_FIELDS = [
+    "carbon_entry_id", "description", "impact_rating", "difficulty", "estimated_reduction", "cost_estimate", "priority"
+]
+
+
+def _recommendation_upsert(insert_factory):
+    # Set explicitly: columns added by migrate_columns() carry no server default
+    statement = insert_factory(Recommendation.__table__).values(last_recommended_at=func.now())
+    return statement.on_conflict_do_update(
+        index_elements=["user_id", "category", "title"],
+        set_={field: getattr(statement.excluded, field) for field in REFRESHED_FIELDS} | {"last_recommended_at": func.now()}
+    )
+
+
+RECOMMENDATION_UPSERTS = {
+    "sqlite": _recommendation_upsert(sqlite_insert),
+    "postgresql": _recommendation_upsert(postgresql_insert),
+}
+
+
+def save_recommendations(db: Session, user_id: int, entry_recommendations: Iterable[Tuple[int, List[Dict[str, Any]]]]):
+    """
+    Upsert generated recommendations, given as (entry id, recommendations)
+    in write order, into the user's recommendation state. One row is kept
+    per (category, title), holding the values from its latest entry (and
+    that entry's highest-ranked copy); is_implemented is left untouched.
+    Runs inside the caller's transaction.
+    """
+    dialect = db.get_bind().dialect.name
+    if dialect not in RECOMMENDATION_UPSERTS:
+        raise ValueError(f"Recommendation upserts are not supported on {dialect}")
+    # One row per key, so a multi-row upsert never touches a row twice
+    latest = {}
+    for entry_id, recs in entry_recommendations:
+        ranked = {}
+        for rec in recs:
+            row = _recommendation_row(user_id, entry_id, rec)
+            ranked.setdefault((row["category"], row["title"]), row)
+        latest.update(ranked)
+    if latest:
+        db.execute(RECOMMENDATION_UPSERTS[dialect], list(latest.values()))
@@ -0,0 +1,292 @@
+"""
+Organization Roll-ups
+Organization/site hierarchy with per-node footprint totals by period and
+category. Each new entry is added to its site and every ancestor, so any
+node's total for a period is a single primary-key read.
+"""
+from datetime import datetime, timezone
+from typing import Dict, Any, Iterable, List, Optional, Tuple
+
+from sqlalchemy import func, insert, select
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session
+
+from database.models import (
+    User, CarbonEntry, Organization, OrganizationInvite, OrganizationTotal, BREAKDOWN_COLUMNS
+)
+from utils.timeseries import BUCKET_EXPRESSIONS, CATEGORIES
+
+
+ORG_BUCKETS = ("month", "quarter", "year")
+# Summed columns, named as on CarbonEntry
+TOTAL_COLUMNS = ["total_carbon_footprint"] + [BREAKDOWN_COLUMNS[key] for key in CATEGORIES]
+
+# (bucket, period_start) -> [entry count, *TOTAL_COLUMNS sums]
+Deltas = Dict[Tuple[str, str], List[float]]
+
+
+def ancestor_ids(path: str) -> List[int]:
+    """Node ids from the root down to (and including) the node itself"""
+    return [int(part) for part in path.strip("/").split("/") if part]
+
+
+def month_start(entry_date: datetime) -> str:
+    if entry_date.tzinfo is not None:
+        entry_date = entry_date.astimezone(timezone.utc)
+    return f"{entry_date.year:04d}-{entry_date.month:02d}-01"
+
+
+def period_starts(month: str) -> Dict[str, str]:
+    """First day of the month, quarter and year containing a YYYY-MM-01 month"""
+    year, number = int(month[:4]), int(month[5:7])
+    return {
+        "month": month,
+        "quarter": f"{year:04d}-{(number - 1) // 3 * 3 + 1:02d}-01",
+        "year": f"{year:04d}-01-01"
+    }
+
+
+def _add_month(deltas: Deltas, month: str, values: Iterable[float]):
+    values = list(values)
+    for bucket, start in period_starts(month).items():
+        current = deltas.setdefault((bucket, start), [0.0] * len(values))
+        for i, value in enumerate(values):
+            current[i] += value or 0.0
+
+
+def entry_deltas(entries: Iterable[Dict[str, Any]]) -> Deltas:
+    """Per-period sums of entry dicts carrying entry_date and the footprint columns"""
+    deltas: Deltas = {}
+    for entry in entries:
+        if entry.get("entry_date") is None:
+            continue
+        _add_month(deltas, month_start(entry["entry_date"]), [1] + [entry.get(column) for column in TOTAL_COLUMNS])
+    return deltas
+
+
+def _monthly_sums(db: Session, key_column, *filters):
+    """Entry count and footprint sums per (key_column, month), grouped in SQL"""
+    dialect = db.get_bind().dialect.name
+    if dialect not in BUCKET_EXPRESSIONS:
+        raise ValueError(f"Time buckets are not supported on {dialect}")
+    month = BUCKET_EXPRESSIONS[dialect](CarbonEntry.entry_date, "month").label("month_start")
+    return select(
+        key_column,
+        month,
+        func.count(CarbonEntry.id),
+        *[func.sum(getattr(CarbonEntry, column)) for column in TOTAL_COLUMNS]
+    ).join(User, User.id == CarbonEntry.user_id).where(
+        CarbonEntry.entry_date.is_not(None), *filters
+    ).group_by(key_column, month)
+
+
+def user_deltas(db: Session, user_id: int) -> Deltas:
+    """Per-period sums over all of a user's entries"""
+    deltas: Deltas = {}
+    for _, month, *values in db.execute(_monthly_sums(db, User.id, User.id == user_id)):
+        _add_month(deltas, month, values)
+    return deltas
+
+
+def _upsert(insert_factory):
+    """INSERT ... ON CONFLICT DO UPDATE adding the incoming counts and sums in place"""
+    statement = insert_factory(OrganizationTotal.__table__)
+    return statement.on_conflict_do_update(
+        index_elements=["organization_id", "bucket", "period_start"],
+        set_={
+            column: getattr(OrganizationTotal.__table__.c, column) + getattr(statement.excluded, column)
+            for column in ["entry_count"] + TOTAL_COLUMNS
+        } | {"updated_at": func.now()}
+    )
+
+
+# Built once; each write is a single executemany
+UPSERTS = {
+    "sqlite": _upsert(sqlite_insert),
+    "postgresql": _upsert(postgresql_insert),
+}
+
+
+def _apply(db: Session, node_ids: List[int], deltas: Deltas, sign: int = 1):
+    """Add (or subtract) deltas to each node's totals, creating missing period rows"""
+    dialect = db.get_bind().dialect.name
+    if dialect not in UPSERTS:
+        raise ValueError(f"Organization totals are not supported on {dialect}")
+    # A fixed row order keeps concurrent writers from deadlocking on shared ancestors
+    records = [
+        {
+            "organization_id": node_id,
+            "bucket": bucket,
+            "period_start": period_start,
+            "entry_count": sign * int(values[0]),
+            **{column: sign * value for column, value in zip(TOTAL_COLUMNS, values[1:])}
+        }
+        for node_id in node_ids
+        for (bucket, period_start), values in sorted(deltas.items())
+    ]
+    if records:
+        db.execute(UPSERTS[dialect], records)
+
+
+def record_organization_entries(db: Session, user_id: int, entries: List[Dict[str, Any]]):
+    """
+    Add new entries to the totals of the user's site and all its ancestors
+    inside the caller's transaction. Users outside any organization are
+    skipped.
+    """
+    path = db.scalar(select(Organization.path).join(
+        User, User.organization_id == Organization.id
+    ).where(User.id == user_id))
+    if path is None:
+        return
+    deltas = entry_deltas(entries)
+    if deltas:
+        _apply(db, ancestor_ids(path), deltas)
+
+
+def create_organization(db: Session, name: str, parent: Optional[Organization] = None) -> Organization:
+    """Add a root organization, or a site under `parent`. Flushes but does not commit."""
+    node = Organization(name=name, parent_id=parent.id if parent else None)
+    db.add(node)
+    db.flush()
+    node.path = f"{parent.path if parent else '/'}{node.id}/"
+    db.flush()
+    return node
+
+
+def assign_user(db: Session, user: User, organization: Optional[Organization]):
+    """
+    Move a user to another node (or out of the hierarchy), carrying the totals
+    of their existing entries from the old ancestors to the new ones. Flushes
+    but does not commit.
+    """
+    old_path = db.scalar(select(Organization.path).where(Organization.id == user.organization_id)) \
+        if user.organization_id else None
+    old_ids = ancestor_ids(old_path) if old_path else []
+    new_ids = ancestor_ids(organization.path) if organization else []
+    leaving = [node_id for node_id in old_ids if node_id not in new_ids]
+    joining = [node_id for node_id in new_ids if node_id not in old_ids]
+    if leaving or joining:
+        deltas = user_deltas(db, user.id)
+        _apply(db, leaving, deltas, sign=-1)
+        _apply(db, joining, deltas)
+    user.organization_id = organization.id if organization else None
+    db.flush()
+
+
+def invite_user(db: Session, organization: Organization, user: User,
+                invited_by: Optional[int] = None) -> OrganizationInvite:
+    """Record (or return the existing) pending invite. Flushes but does not commit."""
+    invite = db.scalar(select(OrganizationInvite).where(
+        OrganizationInvite.user_id == user.id,
+        OrganizationInvite.organization_id == organization.id
+    ))
+    if invite is None:
+        invite = OrganizationInvite(organization_id=organization.id, user_id=user.id, invited_by=invited_by)
+        db.add(invite)
+        db.flush()
+    return invite
+
+
+def accept_invite(db: Session, invite: OrganizationInvite, user: User) -> Organization:
+    """Move the invited user to the node and drop the invite. Flushes but does not commit."""
+    organization = db.get(Organization, invite.organization_id)
+    assign_user(db, user, organization)
+    db.delete(invite)
+    db.flush()
+    return organization
+
+
+def in_subtree(node: Organization, root: Optional[Organization]) -> bool:
+    return root is not None and node.path.startswith(root.path)
+
+
+def _total_dict(row: Optional[OrganizationTotal], period_start: str) -> Dict[str, Any]:
+    return {
+        "period_start": period_start,
+        "entries": row.entry_count if row else 0,
+        "total": round(row.total_carbon_footprint or 0, 2) if row else 0,
+        "categories": {
+            key: round(getattr(row, BREAKDOWN_COLUMNS[key]) or 0, 2) if row else 0 for key in CATEGORIES
+        }
+    }
+
+
+def organization_totals(db: Session, organization_id: int, bucket: str,
+                        start: Optional[datetime] = None, end: Optional[datetime] = None,
+                        period: Optional[datetime] = None) -> List[Dict[str, Any]]:
+    """
+    Subtree totals per period, read from OrganizationTotal. `period` selects
+    the one period containing that date (a primary-key lookup); otherwise
+    periods starting in [start, end) are returned in order.
+    """
+    if bucket not in ORG_BUCKETS:
+        raise ValueError(f"Unknown bucket: {bucket}")
+    if period is not None:
+        period_start = period_starts(month_start(period))[bucket]
+        row = db.get(OrganizationTotal, (organization_id, bucket, period_start))
+        return [_total_dict(row, period_start)]
+
+    query = db.query(OrganizationTotal).filter(
+        OrganizationTotal.organization_id == organization_id,
+        OrganizationTotal.bucket == bucket
+    )
+    if start:
+        query = query.filter(OrganizationTotal.period_start >= start.date().isoformat())
+    if end:
+        query = query.filter(OrganizationTotal.period_start < end.date().isoformat())
+    return [_total_dict(row, row.period_start) for row in query.order_by(OrganizationTotal.period_start)]
+
+
+def organizations_from_names(db: Session) -> int:
+    """
+    Invite users outside the hierarchy to a root organization named after
+    their free-text organization_name, creating roots as needed. The name is
+    self-declared, so nobody joins until they accept. Returns the number of
+    users invited.
+    """
+    roots = {node.name: node for node in db.query(Organization).filter(Organization.parent_id.is_(None))}
+    users = db.query(User).filter(
+        User.organization_id.is_(None), User.organization_name.is_not(None), User.organization_name != ""
+    ).all()
+    for user in users:
+        root = roots.get(user.organization_name)
+        if root is None:
+            root = roots[user.organization_name] = create_organization(db, user.organization_name)
+        invite_user(db, root, user)
+    db.commit()
+    return len(users)
+
+
+def rebuild_organization_totals(db: Session) -> int:
+    """
+    Recompute every node's totals from carbon_entries (one grouped query)
+    and replace OrganizationTotal in one commit. Returns the rows written.
+    """
+    paths = dict(db.query(Organization.id, Organization.path))
+    totals: Dict[int, Deltas] = {}
+    rows = db.execute(_monthly_sums(db, User.organization_id, User.organization_id.is_not(None)))
+    for organization_id, month, *values in rows:
+        path = paths.get(organization_id)
+        if path is None:
+            continue
+        for node_id in ancestor_ids(path):
+            _add_month(totals.setdefault(node_id, {}), month, values)
+
+    db.query(OrganizationTotal).delete()
+    records = [
+        {
+            "organization_id": node_id,
+            "bucket": bucket,
+            "period_start": period_start,
+            "entry_count": int(values[0]),
+            **dict(zip(TOTAL_COLUMNS, values[1:]))
+        }
+        for node_id, deltas in totals.items()
+        for (bucket, period_start), values in deltas.items()
+    ]
+    if records:
+        db.execute(insert(OrganizationTotal), records)
+    db.commit()
+    return len(records)
@@ -0,0 +1,293 @@
+"""
+Population Quantile Sketches
+Mergeable t-digests of per-person footprints for each user cohort, updated
+as entries are written and queried for percentile ranks and quartiles
+"""
+from typing import Dict, Any, Iterable, List, Optional, Tuple
+import json
+import math
+import os
+import threading
+import time
+
+import numpy as np
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from database.models import User, CarbonEntry, CohortSketch, UserType
+
+
+QUANTILE_SKETCH_COMPRESSION = float(os.getenv("QUANTILE_SKETCH_COMPRESSION", "200"))
+# Shard rows per cohort; writers lock only their own shard
+QUANTILE_SKETCH_SHARDS = int(os.getenv("QUANTILE_SKETCH_SHARDS", "4"))
+# How long a merged cohort sketch is served before the shards are re-read
+QUANTILE_SKETCH_TTL = float(os.getenv("QUANTILE_SKETCH_TTL", "30"))
+
+ALL_INDUSTRIES = ""
+
+
+class TDigest:
+    """
+    Merging t-digest (Dunning & Ertl). Values are buffered and folded into
+    weighted centroids whose size is bounded by the k1 scale function, so
+    centroids stay small near the tails where rank error matters most.
+    Digests merge by pooling centroids, which is what lets cohort shards be
+    written independently and combined on read.
+    """
+
+    def __init__(self, compression: float = QUANTILE_SKETCH_COMPRESSION):
+        self.compression = compression
+        self.means = np.empty(0)
+        self.weights = np.empty(0)
+        self.min = math.inf
+        self.max = -math.inf
+        self._buffer: List[float] = []
+        self._values: Optional[np.ndarray] = None
+        self._positions: Optional[np.ndarray] = None
+
+    @property
+    def count(self) -> float:
+        return float(self.weights.sum()) + len(self._buffer)
+
+    def add(self, values: Iterable[float]):
+        values = [float(v) for v in values if v is not None and math.isfinite(v)]
+        if not values:
+            return
+        self._buffer.extend(values)
+        self.min = min(self.min, min(values))
+        self.max = max(self.max, max(values))
+        self._positions = None
+        if len(self._buffer) >= 5 * self.compression:
+            self.compress()
+
+    def merge(self, other: "TDigest"):
+        if not other.count:
+            return
+        self.means = np.concatenate([self.means, other.means])
+        self.weights = np.concatenate([self.weights, other.weights])
+        self._buffer.extend(other._buffer)
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        self._positions = None
+        self.compress()
+
+    def _k_inverse(self, k: float) -> float:
+        # Inverse of k1(q) = compression / (2 pi) * asin(2q - 1)
+        k = min(max(k, -self.compression / 4), self.compression / 4)
+        return (math.sin(k * 2 * math.pi / self.compression) + 1) / 2
+
+    def compress(self):
+        means = np.concatenate([self.means, np.asarray(self._buffer, dtype=float)])
+        weights = np.concatenate([self.weights, np.ones(len(self._buffer))])
+        self._buffer = []
+        self._positions = None
+        if not len(means):
+            return
+        order = np.argsort(means, kind="mergesort")
+        means, weights = means[order].tolist(), weights[order].tolist()
+        total = sum(weights)
+
+        merged_means, merged_weights = [], []
+        current_mean, current_weight = means[0], weights[0]
+        cumulative = 0.0
+        # A centroid may grow until it spans one unit of k
+        limit = self._k_inverse(-self.compression / 4 + 1) * total
+        for mean, weight in zip(means[1:], weights[1:]):
+            if cumulative + current_weight + weight <= limit:
+                current_weight += weight
+                current_mean += (mean - current_mean) * weight / current_weight
+            else:
+                merged_means.append(current_mean)
+                merged_weights.append(current_weight)
+                cumulative += current_weight
+                q = min(cumulative / total, 1.0)
+                limit = self._k_inverse(self.compression / (2 * math.pi) * math.asin(2 * q - 1) + 1) * total
+                current_mean, current_weight = mean, weight
+        merged_means.append(current_mean)
+        merged_weights.append(current_weight)
+        self.means = np.asarray(merged_means)
+        self.weights = np.asarray(merged_weights)
+
+    def _prepare(self) -> Tuple[np.ndarray, np.ndarray]:
+        """(value, rank position) knots from min through each centroid to max"""
+        if self._buffer:
+            self.compress()
+        if self._positions is None:
+            centres = np.cumsum(self.weights) - self.weights / 2
+            self._positions = np.concatenate([[0.0], centres, [self.weights.sum()]])
+            self._values = np.concatenate([[self.min], self.means, [self.max]])
+        return self._values, self._positions
+
+    def rank(self, value: float) -> float:
+        """Estimated fraction of values at or below `value`"""
+        if not self.count:
+            return math.nan
+        if value < self.min:
+            return 0.0
+        if value >= self.max:
+            return 1.0
+        values, positions = self._prepare()
+        i = int(np.searchsorted(values, value, side="right"))
+        span = values[i] - values[i - 1]
+        position = positions[i - 1] + (positions[i] - positions[i - 1]) * ((value - values[i - 1]) / span if span else 0)
+        return float(position / positions[-1])
+
+    def quantile(self, q: float) -> float:
+        """Estimated value at rank fraction `q`"""
+        if not self.count:
+            return math.nan
+        values, positions = self._prepare()
+        target = min(max(q, 0.0), 1.0) * positions[-1]
+        i = min(max(int(np.searchsorted(positions, target, side="left")), 1), len(positions) - 1)
+        span = positions[i] - positions[i - 1]
+        return float(values[i - 1] + (values[i] - values[i - 1]) * ((target - positions[i - 1]) / span if span else 0))
+
+    def to_json(self) -> str:
+        return json.dumps({
+            "compression": self.compression,
+            "min": self.min if self.count else None,
+            "max": self.max if self.count else None,
+            "means": self.means.tolist(),
+            "weights": self.weights.tolist(),
+            "buffer": self._buffer
+        })
+
+    @classmethod
+    def from_json(cls, data: Optional[str]) -> "TDigest":
+        state = json.loads(data or "{}")
+        digest = cls(state.get("compression", QUANTILE_SKETCH_COMPRESSION))
+        if state.get("weights"):
+            digest.means = np.asarray(state["means"], dtype=float)
+            digest.weights = np.asarray(state["weights"], dtype=float)
+        digest._buffer = list(state.get("buffer", []))
+        if state.get("min") is not None:
+            digest.min, digest.max = state["min"], state["max"]
+        return digest
+
+
+def cohort_keys(user_type: UserType, industry_type: Optional[str]) -> List[Tuple[UserType, str]]:
+    """Cohorts a user's entries count towards: their industry and all industries"""
+    keys = [(user_type, ALL_INDUSTRIES)]
+    if industry_type:
+        keys.append((user_type, industry_type))
+    return keys
+
+
+def _locked_shard(db: Session, user_type: UserType, industry_type: str, shard: int) -> CohortSketch:
+    query = db.query(CohortSketch).filter(
+        CohortSketch.user_type == user_type,
+        CohortSketch.industry_type == industry_type,
+        CohortSketch.shard == shard
+    ).with_for_update()
+    row = query.first()
+    if row is None:
+        try:
+            # Another writer may create the same shard concurrently
+            with db.begin_nested():
+                row = CohortSketch(user_type=user_type, industry_type=industry_type, shard=shard,
+                                   value_count=0, digest=TDigest().to_json())
+                db.add(row)
+        except IntegrityError:
+            row = query.first()
+    return row
+
+
+def record_footprints(db: Session, user, per_person_values: List[float]):
+    """
+    Add new entries' per-person footprints to the user's cohort sketches
+    inside the caller's transaction. `user` is a User or UserPrincipal.
+    """
+    values = [value for value in per_person_values if value is not None]
+    if not values:
+        return
+    shard = user.id % max(1, QUANTILE_SKETCH_SHARDS)
+    for user_type, industry_type in cohort_keys(user.user_type, getattr(user, "industry_type", None)):
+        row = _locked_shard(db, user_type, industry_type, shard)
+        digest = TDigest.from_json(row.digest)
+        digest.add(values)
+        row.digest = digest.to_json()
+        row.value_count = (row.value_count or 0) + len(values)
+    db.flush()
+
+
+def rebuild_sketches(db: Session, batch_size: int = 10000) -> Dict[Tuple[UserType, str], int]:
+    """
+    Recompute every cohort sketch from carbon_entries (streamed in batches)
+    and replace the stored shards in one commit. Returns values per cohort.
+    """
+    shards = max(1, QUANTILE_SKETCH_SHARDS)
+    digests: Dict[Tuple[UserType, str, int], TDigest] = {}
+    rows = db.query(
+        User.id, User.user_type, User.industry_type, CarbonEntry.per_person_footprint
+    ).join(CarbonEntry, CarbonEntry.user_id == User.id).filter(
+        CarbonEntry.per_person_footprint.is_not(None)
+    ).yield_per(batch_size)
+    for user_id, user_type, industry_type, per_person in rows:
+        for key in cohort_keys(user_type, industry_type):
+            digest = digests.get((*key, user_id % shards))
+            if digest is None:
+                digest = digests[(*key, user_id % shards)] = TDigest()
+            digest.add([per_person])
+
+    db.query(CohortSketch).delete()
+    counts: Dict[Tuple[UserType, str], int] = {}
+    for (user_type, industry_type, shard), digest in digests.items():
+        digest.compress()
+        db.add(CohortSketch(user_type=user_type, industry_type=industry_type, shard=shard,
+                            value_count=int(digest.count), digest=digest.to_json()))
+        counts[(user_type, industry_type)] = counts.get((user_type, industry_type), 0) + int(digest.count)
+    db.commit()
+    sketch_cache.clear()
+    return counts
+
+
+class CohortSketchCache:
+    """Merged, query-ready cohort digests, re-read from the shards after QUANTILE_SKETCH_TTL"""
+
+    def __init__(self, ttl: float = QUANTILE_SKETCH_TTL):
+        self.ttl = ttl
+        self._digests: Dict[Tuple[UserType, str], Tuple[TDigest, float]] = {}
+        self._lock = threading.Lock()
+
+    def get(self, db: Session, user_type: UserType, industry_type: str = ALL_INDUSTRIES) -> TDigest:
+        key = (user_type, industry_type)
+        with self._lock:
+            cached = self._digests.get(key)
+        if cached is not None and time.time() - cached[1] < self.ttl:
+            return cached[0]
+
+        merged = TDigest()
+        for (digest,) in db.query(CohortSketch.digest).filter(
+            CohortSketch.user_type == user_type,
+            CohortSketch.industry_type == industry_type
+        ):
+            merged.merge(TDigest.from_json(digest))
+        merged._prepare()
+        with self._lock:
+            self._digests[key] = (merged, time.time())
+        return merged
+
+    def clear(self):
+        with self._lock:
+            self._digests.clear()
+
+
+sketch_cache = CohortSketchCache()
+
+
+def population_rank(db: Session, user_type: UserType, industry_type: Optional[str], value: float) -> Dict[str, Any]:
+    """Where `value` falls in the cohort's per-person footprint distribution"""
+    digest = sketch_cache.get(db, user_type, industry_type or ALL_INDUSTRIES)
+    if not digest.count:
+        return {"error": "No population data for this cohort"}
+    return {
+        "sample_size": int(digest.count),
+        "percentile_rank": round(digest.rank(value) * 100, 2),
+        "quartiles": {
+            "percentile_25": round(digest.quantile(0.25), 2),
+            "median": round(digest.quantile(0.5), 2),
+            "percentile_75": round(digest.quantile(0.75), 2)
+        },
+        "min": round(digest.min, 2),
+        "max": round(digest.max, 2)
+    }
@@ -2,7 +2,13 @@
 Biosafety and Sustainability Recommendation Engine
 Generates personalized recommendations based on carbon footprint analysis
 """
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Iterable, Mapping, Tuple
+from itertools import islice
+from operator import itemgetter
+import heapq
+
+import numpy as np
+
 from database.models import UserType
 
 
@@ -138,6 +144,71 @@ class RecommendationEngine:
         ]
     }
     
+    CATEGORIES = ["energy", "transportation", "waste", "food", "water", "corporate"]
+    TOP_CATEGORIES = 3  # highest-emitting categories considered
+    PER_CATEGORY = 2  # library entries taken from each
+    CORPORATE_EXTRAS = 3  # corporate entries added for organizations
+    
+    # Reduction multipliers by user type (others keep library values)
+    CATEGORY_SCALE = {UserType.CORPORATION: 10, UserType.INSTITUTION: 5}
+    CORPORATE_SCALE = {UserType.CORPORATION: 2, UserType.INSTITUTION: 1}
+    
+    FEEDBACK_TEMPLATES = {
+        "energy": "Energy use constitutes {percentage:.1f}% of emissions. "
+                  "Optimizing thermal systems and transitioning to renewables is critical for biosafety and carbon reduction.",
+        "transportation": "Logistics account for {percentage:.1f}% of impact. "
+                          "Electrifying fleets reduces particulate matter, directly improving local biosafety.",
+        "waste": "Waste generation is {percentage:.1f}% of your footprint. "
+                 "Proper neutralization of hazardous waste is a key biosafety requirement.",
+        "food": "Food sourcing contributes {percentage:.1f}%. "
+                "Sustainable sourcing ensures biological safety and reduces supply chain emissions.",
+        "water": "Water usage is {percentage:.1f}%. "
+                 "Treating effluent prevents biological contamination of local water bodies.",
+        "corporate": "Operational protocols contribute significantly. "
+                     "Standardizing biosafety management systems (ISO 14001) is recommended.",
+        "general": "Mitigation strategies should prioritize high-impact areas to ensure maximum biosafety and environmental protection."
+    }
+    
+    # Built from RECOMMENDATIONS_LIBRARY by _compile_index() at import:
+    # (category, user_type) -> [(rank key, template)], and user_type -> the
+    # corporate extras, each with scaled reductions and ranked best first
+    _INDEX: Dict[Tuple[str, UserType], List[Tuple[Tuple, Dict[str, Any]]]] = {}
+    _EXTRAS: Dict[UserType, List[Tuple[Tuple, Dict[str, Any]]]] = {}
+    
+    @classmethod
+    def _compile_index(cls):
+        def ranked(recs: List[Dict[str, Any]], category: str, scale: int) -> List[Tuple[Tuple, Dict[str, Any]]]:
+            templates = []
+            for rec in recs:
+                template = {**rec, "category": category}
+                template["estimated_reduction"] = rec["estimated_reduction"] * scale
+                templates.append(template)
+            # Stable, so equal keys keep library order
+            templates.sort(key=lambda t: (t["impact_rating"], t["estimated_reduction"]), reverse=True)
+            return [((t["impact_rating"], t["estimated_reduction"]), t) for t in templates]
+        
+        for user_type in UserType:
+            for category in cls.CATEGORIES:
+                recs = cls.RECOMMENDATIONS_LIBRARY.get(category, [])[:cls.PER_CATEGORY]
+                cls._INDEX[(category, user_type)] = ranked(recs, category, cls.CATEGORY_SCALE.get(user_type, 1))
+            extras = cls.RECOMMENDATIONS_LIBRARY["corporate"][:cls.CORPORATE_EXTRAS] if user_type in cls.CORPORATE_SCALE else []
+            cls._EXTRAS[user_type] = ranked(extras, "corporate", cls.CORPORATE_SCALE.get(user_type, 1))
+    
+    @staticmethod
+    def _select(top_categories: Iterable[str], user_type: UserType, top_n: int) -> List[Dict[str, Any]]:
+        """
+        Top-n templates across the ranked lists of the given categories plus
+        the user type's extras. heapq.merge is stable, so ties resolve in
+        category order with extras last. users.user_type is nullable; a
+        missing or unknown type is ranked as an individual, as before.
+        """
+        if user_type not in RecommendationEngine._EXTRAS:
+            user_type = UserType.INDIVIDUAL
+        sources = [RecommendationEngine._INDEX[(category, user_type)] for category in top_categories]
+        sources.append(RecommendationEngine._EXTRAS[user_type])
+        merged = heapq.merge(*sources, key=itemgetter(0), reverse=True)
+        return [template for _, template in islice(merged, top_n)]
+    
     @staticmethod
     def generate_recommendations(
         footprint_breakdown: Dict[str, float],
@@ -147,67 +218,70 @@ class RecommendationEngine:
         """
         Generate personalized biosafety and mitigation recommendations
         """
-        recommendations = []
-        total_footprint = footprint_breakdown.get("total", 0)
-        
-        # Sort categories by emissions (highest first)
-        categories = ["energy", "transportation", "waste", "food", "water", "corporate"]
-        sorted_categories = sorted(
-            categories,
+        # Highest-emitting categories first; ties keep CATEGORIES order
+        top_categories = sorted(
+            RecommendationEngine.CATEGORIES,
             key=lambda x: footprint_breakdown.get(x, 0),
             reverse=True
-        )
+        )[:RecommendationEngine.TOP_CATEGORIES]
         
-        # Get top 3 categories with highest emissions
-        top_categories = sorted_categories[:3]
-        
-        # Generate recommendations for each top category
-        for category in top_categories:
-            if category in RecommendationEngine.RECOMMENDATIONS_LIBRARY:
-                category_recommendations = RecommendationEngine.RECOMMENDATIONS_LIBRARY[category]
-                
-                # Select top 2 recommendations per category
-                for rec in category_recommendations[:2]:
-                    # Adjust reduction estimate for user type
-                    rec_copy = rec.copy()
-                    rec_copy["category"] = category
-                    
-                    if user_type == UserType.CORPORATION:
-                        rec_copy["estimated_reduction"] *= 10
-                    elif user_type == UserType.INSTITUTION:
-                        rec_copy["estimated_reduction"] *= 5
-                        
-                    recommendations.append(rec_copy)
-        
-        # Add corporate-specific recommendations for all non-individual users
-        if user_type in [UserType.CORPORATION, UserType.INSTITUTION]:
-            for rec in RecommendationEngine.RECOMMENDATIONS_LIBRARY["corporate"][:3]:
-                rec_copy = rec.copy()
-                rec_copy["category"] = "corporate"
-                if user_type == UserType.CORPORATION:
-                     rec_copy["estimated_reduction"] *= 2
-                recommendations.append(rec_copy)
-        
-        # Sort by impact rating and estimated reduction
-        recommendations.sort(
-            key=lambda x: (x["impact_rating"], x["estimated_reduction"]),
-            reverse=True
-        )
-        
-        # Assign priority
-        for i, rec in enumerate(recommendations[:top_n]):
-            rec["priority"] = top_n - i
+        recommendations = []
+        contexts = {}
+        for i, template in enumerate(RecommendationEngine._select(top_categories, user_type, top_n)):
+            category = template["category"]
+            if category not in contexts:
+                contexts[category] = RecommendationEngine._get_contextual_feedback(category, footprint_breakdown)
+            recommendations.append({**template, "priority": top_n - i, "context": contexts[category]})
+        return recommendations
+    
+    @staticmethod
+    def generate_recommendations_batch(
+        batch: Mapping[str, Any],
+        user_type: UserType,
+        top_n: int = 5,
+        context: bool = True
+    ) -> List[List[Dict[str, Any]]]:
+        """
+        Vectorized counterpart of generate_recommendations
+        Accepts a CarbonCalculator.calculate_batch result (or any mapping of
+        equal-length per-category arrays plus "total") and returns each row's
+        recommendations, matching the scalar path exactly. Categories are
+        ranked with one argsort and the merge runs once per distinct ranking.
+        context=False skips the per-row feedback text.
+        """
+        first = next(iter(batch.values()))
+        n_rows = len(np.asarray(first))
+        values = np.column_stack([
+            np.asarray(batch[category], dtype=np.float64) if category in batch else np.zeros(n_rows)
+            for category in RecommendationEngine.CATEGORIES
+        ]) if n_rows else np.zeros((0, len(RecommendationEngine.CATEGORIES)))
+        # Stable sort of negated values ranks ties exactly like sorted(reverse=True)
+        order = np.argsort(-values, axis=1, kind="stable")[:, :RecommendationEngine.TOP_CATEGORIES]
+        rankings, inverse = np.unique(order, axis=0, return_inverse=True)
+        selections = [
+            RecommendationEngine._select([RecommendationEngine.CATEGORIES[i] for i in ranking], user_type, top_n)
+            for ranking in rankings.tolist()
+        ]
         
-        # Add contextual feedback
-        for rec in recommendations[:top_n]:
-            if "category" not in rec:
-                rec["category"] = "general"
-            rec["context"] = RecommendationEngine._get_contextual_feedback(
-                rec["category"],
-                footprint_breakdown
-            )
+        if context:
+            positions = {category: i for i, category in enumerate(RecommendationEngine.CATEGORIES)}
+            totals = np.asarray(batch["total"], dtype=np.float64) if "total" in batch else np.ones(n_rows)
+            with np.errstate(divide="ignore", invalid="ignore"):
+                percentages = np.where(totals[:, None] > 0, values / totals[:, None] * 100, 0).tolist()
         
-        return recommendations[:top_n]
+        results = []
+        for row, selection in enumerate(inverse.reshape(-1).tolist()):
+            recommendations = []
+            for i, template in enumerate(selections[selection]):
+                rec = {**template, "priority": top_n - i}
+                if context:
+                    category = template["category"]
+                    rec["context"] = RecommendationEngine.FEEDBACK_TEMPLATES[category].format(
+                        percentage=percentages[row][positions[category]]
+                    )
+                recommendations.append(rec)
+            results.append(recommendations)
+        return results
     
     @staticmethod
     def _get_contextual_feedback(category: str, footprint_breakdown: Dict[str, float]) -> str:
@@ -216,21 +290,8 @@ class RecommendationEngine:
         total = footprint_breakdown.get("total", 1)
         percentage = (category_emissions / total * 100) if total > 0 else 0
         
-        feedbacks = {
-            "energy": f"Energy use constitutes {percentage:.1f}% of emissions. "
-                     f"Optimizing thermal systems and transitioning to renewables is critical for biosafety and carbon reduction.",
-            "transportation": f"Logistics account for {percentage:.1f}% of impact. "
-                            f"Electrifying fleets reduces particulate matter, directly improving local biosafety.",
-            "waste": f"Waste generation is {percentage:.1f}% of your footprint. "
-                    f"Proper neutralization of hazardous waste is a key biosafety requirement.",
-            "food": f"Food sourcing contributes {percentage:.1f}%. "
-                   f"Sustainable sourcing ensures biological safety and reduces supply chain emissions.",
-            "water": f"Water usage is {percentage:.1f}%. "
-                    f"Treating effluent prevents biological contamination of local water bodies.",
-            "corporate": f"Operational protocols contribute significantly. "
-                        f"Standardizing biosafety management systems (ISO 14001) is recommended.",
-            "general": "Mitigation strategies should prioritize high-impact areas to ensure maximum biosafety and environmental protection."
-        }
-        
-        return feedbacks.get(category, feedbacks["general"])
+        templates = RecommendationEngine.FEEDBACK_TEMPLATES
+        return templates.get(category, templates["general"]).format(percentage=percentage)
+
 
+RecommendationEngine._compile_index()
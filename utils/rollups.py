@@ -0,0 +1,202 @@
+"""
+Per-User Analytics Rollups
+Keeps running footprint statistics so read endpoints avoid scanning entries
+"""
+from typing import Dict, List, Any, Iterable, Optional
+from datetime import datetime, timezone
+import json
+import math
+
+from sqlalchemy import func, desc
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from database.models import User, CarbonEntry, UserAnalyticsRollup
+from utils.quantiles import TDigest
+from utils.timeseries import invalidate_on_commit
+
+
+RECENT_WINDOW = 12
+
+
+def _naive_utc(value: Optional[datetime]) -> Optional[datetime]:
+    """Normalise entry dates so stored and incoming values compare cleanly"""
+    if value is None or value.tzinfo is None:
+        return value
+    return value.astimezone(timezone.utc).replace(tzinfo=None)
+
+
+def _ring_item(entry_id: int, entry_date: Optional[datetime], footprint: float, employee_count: Optional[int]) -> Dict[str, Any]:
+    entry_date = _naive_utc(entry_date)
+    return {
+        "id": entry_id,
+        "entry_date": entry_date.isoformat() if entry_date else None,
+        "total_carbon_footprint": footprint,
+        "employee_count": employee_count or 1
+    }
+
+
+def _ring_key(item: Dict[str, Any]):
+    # Newest first; entries without a date sort last, ties fall back to id
+    return (item["entry_date"] is not None, item["entry_date"] or "", item["id"])
+
+
+def _set_latest(rollup: UserAnalyticsRollup, ring: List[Dict[str, Any]]):
+    rollup.recent_entries = json.dumps(ring)
+    latest = ring[0] if ring else None
+    rollup.latest_entry_id = latest["id"] if latest else None
+    rollup.latest_entry_date = datetime.fromisoformat(latest["entry_date"]) if latest and latest["entry_date"] else None
+    rollup.latest_footprint = latest["total_carbon_footprint"] if latest else None
+    rollup.latest_employee_count = latest["employee_count"] if latest else None
+
+
+def rebuild_rollup(db: Session, user_id: int) -> UserAnalyticsRollup:
+    """
+    Recompute a user's rollup from their entries (aggregate query plus the
+    newest RECENT_WINDOW rows, plus one pass over the footprints for the
+    median digest). Flushes but does not commit.
+    """
+    count, total, total_sq, minimum, maximum = db.query(
+        func.count(CarbonEntry.id),
+        func.coalesce(func.sum(CarbonEntry.total_carbon_footprint), 0.0),
+        func.coalesce(func.sum(CarbonEntry.total_carbon_footprint * CarbonEntry.total_carbon_footprint), 0.0),
+        func.min(CarbonEntry.total_carbon_footprint),
+        func.max(CarbonEntry.total_carbon_footprint)
+    ).filter(CarbonEntry.user_id == user_id).one()
+
+    recent = db.query(
+        CarbonEntry.id, CarbonEntry.entry_date, CarbonEntry.total_carbon_footprint, CarbonEntry.employee_count
+    ).filter(
+        CarbonEntry.user_id == user_id
+    ).order_by(desc(CarbonEntry.entry_date), desc(CarbonEntry.id)).limit(RECENT_WINDOW).all()
+
+    digest = TDigest()
+    digest.add(row[0] for row in db.query(CarbonEntry.total_carbon_footprint).filter(CarbonEntry.user_id == user_id))
+
+    rollup = db.get(UserAnalyticsRollup, user_id)
+    if rollup is None:
+        rollup = UserAnalyticsRollup(user_id=user_id)
+        db.add(rollup)
+    rollup.entry_count = count
+    rollup.footprint_sum = float(total)
+    rollup.footprint_sum_sq = float(total_sq)
+    rollup.footprint_min = minimum
+    rollup.footprint_max = maximum
+    rollup.footprint_digest = digest.to_json()
+    ring = [_ring_item(*row) for row in recent]
+    ring.sort(key=_ring_key, reverse=True)
+    _set_latest(rollup, ring)
+    db.flush()
+    return rollup
+
+
+def _create_rollup(db: Session, user_id: int) -> Optional[UserAnalyticsRollup]:
+    """Build and insert a missing rollup; None if another writer created it first"""
+    try:
+        # Another writer may create the same rollup concurrently
+        with db.begin_nested():
+            return rebuild_rollup(db, user_id)
+    except IntegrityError:
+        return None
+
+
+def apply_entries(db: Session, user_id: int, entries: Iterable[Dict[str, Any]]) -> UserAnalyticsRollup:
+    """
+    Fold newly inserted entries into the user's rollup inside the caller's
+    transaction. Each entry dict needs id, entry_date, total_carbon_footprint
+    and employee_count. A missing rollup (or one from before the median
+    digest) is rebuilt from the table instead, which already includes the
+    new (flushed) entries. Cached time series for the user are dropped when
+    the transaction commits.
+    """
+    invalidate_on_commit(db, user_id)
+    query = db.query(UserAnalyticsRollup).filter(
+        UserAnalyticsRollup.user_id == user_id
+    ).with_for_update()
+    rollup = query.first()
+    if rollup is None:
+        created = _create_rollup(db, user_id)
+        if created is not None:
+            return created
+        # The other writer's rebuild cannot see our uncommitted entries
+        rollup = query.first()
+    if rollup.footprint_digest is None:
+        return rebuild_rollup(db, user_id)
+
+    digest = TDigest.from_json(rollup.footprint_digest)
+    ring = json.loads(rollup.recent_entries or "[]")
+    count = rollup.entry_count or 0
+    total = rollup.footprint_sum or 0.0
+    total_sq = rollup.footprint_sum_sq or 0.0
+    minimum = rollup.footprint_min
+    maximum = rollup.footprint_max
+    for entry in entries:
+        footprint = entry["total_carbon_footprint"] or 0.0
+        count += 1
+        total += footprint
+        total_sq += footprint * footprint
+        minimum = footprint if minimum is None else min(minimum, footprint)
+        maximum = footprint if maximum is None else max(maximum, footprint)
+        digest.add([footprint])
+        ring.append(_ring_item(entry["id"], entry.get("entry_date"), footprint, entry.get("employee_count")))
+
+    ring.sort(key=_ring_key, reverse=True)
+    rollup.entry_count = count
+    rollup.footprint_sum = total
+    rollup.footprint_sum_sq = total_sq
+    rollup.footprint_min = minimum
+    rollup.footprint_max = maximum
+    rollup.footprint_digest = digest.to_json()
+    _set_latest(rollup, ring[:RECENT_WINDOW])
+    db.flush()
+    return rollup
+
+
+def get_rollup(db: Session, user_id: int) -> UserAnalyticsRollup:
+    """Return the user's rollup, building (and committing) it on first use"""
+    rollup = db.get(UserAnalyticsRollup, user_id)
+    if rollup is None:
+        rollup = _create_rollup(db, user_id) or db.get(UserAnalyticsRollup, user_id)
+        db.commit()
+    elif rollup.footprint_digest is None:
+        rollup = rebuild_rollup(db, user_id)
+        db.commit()
+    return rollup
+
+
+def recent_entries(rollup: UserAnalyticsRollup) -> List[Dict[str, Any]]:
+    """The last RECENT_WINDOW entries, newest first"""
+    return json.loads(rollup.recent_entries or "[]")
+
+
+def summary_statistics(db: Session, rollup: UserAnalyticsRollup) -> Dict[str, float]:
+    """
+    Mean, median, sample std dev, min, max and size over all entries. The
+    median is read from the rollup's t-digest: exact for a few dozen
+    entries, within the sketch's rank error beyond that.
+    """
+    count = rollup.entry_count
+    mean = rollup.footprint_sum / count
+    if count > 1:
+        variance = (rollup.footprint_sum_sq - rollup.footprint_sum * mean) / (count - 1)
+        std_dev = math.sqrt(max(variance, 0.0))
+    else:
+        std_dev = 0
+    return {
+        "mean": mean,
+        "median": TDigest.from_json(rollup.footprint_digest).quantile(0.5),
+        "std_dev": std_dev,
+        "min": rollup.footprint_min,
+        "max": rollup.footprint_max,
+        "sample_size": count
+    }
+
+
+def backfill_rollups(db: Session, user_ids: Optional[List[int]] = None) -> int:
+    """Rebuild rollups for the given users (default: everyone), one commit each"""
+    if user_ids is None:
+        user_ids = [row[0] for row in db.query(User.id).order_by(User.id)]
+    for user_id in user_ids:
+        rebuild_rollup(db, user_id)
+        db.commit()
+    return len(user_ids)
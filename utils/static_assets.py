@@ -0,0 +1,177 @@
+"""
+Dashboard Asset Cache
+Serves the dashboard's HTML, CSS and JS from memory with strong ETags and
+precompressed gzip/brotli variants
+"""
+from dataclasses import dataclass, field
+from typing import Dict, Optional, Tuple
+import gzip
+import hashlib
+import os
+import threading
+
+from fastapi import Request
+from fastapi.responses import Response
+
+try:
+    import brotli
+except ImportError:  # gzip is always available; br is only offered with brotli installed
+    brotli = None
+
+
+# Re-read an asset when its file changes (for development); otherwise files
+# are read once at startup
+STATIC_ASSETS_RELOAD = os.getenv("STATIC_ASSETS_RELOAD", "false").lower() in ("1", "true", "yes")
+# max-age for CSS/JS. Their URLs are not versioned, so keep this short;
+# HTML is always revalidated.
+STATIC_CACHE_MAX_AGE = int(os.getenv("STATIC_CACHE_MAX_AGE", "300"))
+
+# Bodies smaller than this are not worth compressing
+MIN_COMPRESS_SIZE = 512
+
+
+@dataclass
+class StaticAsset:
+    """One file's bytes plus its precompressed variants"""
+    media_type: str
+    body: bytes
+    etag: str
+    cache_control: str
+    variants: Dict[str, bytes] = field(default_factory=dict)
+    stamp: Optional[Tuple[int, int]] = None
+
+    @classmethod
+    def build(cls, body: bytes, media_type: str, cache_control: str,
+              stamp: Optional[Tuple[int, int]] = None) -> "StaticAsset":
+        variants = {}
+        if len(body) >= MIN_COMPRESS_SIZE:
+            # mtime=0 keeps the gzip bytes (and so the ETag) stable across restarts
+            compressed = {"gzip": gzip.compress(body, compresslevel=9, mtime=0)}
+            if brotli is not None:
+                compressed["br"] = brotli.compress(body, quality=11)
+            variants = {coding: data for coding, data in compressed.items() if len(data) < len(body)}
+        return cls(
+            media_type=media_type,
+            body=body,
+            etag=hashlib.sha256(body).hexdigest()[:32],
+            cache_control=cache_control,
+            variants=variants,
+            stamp=stamp
+        )
+
+    def tag(self, coding: Optional[str] = None) -> str:
+        # Each encoding is a different representation, so it gets its own tag
+        return f'"{self.etag}-{coding}"' if coding else f'"{self.etag}"'
+
+    def matches(self, if_none_match: str) -> bool:
+        """Weak comparison against any representation of the current bytes"""
+        if if_none_match.strip() == "*":
+            return True
+        tags = {self.tag()} | {self.tag(coding) for coding in self.variants}
+        for candidate in if_none_match.split(","):
+            candidate = candidate.strip()
+            if candidate.startswith("W/"):
+                candidate = candidate[2:]
+            if candidate in tags:
+                return True
+        return False
+
+
+def _accepted_codings(accept_encoding: str) -> Dict[str, float]:
+    """Content codings from an Accept-Encoding header with their q-values"""
+    codings = {}
+    for part in accept_encoding.split(","):
+        name, _, params = part.strip().partition(";")
+        if not name:
+            continue
+        quality = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        codings[name.strip().lower()] = quality
+    return codings
+
+
+class AssetCache:
+    """
+    Named assets held in memory. Each response carries a strong ETag,
+    Cache-Control and Vary: Accept-Encoding. A matching If-None-Match gets a
+    bodiless 304.
+    """
+
+    def __init__(self, reload: bool = STATIC_ASSETS_RELOAD, max_age: int = STATIC_CACHE_MAX_AGE):
+        self.reload = reload
+        self.max_age = max_age
+        self._sources: Dict[str, Tuple[str, str, Optional[str]]] = {}
+        self._assets: Dict[str, Optional[StaticAsset]] = {}
+        self._lock = threading.Lock()
+
+    def register(self, name: str, path: str, media_type: str, fallback: Optional[str] = None):
+        """Load `path` now; `fallback` is served instead while the file is missing"""
+        self._sources[name] = (path, media_type, fallback)
+        self._assets[name] = self._load(name)
+
+    def _cache_control(self, media_type: str) -> str:
+        if self.reload or media_type == "text/html":
+            return "no-cache"
+        return f"public, max-age={self.max_age}"
+
+    def _load(self, name: str) -> Optional[StaticAsset]:
+        path, media_type, fallback = self._sources[name]
+        try:
+            with open(path, "rb") as f:
+                stat = os.fstat(f.fileno())
+                body = f.read()
+            stamp = (stat.st_mtime_ns, stat.st_size)
+        except FileNotFoundError:
+            if fallback is None:
+                return None
+            body, stamp = fallback.encode(), None
+        return StaticAsset.build(body, media_type, self._cache_control(media_type), stamp)
+
+    def get(self, name: str) -> Optional[StaticAsset]:
+        asset = self._assets.get(name)
+        if not self.reload:
+            return asset
+        path = self._sources[name][0]
+        try:
+            stat = os.stat(path)
+            stamp = (stat.st_mtime_ns, stat.st_size)
+        except FileNotFoundError:
+            stamp = None
+        if asset is None or asset.stamp != stamp:
+            with self._lock:
+                asset = self._assets[name] = self._load(name)
+        return asset
+
+    def response(self, request: Request, name: str) -> Optional[Response]:
+        """The negotiated response for an asset, or None if it does not exist"""
+        asset = self.get(name)
+        if asset is None:
+            return None
+
+        accepted = _accepted_codings(request.headers.get("accept-encoding", ""))
+        coding = None
+        for candidate in ("br", "gzip"):
+            if candidate in asset.variants and accepted.get(candidate, accepted.get("*", 0)) > 0:
+                coding = candidate
+                break
+
+        headers = {
+            "ETag": asset.tag(coding),
+            "Cache-Control": asset.cache_control,
+            "Vary": "Accept-Encoding"
+        }
+        if_none_match = request.headers.get("if-none-match")
+        if if_none_match and asset.matches(if_none_match):
+            return Response(status_code=304, headers=headers)
+        if coding:
+            headers["Content-Encoding"] = coding
+            return Response(content=asset.variants[coding], media_type=asset.media_type, headers=headers)
+        return Response(content=asset.body, media_type=asset.media_type, headers=headers)
+
+
+dashboard_assets = AssetCache()
@@ -0,0 +1,202 @@
+"""
+Time-Bucketed Emissions
+Groups a user's entries by day, week, month or quarter in SQL and caches the
+result per user until new entries are committed
+"""
+from collections import OrderedDict
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Dict, Any, Iterator, List, Optional, Tuple
+import os
+import threading
+import time
+
+from sqlalchemy import Integer, cast, event, func, literal_column, select
+from sqlalchemy.orm import Session
+
+from database.models import CarbonEntry, BREAKDOWN_COLUMNS
+
+
+BUCKETS = ("day", "week", "month", "quarter")
+CATEGORIES = [key for key in BREAKDOWN_COLUMNS if key not in ("total", "per_person")]
+
+TIMESERIES_CACHE_TTL = float(os.getenv("TIMESERIES_CACHE_TTL", "300"))  # seconds, 0 disables
+TIMESERIES_CACHE_MAX = int(os.getenv("TIMESERIES_CACHE_MAX", "1000"))
+
+
+def _sqlite_bucket(column, bucket: str):
+    if bucket == "day":
+        return func.date(column)
+    if bucket == "week":
+        # Monday of the ISO week: jump to the next Sunday, then back six days
+        return func.date(column, "weekday 0", "-6 days")
+    if bucket == "month":
+        return func.strftime("%Y-%m-01", column)
+    month = cast(func.strftime("%m", column), Integer)
+    return func.printf("%s-%02d-01", func.strftime("%Y", column), (month - 1) // 3 * 3 + 1)
+
+
+def _postgresql_bucket(column, bucket: str):
+    # Literals rather than bound parameters, so the GROUP BY expression is
+    # textually identical to the selected one
+    return func.to_char(func.date_trunc(literal_column(f"'{bucket}'"), column), literal_column("'YYYY-MM-DD'"))
+
+
+# Each returns the bucket's first day as a YYYY-MM-DD string
+BUCKET_EXPRESSIONS = {
+    "sqlite": _sqlite_bucket,
+    "postgresql": _postgresql_bucket,
+}
+
+
+def bucketed_emissions(db: Session, user_id: int, bucket: str,
+                       start: Optional[datetime] = None, end: Optional[datetime] = None) -> Dict[str, Any]:
+    """Per-bucket entry count, total and category sums for [start, end)"""
+    dialect = db.get_bind().dialect.name
+    if dialect not in BUCKET_EXPRESSIONS:
+        raise ValueError(f"Time buckets are not supported on {dialect}")
+    if bucket not in BUCKETS:
+        raise ValueError(f"Unknown bucket: {bucket}")
+
+    period = BUCKET_EXPRESSIONS[dialect](CarbonEntry.entry_date, bucket).label("period_start")
+    query = select(
+        period,
+        func.count(CarbonEntry.id),
+        func.sum(CarbonEntry.total_carbon_footprint),
+        *[func.sum(getattr(CarbonEntry, BREAKDOWN_COLUMNS[key])) for key in CATEGORIES]
+    ).where(
+        CarbonEntry.user_id == user_id, CarbonEntry.entry_date.is_not(None)
+    )
+    if start:
+        query = query.where(CarbonEntry.entry_date >= start)
+    if end:
+        query = query.where(CarbonEntry.entry_date < end)
+    query = query.group_by(period).order_by(period)
+
+    series = []
+    for period_start, count, total, *sums in db.execute(query):
+        series.append({
+            "period_start": period_start,
+            "entries": count,
+            "total": round(total or 0, 2),
+            "categories": {key: round(value or 0, 2) for key, value in zip(CATEGORIES, sums)}
+        })
+    return {
+        "bucket": bucket,
+        "start": start.isoformat() if start else None,
+        "end": end.isoformat() if end else None,
+        "series": series
+    }
+
+
+class TimeSeriesCache:
+    """
+    LRU of bucketed results keyed by (user id, bucket, start, end). A user's
+    results are dropped once a transaction that added entries for them
+    commits. While a user has computations in flight they share a
+    generation number, bumped on every invalidation, so a result computed
+    before that commit is never stored after it. Generations only matter to
+    in-flight computations, so a user's is dropped once the last one ends.
+    """
+
+    def __init__(self, ttl: float = TIMESERIES_CACHE_TTL, max_entries: int = TIMESERIES_CACHE_MAX):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Tuple, Tuple[Dict[str, Any], float]]" = OrderedDict()
+        # user id -> [generation, computations in flight]
+        self._active: Dict[int, List[int]] = {}
+        self._lock = threading.Lock()
+        self.counters = {"hits": 0, "misses": 0, "expired": 0, "evictions": 0, "invalidations": 0}
+
+    @property
+    def enabled(self) -> bool:
+        return self.ttl > 0 and self.max_entries > 0
+
+    @contextmanager
+    def computing(self, user_id: int) -> Iterator[int]:
+        """Bracket a computation whose result may be put(); yields its generation"""
+        with self._lock:
+            state = self._active.setdefault(user_id, [0, 0])
+            state[1] += 1
+            generation = state[0]
+        try:
+            yield generation
+        finally:
+            with self._lock:
+                state = self._active[user_id]
+                state[1] -= 1
+                if not state[1]:
+                    del self._active[user_id]
+
+    def get(self, key: Tuple) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            cached = self._entries.get(key)
+            if cached is None:
+                self.counters["misses"] += 1
+                return None
+            result, expires_at = cached
+            if expires_at <= time.time():
+                del self._entries[key]
+                self.counters["expired"] += 1
+                self.counters["misses"] += 1
+                return None
+            self._entries.move_to_end(key)
+            self.counters["hits"] += 1
+            return result
+
+    def put(self, key: Tuple, result: Dict[str, Any], generation: int):
+        """Store a result computed while the user was at `generation`; call inside computing()"""
+        if not self.enabled:
+            return
+        with self._lock:
+            state = self._active.get(key[0])
+            if state is None or state[0] != generation:
+                return
+            self._entries[key] = (result, time.time() + self.ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.counters["evictions"] += 1
+
+    def invalidate(self, user_id: int):
+        with self._lock:
+            if user_id in self._active:
+                self._active[user_id][0] += 1
+            keys = [key for key in self._entries if key[0] == user_id]
+            for key in keys:
+                del self._entries[key]
+            self.counters["invalidations"] += len(keys)
+
+    def get_stats(self) -> Dict:
+        with self._lock:
+            lookups = self.counters["hits"] + self.counters["misses"]
+            return {
+                "enabled": self.enabled,
+                "ttl_seconds": self.ttl,
+                "max_entries": self.max_entries,
+                "size": len(self._entries),
+                "users_computing": len(self._active),
+                **self.counters,
+                "hit_rate": round(self.counters["hits"] / lookups, 4) if lookups else 0.0
+            }
+
+
+timeseries_cache = TimeSeriesCache()
+
+_PENDING_KEY = "timeseries_invalidations"
+
+
+def invalidate_on_commit(db: Session, user_id: int):
+    """Drop the user's cached series once the current transaction commits"""
+    db.info.setdefault(_PENDING_KEY, set()).add(user_id)
+
+
+@event.listens_for(Session, "after_commit")
+def _apply_invalidations(session):
+    for user_id in session.info.pop(_PENDING_KEY, ()):
+        timeseries_cache.invalidate(user_id)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_invalidations(session):
+    session.info.pop(_PENDING_KEY, None)